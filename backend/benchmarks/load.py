@@ -0,0 +1,582 @@
+"""
+End-to-end load benchmark for LocaTrack API
+
+Seeds a MongoDB database with a synthetic multi-tenant dataset, replays the
+frontend's traffic against the API and writes throughput and p50/p95/p99
+latency per route to a JSON report, optionally compared with a baseline.
+
+Each virtual user is a browser session of one tenant, parked on a page and
+running that page's timers from the frontend, in their fallback (polling)
+mode, `--speedup` times faster:
+
+  every user        Layout poll: notifications + unread count    every 30 s
+  GPS page          /gps/objects                                 every 10 s
+  Messages page     new messages of the open conversation        every 3 s
+                    and a message sent                           every 2 min
+  other pages       navigation to a page, its requests in parallel  every 60 s
+
+Tenant sizes are Pareto-distributed (a few large fleets, many small ones);
+contract, maintenance and message dates spread over the past year. GPS
+calls go to a local stub of the GPS-14 API with `--gps-latency-ms` latency.
+
+    cd backend
+    # seed (drops DB_NAME, which must contain "bench") and run in-process
+    python -m benchmarks.load --seed --tenants 20 --vehicles 50 --users 50 --duration 60 --output baseline.json
+    # later: same run, compared with the baseline (exit status 1 on regression)
+    python -m benchmarks.load --users 50 --duration 60 --output after.json --baseline baseline.json
+    # against a server started with the same MONGO_URL and DB_NAME
+    python -m benchmarks.load --url http://localhost:8001 --users 50 --duration 60 --output server.json
+"""
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import time
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "locatrack_bench")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from config import client as mongo_client, db  # noqa: E402
+from models import (  # noqa: E402
+    User, UserRole, Vehicle, Client, Contract, Reservation, Payment, Maintenance, Infraction, Message, Conversation
+)
+from routers.messages import get_participant_key  # noqa: E402
+from utils.auth import hash_password  # noqa: E402
+
+PASSWORD = "bench-password"
+INSERT_BATCH = 1000
+MIN_SAMPLES = 50  # fewer requests than this give no meaningful p95/p99
+
+BRANDS = [("Renault", "Clio"), ("Peugeot", "208"), ("Dacia", "Logan"), ("Hyundai", "Accent"),
+          ("Kia", "Picanto"), ("Volkswagen", "Golf"), ("Toyota", "Yaris"), ("Seat", "Ibiza")]
+COLORS = ["blanc", "noir", "gris", "rouge", "bleu"]
+MAINTENANCE_TYPES = ["vidange", "pneus", "freins", "révision", "carrosserie"]
+INFRACTION_TYPES = ["excès de vitesse", "stationnement", "feu rouge", "ceinture"]
+MESSAGES = ["Le véhicule est prêt", "Le client est en retard", "Merci", "Contrat signé",
+            "Pouvez-vous vérifier le kilométrage ?", "Retour prévu demain matin"]
+
+# Each page as the frontend loads it: requests sent in parallel (Promise.all)
+PAGES = {
+    "dashboard": (3, [("/api/reports/dashboard", None)]),
+    "fleet": (2, [("/api/vehicles", None)]),
+    "contracts": (2, [("/api/contracts", None), ("/api/vehicles", None), ("/api/clients", None)]),
+    "clients": (1, [("/api/clients", None)]),
+    "reservations": (1, [("/api/reservations", None), ("/api/vehicles", None), ("/api/clients", None)]),
+    "payments": (1, [("/api/payments", None), ("/api/contracts", {"status": "active", "fields": "id,total_amount"})]),
+    "maintenance": (1, [("/api/maintenance", None), ("/api/maintenance/alerts", None), ("/api/vehicles", None)]),
+    "infractions": (1, [("/api/infractions", None), ("/api/vehicles", None)]),
+    "reports": (1, [("/api/reports/fleet", None), ("/api/reports/financial", None)]),
+}
+
+# Where the virtual users are parked
+VIEWS = {"gps": 0.2, "messages": 0.25, "pages": 0.55}
+
+# Frontend timer periods, in seconds
+LAYOUT_POLL_SECONDS = 30
+GPS_REFRESH_SECONDS = 10
+CHAT_POLL_SECONDS = 3
+CHAT_SEND_SECONDS = 120
+NAVIGATION_SECONDS = 60
+
+
+# --- Dataset -------------------------------------------------------------------
+
+def pick(rng: random.Random, weights: Dict[str, float]) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def tenant_scale(rng: random.Random) -> float:
+    """Pareto(1.5) sizes, mean 1, capped at 10x the mean"""
+    return min(rng.paretovariate(1.5) / 3, 10)
+
+
+def seed_tenant(rng: random.Random, index: int, vehicles: int, messages: int, password_hash: str, now: datetime) -> Dict[str, list]:
+    docs: Dict[str, list] = {name: [] for name in (
+        "users", "vehicles", "clients", "contracts", "payments", "reservations",
+        "maintenance", "infractions", "conversations", "messages"
+    )}
+    scale = tenant_scale(rng)
+
+    def ago(days: float) -> datetime:
+        return now - timedelta(days=days)
+
+    owner = User(
+        email=f"owner{index}@bench.locatrack.dz", full_name=f"Agence {index}", role=UserRole.LOCATEUR,
+        company_name=f"Agence {index}", subscription_type="annual", subscription_start=ago(30),
+        subscription_end=now + timedelta(days=335), gps_provider="gps14", gps_api_key=f"bench-{index}",
+        created_at=ago(400)
+    )
+    staff = [owner] + [
+        User(
+            email=f"employee{index}-{e}@bench.locatrack.dz", full_name=f"Employé {index}-{e}",
+            role=UserRole.EMPLOYEE, tenant_id=owner.id, created_at=ago(rng.uniform(30, 390))
+        )
+        for e in range(rng.randint(1, 4))
+    ]
+    docs["users"] = [{**u.model_dump(), "password": password_hash} for u in staff]
+    tenant_id = owner.id
+
+    fleet = []
+    for v in range(max(1, round(vehicles * scale))):
+        brand, model = rng.choice(BRANDS)
+        fleet.append(Vehicle(
+            tenant_id=tenant_id, brand=brand, model=model, year=rng.randint(2015, 2025),
+            plate_number=f"{index:03d}{v:05d}-{rng.randint(100, 125)}-16", color=rng.choice(COLORS),
+            daily_rate=float(rng.randrange(3000, 12000, 500)),
+            status=pick(rng, {"available": 0.6, "rented": 0.3, "maintenance": 0.1}),
+            fuel_type=rng.choice(["diesel", "essence"]), transmission=rng.choice(["manual", "automatic"]),
+            mileage=rng.randint(5000, 250000), imei=f"86{index:04d}{v:09d}",
+            # Some documents expire within the alert window
+            insurance_expiry=now + timedelta(days=rng.uniform(-20, 365)),
+            technical_inspection_expiry=now + timedelta(days=rng.uniform(-20, 365)),
+            created_at=ago(rng.uniform(0, 400))
+        ))
+    docs["vehicles"] = [v.model_dump() for v in fleet]
+
+    clients = [
+        Client(
+            tenant_id=tenant_id, full_name=f"Client {index}-{c}", phone=f"05{rng.randint(10000000, 99999999)}",
+            email=f"client{index}-{c}@example.com", address="Alger", license_number=f"L{index:03d}{c:07d}",
+            license_issue_date=ago(rng.uniform(365, 7000)), created_at=ago(rng.uniform(0, 400))
+        )
+        for c in range(len(fleet) * 2)
+    ]
+    docs["clients"] = [c.model_dump() for c in clients]
+
+    for _ in range(len(fleet) * 3):
+        vehicle = rng.choice(fleet)
+        start = ago(rng.uniform(-10, 365))
+        days = min(1 + int(rng.expovariate(1 / 4)), 30)
+        end = start + timedelta(days=days)
+        status = "completed" if end < now else "active" if start <= now else "pending"
+        total = vehicle.daily_rate * days
+        contract = Contract(
+            tenant_id=tenant_id, client_id=rng.choice(clients).id, vehicle_id=vehicle.id,
+            start_date=start, end_date=end, daily_rate=vehicle.daily_rate, total_amount=total,
+            status=status, signed=status != "pending", signed_at=start if status != "pending" else None,
+            created_at=start - timedelta(days=rng.uniform(0, 5))
+        )
+        docs["contracts"].append(contract.model_dump())
+        # Completed contracts are paid, active ones partly
+        if status == "completed" or (status == "active" and rng.random() < 0.5):
+            amount = total if status == "completed" else round(total * rng.uniform(0.2, 0.8))
+            docs["payments"].append(Payment(
+                tenant_id=tenant_id, contract_id=contract.id, amount=amount,
+                method=pick(rng, {"cash": 0.7, "card": 0.2, "transfer": 0.1}), status="completed",
+                payment_date=min(end, now), created_at=min(end, now)
+            ).model_dump())
+
+    for _ in range(len(fleet) // 2):
+        start = now + timedelta(days=rng.uniform(1, 60))
+        docs["reservations"].append(Reservation(
+            tenant_id=tenant_id, client_id=rng.choice(clients).id, vehicle_id=rng.choice(fleet).id,
+            start_date=start, end_date=start + timedelta(days=rng.randint(1, 10)),
+            status=pick(rng, {"pending": 0.6, "confirmed": 0.4}), created_at=ago(rng.uniform(0, 30))
+        ).model_dump())
+
+    for _ in range(len(fleet) // 2):
+        scheduled = now + timedelta(days=rng.uniform(-300, 60))
+        done = scheduled < now and rng.random() < 0.9
+        docs["maintenance"].append(Maintenance(
+            tenant_id=tenant_id, vehicle_id=rng.choice(fleet).id, type=rng.choice(MAINTENANCE_TYPES),
+            description="Entretien", cost=float(rng.randrange(2000, 60000, 500)), scheduled_date=scheduled,
+            completed_date=scheduled if done else None, status="completed" if done else "scheduled",
+            created_at=scheduled - timedelta(days=rng.uniform(1, 20))
+        ).model_dump())
+
+    for _ in range(len(fleet) // 5):
+        date = ago(rng.uniform(0, 365))
+        docs["infractions"].append(Infraction(
+            tenant_id=tenant_id, vehicle_id=rng.choice(fleet).id, type=rng.choice(INFRACTION_TYPES),
+            description="Constat", fine_amount=float(rng.choice([2000, 3000, 5000])), date=date,
+            status=pick(rng, {"pending": 0.3, "paid": 0.7}), created_at=date
+        ).model_dump())
+
+    # One conversation between the owner and each employee
+    for employee in staff[1:]:
+        pair = [owner, employee]
+        conversation = Conversation(
+            tenant_id=tenant_id, participants=[u.id for u in pair],
+            participant_key=get_participant_key([u.id for u in pair]),
+            participant_names=[u.full_name for u in pair], created_at=ago(rng.uniform(90, 365))
+        )
+        count = max(1, round(messages * scale / (len(staff) - 1)))
+        stamps = sorted(ago(rng.uniform(0, 90)) for _ in range(count))
+        for stamp in stamps:
+            sender = rng.choice(pair)
+            docs["messages"].append(Message(
+                conversation_id=conversation.id, sender_id=sender.id, sender_name=sender.full_name,
+                sender_role=sender.role, content=rng.choice(MESSAGES), read=True, created_at=stamp
+            ).model_dump())
+        conversation.last_message = docs["messages"][-1]["content"]
+        conversation.last_message_at = stamps[-1]
+        docs["conversations"].append(conversation.model_dump())
+    return docs
+
+
+async def seed(args) -> Dict[str, int]:
+    if "bench" not in db.name:
+        sys.exit(f"Refusing to drop '{db.name}': set DB_NAME to a database name containing 'bench'")
+    await mongo_client.drop_database(db.name)
+    rng = random.Random(args.random_seed)
+    password_hash = await hash_password(PASSWORD)
+    now = datetime.now(timezone.utc)
+    counts: Dict[str, int] = {}
+    for index in range(args.tenants):
+        for collection, docs in seed_tenant(rng, index, args.vehicles, args.messages, password_hash, now).items():
+            for i in range(0, len(docs), INSERT_BATCH):
+                await db[collection].insert_many(docs[i:i + INSERT_BATCH], ordered=False)
+            counts[collection] = counts.get(collection, 0) + len(docs)
+    return counts
+
+
+async def dataset_counts() -> Dict[str, int]:
+    names = ["users", "vehicles", "clients", "contracts", "payments", "reservations",
+             "maintenance", "infractions", "conversations", "messages"]
+    return {name: await db[name].estimated_document_count() for name in names}
+
+
+# --- GPS provider stub ---------------------------------------------------------
+
+def gps_stub(objects: int, latency_ms: float):
+    """ASGI app answering GPS-14 USER_GET_OBJECTS"""
+    rng = random.Random(0)
+    body = json.dumps([
+        {
+            "imei": f"86{i:013d}", "name": f"Véhicule {i}", "model": "Clio", "plate_number": f"{i:05d}-120-16",
+            "lat": str(36.7 + rng.uniform(-0.2, 0.2)), "lng": str(3.05 + rng.uniform(-0.2, 0.2)),
+            "speed": str(rng.randint(0, 90)), "angle": str(rng.randint(0, 359)), "active": "true",
+            "dt_tracker": "2026-01-01 12:00:00"
+        }
+        for i in range(objects)
+    ]).encode()
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        await asyncio.sleep(latency_ms / 1000)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    return app
+
+
+async def start_gps_stub(args):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind((args.gps_host, 0))
+    config = uvicorn.Config(gps_stub(args.gps_objects, args.gps_latency_ms), log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    url = f"http://{args.gps_host}:{sock.getsockname()[1]}/api/api.php"
+    await db.users.update_many({"role": UserRole.LOCATEUR}, {"$set": {"gps_api_url": url}})
+    return server, task
+
+
+# --- Traffic -------------------------------------------------------------------
+
+class Recorder:
+    """Latencies per route template, from the end of the warmup"""
+
+    def __init__(self, warmup_until: float):
+        self.warmup_until = warmup_until
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.started: Optional[float] = None
+
+    def record(self, route: str, ms: float, ok: bool):
+        if time.monotonic() < self.warmup_until:
+            return
+        if self.started is None:
+            self.started = time.monotonic()
+        self.latencies.setdefault(route, []).append(ms)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+
+class Session:
+    """One browser session of a tenant's user"""
+
+    def __init__(self, http: httpx.AsyncClient, recorder: Recorder, token: str, user: dict, rng: random.Random):
+        self.http = http
+        self.recorder = recorder
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.user = user
+        self.rng = rng
+        self.conversation: Optional[str] = None
+        self.last_message: Optional[str] = None
+
+    async def get(self, path: str, params: Optional[dict] = None, route: Optional[str] = None):
+        return await self.request("GET", path, route or path, params=params)
+
+    async def request(self, method: str, path: str, route: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, path, headers=self.headers, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.recorder.record(f"{method} {route}", (time.perf_counter() - start) * 1000, ok)
+        return response
+
+
+async def layout_poll(s: Session):
+    await asyncio.gather(s.get("/api/notifications"), s.get("/api/messages/unread-count"))
+
+
+async def gps_refresh(s: Session):
+    await s.get("/api/gps/objects")
+
+
+async def open_messages(s: Session):
+    conversations, _ = await asyncio.gather(s.get("/api/messages/conversations"), s.get("/api/messages/users"))
+    if conversations is not None and conversations.status_code == 200 and conversations.json():
+        s.conversation = s.rng.choice(conversations.json())["id"]
+        page = await s.get(
+            f"/api/messages/conversations/{s.conversation}", params={"limit": 50},
+            route="/api/messages/conversations/{conversation_id}"
+        )
+        if page is not None and page.status_code == 200 and page.json():
+            s.last_message = page.json()[-1]["id"]
+
+
+async def chat_poll(s: Session):
+    if not s.conversation:
+        return
+    params = {"after": s.last_message, "limit": 50} if s.last_message else {"limit": 50}
+    page = await s.get(
+        f"/api/messages/conversations/{s.conversation}", params=params,
+        route="/api/messages/conversations/{conversation_id}"
+    )
+    if page is not None and page.status_code == 200 and page.json():
+        s.last_message = page.json()[-1]["id"]
+
+
+async def chat_send(s: Session):
+    if s.conversation:
+        await s.request(
+            "POST", "/api/messages/send", "/api/messages/send",
+            json={"conversation_id": s.conversation, "content": s.rng.choice(MESSAGES)}
+        )
+
+
+async def navigate(s: Session):
+    page = pick(s.rng, {name: weight for name, (weight, _) in PAGES.items()})
+    await asyncio.gather(*(s.get(path, params=params) for path, params in PAGES[page][1]))
+
+
+async def every(period: float, action: Callable, s: Session, deadline: float):
+    """A frontend timer: first tick at a random phase, then one per period"""
+    await asyncio.sleep(s.rng.uniform(0, period))
+    while time.monotonic() < deadline:
+        tick = time.monotonic()
+        await action(s)
+        await asyncio.sleep(max(0.0, period - (time.monotonic() - tick)))
+
+
+async def virtual_user(s: Session, view: str, speedup: float, deadline: float):
+    await s.get("/api/auth/me")
+    timers = [every(LAYOUT_POLL_SECONDS / speedup, layout_poll, s, deadline)]
+    if view == "gps":
+        await gps_refresh(s)
+        timers.append(every(GPS_REFRESH_SECONDS / speedup, gps_refresh, s, deadline))
+    elif view == "messages":
+        await open_messages(s)
+        timers.append(every(CHAT_POLL_SECONDS / speedup, chat_poll, s, deadline))
+        timers.append(every(CHAT_SEND_SECONDS / speedup, chat_send, s, deadline))
+    else:
+        await navigate(s)
+        timers.append(every(NAVIGATION_SECONDS / speedup, navigate, s, deadline))
+    await asyncio.gather(*timers)
+
+
+async def login_users(http: httpx.AsyncClient, count: int, rng: random.Random) -> List[tuple]:
+    """Log `count` users in, spread over the tenants by tenant size"""
+    users = await db.users.find(
+        {"email": {"$regex": r"@bench\.locatrack\.dz$"}}, {"_id": 0, "id": 1, "email": 1, "tenant_id": 1}
+    ).to_list(None)
+    if not users:
+        sys.exit("No benchmark users found: run with --seed first")
+    sizes = {}
+    async for row in db.vehicles.aggregate([{"$group": {"_id": "$tenant_id", "n": {"$sum": 1}}}]):
+        sizes[row["_id"]] = row["n"]
+    weights = [sizes.get(u.get("tenant_id") or u["id"], 1) for u in users]
+    chosen = rng.choices(users, weights=weights, k=count)
+
+    semaphore = asyncio.Semaphore(8)
+    tokens: Dict[str, str] = {}
+
+    async def login(email: str):
+        async with semaphore:
+            if email not in tokens:
+                response = await http.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+                response.raise_for_status()
+                tokens[email] = response.json()["access_token"]
+
+    await asyncio.gather(*(login(u["email"]) for u in {u["email"]: u for u in chosen}.values()))
+    return [(tokens[u["email"]], u) for u in chosen]
+
+
+# --- Report --------------------------------------------------------------------
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile"""
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / seconds, 2),
+        "mean_ms": round(sum(values) / len(values), 2),
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(values[-1], 2),
+    }
+
+
+def build_report(recorder: Recorder, args, dataset: Dict[str, int]) -> dict:
+    seconds = max(time.monotonic() - (recorder.started or time.monotonic()), 1e-9)
+    routes = {
+        route: summarize(values, recorder.errors.get(route, 0), seconds)
+        for route, values in sorted(recorder.latencies.items())
+    }
+    everything = [ms for values in recorder.latencies.values() for ms in values]
+    return {
+        "meta": {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "target": args.url or "in-process",
+            "users": args.users,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "speedup": args.speedup,
+            "gps_latency_ms": args.gps_latency_ms,
+            "dataset": dataset,
+        },
+        "total": summarize(everything, sum(recorder.errors.values()), seconds) if everything else {},
+        "routes": routes,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Print the change of every route against the baseline; return the regressions"""
+    regressions = []
+    print(f"\n{'route':<58}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}")
+    for route, now in report["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if before is None:
+            print(f"{route:<58}{'(new)':>16}")
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            change = (now[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{now[key]:.1f} {change:+.0f}%")
+            # Sub-millisecond moves and thin samples are noise
+            if (key != "p50_ms" and change > tolerance and now[key] - before[key] > 1
+                    and min(now["requests"], before["requests"]) >= MIN_SAMPLES):
+                regressions.append(f"{route} {key}: {before[key]} -> {now[key]} ({change:+.0f}%)")
+        print(f"{route:<58}{cells[0]:>16}{cells[1]:>16}{cells[2]:>16}")
+    return regressions
+
+
+def print_report(report: dict):
+    print(f"\n{'route':<58}{'req':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for route, r in list(report["routes"].items()) + [("TOTAL", report["total"])]:
+        if r:
+            print(f"{route:<58}{r['requests']:>8}{r['errors']:>6}{r['throughput_rps']:>9.1f}"
+                  f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+
+
+# --- Main ----------------------------------------------------------------------
+
+async def run(args) -> int:
+    if args.seed:
+        counts = await seed(args)
+        print(f"Seeded {db.name}: {counts}")
+    dataset = await dataset_counts()
+    gps_server, gps_task = await start_gps_stub(args)
+
+    app = None
+    if args.url:
+        transport = None
+        base_url = args.url
+    else:
+        import server
+        app = server.app
+        await app.router.startup()
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://bench"
+
+    limits = httpx.Limits(max_connections=args.users * 4, max_keepalive_connections=args.users * 4)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=30.0, limits=limits) as http:
+            rng = random.Random(args.random_seed + 1)
+            users = await login_users(http, args.users, rng)
+            start = time.monotonic()
+            recorder = Recorder(start + args.warmup)
+            deadline = start + args.warmup + args.duration
+            await asyncio.gather(*(
+                virtual_user(Session(http, recorder, token, user, random.Random(rng.random())), pick(rng, VIEWS), args.speedup, deadline)
+                for token, user in users
+            ))
+    finally:
+        gps_server.should_exit = True
+        await gps_task
+        if app is not None:
+            await app.router.shutdown()
+
+    report = build_report(recorder, args, dataset)
+    print_report(report)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0f}%:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--seed", action="store_true", help="drop DB_NAME and seed it before the run")
+    parser.add_argument("--tenants", type=int, default=20, help="tenants to seed")
+    parser.add_argument("--vehicles", type=int, default=50, help="mean vehicles per tenant (clients x2, contracts x3)")
+    parser.add_argument("--messages", type=int, default=500, help="mean chat messages per tenant")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--url", help="base URL of a running server; in-process when omitted")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--speedup", type=float, default=10, help="frontend timers run this many times faster")
+    parser.add_argument("--gps-host", default="127.0.0.1", help="address of the GPS provider stub")
+    parser.add_argument("--gps-objects", type=int, default=25, help="objects returned by the GPS stub")
+    parser.add_argument("--gps-latency-ms", type=float, default=100, help="latency of the GPS stub")
+    parser.add_argument("--output", default="load_report.json", help="JSON report to write")
+    parser.add_argument("--baseline", help="JSON report to compare with; exit status 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=10, help="allowed p95/p99 increase over the baseline, in %%")
+    args = parser.parse_args()
+    # One log line per request would cost more than some of the routes
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
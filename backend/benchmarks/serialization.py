@@ -0,0 +1,140 @@
+"""
+Micro-benchmark of list response serialization
+
+For each list model in models/__init__.py, compares the former list
+endpoint path with the fast path in utils.serialization:
+
+  before  ISO strings parsed per row, rows validated against
+          response_model=List[Model], dumped to Python, then json.dumps
+          (what FastAPI's response_model + JSONResponse did)
+  after   rows built with model_construct and dumped to JSON bytes by a
+          cached TypeAdapter
+
+and prints rows per second for both.
+
+    cd backend
+    python -m benchmarks.serialization --rows 1000 --repeat 20
+"""
+from datetime import datetime, timezone, timedelta
+from typing import Callable, List
+import argparse
+import json
+import os
+import time
+import uuid
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "locatrack_bench")
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from models import (  # noqa: E402
+    User, Vehicle, Client, Contract, Reservation, Payment, Maintenance, Infraction, Message, Conversation
+)
+from utils.serialization import dump_rows  # noqa: E402
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+TENANT = str(uuid.uuid4())
+
+
+def at(i: int, days: int = 0) -> datetime:
+    return NOW + timedelta(days=days, minutes=i)
+
+
+SAMPLES = {
+    User: lambda i: {
+        "id": str(uuid.uuid4()), "email": f"employee{i}@example.com", "full_name": f"Employee {i}",
+        "role": "employee", "phone": "0555000000", "tenant_id": TENANT, "is_suspended": False,
+        "created_at": at(i), "last_login": at(i, 1), "password_plain": "secret"
+    },
+    Vehicle: lambda i: {
+        "id": str(uuid.uuid4()), "tenant_id": TENANT, "brand": "Renault", "model": "Clio", "year": 2022,
+        "plate_number": f"{i:05d}-122-16", "color": "blanc", "daily_rate": 4500.0, "status": "available",
+        "fuel_type": "diesel", "transmission": "manual", "mileage": 42000 + i,
+        "insurance_expiry": at(i, 200), "technical_inspection_expiry": at(i, 300), "created_at": at(i)
+    },
+    Client: lambda i: {
+        "id": str(uuid.uuid4()), "tenant_id": TENANT, "full_name": f"Client {i}", "phone": "0555000000",
+        "email": f"client{i}@example.com", "address": "12 rue Didouche Mourad, Alger",
+        "license_number": f"L{i:08d}", "license_issue_date": at(i, -2000), "created_at": at(i)
+    },
+    Contract: lambda i: {
+        "id": str(uuid.uuid4()), "tenant_id": TENANT, "client_id": str(uuid.uuid4()), "vehicle_id": str(uuid.uuid4()),
+        "start_date": at(i), "end_date": at(i, 7), "daily_rate": 4500.0, "total_amount": 31500.0,
+        "insurance_fee": 1500.0, "additional_fees": 0.0, "status": "active", "signed": True,
+        "signed_at": at(i), "created_at": at(i)
+    },
+    Reservation: lambda i: {
+        "id": str(uuid.uuid4()), "tenant_id": TENANT, "client_id": str(uuid.uuid4()), "vehicle_id": str(uuid.uuid4()),
+        "start_date": at(i, 3), "end_date": at(i, 5), "status": "pending", "notes": "Aéroport", "created_at": at(i)
+    },
+    Payment: lambda i: {
+        "id": str(uuid.uuid4()), "tenant_id": TENANT, "contract_id": str(uuid.uuid4()), "amount": 31500.0,
+        "method": "cash", "status": "completed", "reference": f"R{i}", "payment_date": at(i), "created_at": at(i)
+    },
+    Maintenance: lambda i: {
+        "id": str(uuid.uuid4()), "tenant_id": TENANT, "vehicle_id": str(uuid.uuid4()), "type": "vidange",
+        "description": "Vidange et filtres", "cost": 8000.0, "scheduled_date": at(i, 10),
+        "completed_date": None, "status": "scheduled", "notes": None, "created_at": at(i)
+    },
+    Infraction: lambda i: {
+        "id": str(uuid.uuid4()), "tenant_id": TENANT, "vehicle_id": str(uuid.uuid4()), "contract_id": None,
+        "type": "excès de vitesse", "description": "Radar RN5", "fine_amount": 2000.0, "date": at(i, -3),
+        "status": "pending", "location": "RN5", "paid_by": None, "created_at": at(i)
+    },
+    Message: lambda i: {
+        "id": str(uuid.uuid4()), "conversation_id": str(uuid.uuid4()), "sender_id": str(uuid.uuid4()),
+        "sender_name": "Agent", "sender_role": "employee", "content": "Le véhicule est prêt " * 3,
+        "read": False, "created_at": at(i)
+    },
+    Conversation: lambda i: {
+        "id": str(uuid.uuid4()), "tenant_id": TENANT, "participants": [str(uuid.uuid4()), str(uuid.uuid4())],
+        "participant_names": ["A", "B"], "last_message": "Merci", "last_message_at": at(i),
+        "unread_count": {}, "created_at": at(i)
+    },
+}
+
+
+def legacy_rows(rows: List[dict]) -> List[dict]:
+    """The same rows as they were stored before: dates as ISO strings"""
+    return [{k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()} for row in rows]
+
+
+def before(adapter: TypeAdapter, rows: List[dict]) -> str:
+    for row in rows:
+        for field, value in row.items():
+            if isinstance(value, str) and field.endswith(("_at", "_date", "_expiry", "date")):
+                row[field] = datetime.fromisoformat(value)
+    value = adapter.validate_python(rows)
+    content = adapter.dump_python(value, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+
+
+def measure(run: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=1000, help="rows per response")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per path; the best one counts")
+    args = parser.parse_args()
+
+    print(f"{'model':<14}{'before rows/s':>16}{'after rows/s':>16}{'speedup':>10}")
+    for model, sample in SAMPLES.items():
+        rows = [sample(i) for i in range(args.rows)]
+        # FastAPI builds the response field once per route
+        adapter = TypeAdapter(List[model])
+        copies = iter([legacy_rows(rows) for _ in range(args.repeat)])
+        old = measure(lambda: before(adapter, next(copies)), args.repeat)
+        new = measure(lambda: dump_rows(model, rows), args.repeat)
+        print(f"{model.__name__:<14}{args.rows / old:>16,.0f}{args.rows / new:>16,.0f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
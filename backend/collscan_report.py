@@ -0,0 +1,116 @@
+"""
+Report the queries that still scan whole collections
+
+Turns on the MongoDB profiler for the application database (MONGO_URL /
+DB_NAME), runs a command - typically the test suite against a server using
+that database - and lists every profiled operation whose plan was a
+COLLSCAN, grouped by collection and query shape. Declared indexes are
+applied first, as the server would at startup.
+
+    cd backend
+    python collscan_report.py -- python -m pytest ../tests -q
+    python collscan_report.py --json report.json --fail -- python ../backend_test.py
+"""
+from collections import Counter
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+
+from config import db
+import server  # noqa: F401  (imports every router, declaring their indexes)
+from utils.indexes import apply_indexes
+
+
+def query_shape(value):
+    """Replace the values of a query with 1, keeping its structure"""
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in sorted(value.items())}
+    if isinstance(value, list):
+        shapes = [query_shape(v) for v in value]
+        return shapes if any(isinstance(v, (dict, list)) for v in value) else 1
+    return 1
+
+
+def profiled_query(entry: dict):
+    """The filter part of a profiled command, whatever the operation"""
+    command = entry.get('command', {})
+    if 'filter' in command:
+        return command['filter']
+    if 'query' in command:
+        return command['query']
+    if 'q' in command:
+        return command['q']
+    if 'pipeline' in command and command['pipeline']:
+        return command['pipeline'][0].get('$match', {})
+    return {}
+
+
+async def run(args) -> int:
+    await apply_indexes()
+
+    previous = await db.command("profile", -1)
+    if args.profile_size_mb:
+        # The default 1 MB profile collection overflows on a full test run
+        await db.command("profile", 0)
+        await db.drop_collection("system.profile")
+        await db.create_collection("system.profile", capped=True, size=args.profile_size_mb * 1024 * 1024)
+
+    start = datetime.now(timezone.utc)
+    await db.command("profile", 2)
+    try:
+        if args.command:
+            exit_code = await asyncio.to_thread(subprocess.call, args.command)
+        else:
+            await asyncio.to_thread(input, "Profiling; exercise the API, then press Enter to report... ")
+            exit_code = 0
+    finally:
+        await db.command("profile", previous.get('was', 0), slowms=previous.get('slowms', 100))
+
+    scans = Counter()
+    async for entry in db.system.profile.find({
+        "ts": {"$gte": start},
+        "planSummary": {"$regex": "COLLSCAN"},
+        "ns": {"$not": {"$regex": r"\.system\."}}
+    }):
+        shape = json.dumps(query_shape(profiled_query(entry)), sort_keys=True)
+        key = (entry['ns'], entry.get('op'), shape)
+        scans[key] += 1
+
+    report = [
+        {"namespace": ns, "op": op, "query": json.loads(shape), "count": count}
+        for (ns, op, shape), count in scans.most_common()
+    ]
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"command": args.command, "collscans": report}, f, indent=2)
+
+    if report:
+        print(f"\n{len(report)} query shapes did a COLLSCAN:")
+        for row in report:
+            print(f"  {row['count']:>6}x  {row['namespace']:<32} {row['op']:<8} {json.dumps(row['query'])}")
+    else:
+        print("\nNo COLLSCAN recorded.")
+
+    if exit_code:
+        return exit_code
+    return 1 if report and args.fail else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--fail", action="store_true", help="exit with 1 when any COLLSCAN is found")
+    parser.add_argument("--profile-size-mb", type=int, default=16,
+                        help="recreate system.profile with this size (0 keeps the current one)")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="command to run while profiling (after --)")
+    args = parser.parse_args()
+    if args.command and args.command[0] == "--":
+        args.command = args.command[1:]
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
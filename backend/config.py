@@ -6,6 +6,9 @@ from passlib.context import CryptContext
 from fastapi.security import HTTPBearer
 from pathlib import Path
 from dotenv import load_dotenv
+from bson.codec_options import CodecOptions, TypeEncoder, TypeRegistry
+from pymongo import monitoring
+from datetime import date, datetime, timezone
 import os
 
 ROOT_DIR = Path(__file__).parent
@@ -20,17 +23,121 @@ UPLOADS_DIR.mkdir(exist_ok=True)
 GPS_API_URL = os.environ.get('GPS_API_URL', 'https://tracking.gps-14.net/api/api.php')
 GPS_API_KEY = os.environ.get('GPS_API_KEY', '')
 
+
+class CalendarDateEncoder(TypeEncoder):
+    """Calendar dates have no BSON type: store them as midnight UTC"""
+    python_type = date
+
+    def transform_python(self, value):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+
+
+# Dates are stored as BSON dates and decoded as aware UTC datetimes, so
+# documents validate straight into the models and date ranges are indexed queries
+DATE_CODEC_OPTIONS = CodecOptions(tz_aware=True, type_registry=TypeRegistry([CalendarDateEncoder()]))
+
+
+class CommandListeners(monitoring.CommandListener):
+    """Forwards command events to the listeners added with add(); the
+    client is created here, before the modules that record them are imported"""
+
+    def __init__(self):
+        self.listeners = []
+
+    def add(self, listener: monitoring.CommandListener):
+        self.listeners.append(listener)
+
+    def started(self, event):
+        for listener in self.listeners:
+            listener.started(event)
+
+    def succeeded(self, event):
+        for listener in self.listeners:
+            listener.succeeded(event)
+
+    def failed(self, event):
+        for listener in self.listeners:
+            listener.failed(event)
+
+
+command_listeners = CommandListeners()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[command_listeners])
+db = client.get_database(os.environ['DB_NAME'], codec_options=DATE_CODEC_OPTIONS)
+
+# Command monitoring (utils.db_monitor): commands slower than this are logged
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get('SLOW_QUERY_LOG_SIZE', '200'))  # recent slow commands kept for /api/admin/db-stats
+
+# Prometheus metrics at GET /metrics; when a token is set scrapers must send it as a Bearer token
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get('LOOP_LAG_INTERVAL_SECONDS', '0.5'))  # event loop lag sampling
+
+# Request profiles (utils.profiling): the newest PROFILE_BUFFER_SIZE are kept on disk
+PROFILES_DIR = Path(os.environ.get('PROFILES_DIR', str(ROOT_DIR / 'profiles')))
+PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE', '50'))
+
+# Background conversion of legacy ISO-string dates into BSON dates
+DATE_MIGRATION_BATCH_SIZE = int(os.environ.get('DATE_MIGRATION_BATCH_SIZE', '500'))
+
+# Realtime fan-out: 'memory' (single worker) or 'mongo' (shared across workers)
+REALTIME_BACKEND = os.environ.get('REALTIME_BACKEND', 'memory')
+REALTIME_QUEUE_SIZE = int(os.environ.get('REALTIME_QUEUE_SIZE', '100'))
+
+# GPS positions are pushed to sockets at this interval, from one provider poll per tenant
+GPS_PUSH_INTERVAL = float(os.environ.get('GPS_PUSH_INTERVAL', '10'))
+
+# Server-Sent Events: comment line sent on idle streams so proxies keep them open
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+
+# Message retention: messages older than the horizon move to the archive
+MESSAGE_RETENTION_DAYS = int(os.environ.get('MESSAGE_RETENTION_DAYS', '180'))
+ARCHIVE_CHUNK_SIZE = int(os.environ.get('ARCHIVE_CHUNK_SIZE', '200'))  # messages per archive chunk
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '50'))  # chunks per bulk write
+ARCHIVE_INTERVAL_HOURS = float(os.environ.get('ARCHIVE_INTERVAL_HOURS', '24'))
+
+# Read pointers are buffered in memory and flushed in bulk at this interval
+READ_RECEIPT_FLUSH_MS = int(os.environ.get('READ_RECEIPT_FLUSH_MS', '300'))
+
+# Alerts: dirty tenants are refreshed within seconds, every tenant on each sweep
+ALERT_REFRESH_SECONDS = float(os.environ.get('ALERT_REFRESH_SECONDS', '5'))
+ALERT_SWEEP_MINUTES = float(os.environ.get('ALERT_SWEEP_MINUTES', '15'))
+UNPAID_BALANCE_DAYS = int(os.environ.get('UNPAID_BALANCE_DAYS', '90'))  # completed contracts still checked for balances
+
+# Outbound digests: alerts are queued in the `outbox` collection and sent as one
+# digest per recipient. OUTBOX_EMAIL_TRANSPORT is 'smtp', 'http' or '' (disabled).
+OUTBOX_EMAIL_TRANSPORT = os.environ.get('OUTBOX_EMAIL_TRANSPORT', '')
+SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '25'))
+SMTP_USER = os.environ.get('SMTP_USER', '')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', 'false').lower() == 'true'
+SMTP_FROM = os.environ.get('SMTP_FROM', 'LocaTrack <no-reply@locatrack.local>')
+EMAIL_GATEWAY_URL = os.environ.get('EMAIL_GATEWAY_URL', '')
+SMS_GATEWAY_URL = os.environ.get('SMS_GATEWAY_URL', '')  # SMS summaries are only sent when set
+GATEWAY_TOKEN = os.environ.get('GATEWAY_TOKEN', '')
+OUTBOX_POOL_SIZE = int(os.environ.get('OUTBOX_POOL_SIZE', '4'))  # SMTP connections / concurrent gateway calls
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '200'))  # recipients claimed per batch
+OUTBOX_RATE_PER_SECOND = float(os.environ.get('OUTBOX_RATE_PER_SECOND', '20'))  # digests sent per second
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_INTERVAL_SECONDS = float(os.environ.get('OUTBOX_INTERVAL_SECONDS', '60'))
+DIGEST_HOUR_UTC = int(os.environ.get('DIGEST_HOUR_UTC', '6'))
+
+# Authenticated users are cached per token subject; invalidated on user changes
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '60'))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', '10000'))
 
-# Password hashing
+# Password hashing; bcrypt runs in its own bounded thread pool, off the event loop
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
 
 # JWT settings
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+# Access tokens are short-lived; clients renew them with a rotating refresh token
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', '15'))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', '30'))
 
 security = HTTPBearer()
@@ -2,7 +2,7 @@
 Pydantic models for LocaTrack API
 """
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import Generic, List, Optional, TypeVar
 from datetime import datetime, timezone
 import uuid
 
@@ -36,6 +36,7 @@ class User(BaseModel):
     gps_password: Optional[str] = None  # For iTrack
     last_ip: Optional[str] = None
     last_login: Optional[datetime] = None
+    message_retention_days: Optional[int] = None  # Overrides MESSAGE_RETENTION_DAYS for this tenant
     # Store original password for superadmin view (encrypted)
     password_plain: Optional[str] = None
 
@@ -72,9 +73,20 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
     user: User
 
 
+class TokenRefresh(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    refresh_token: str
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
 class UserUpdate(BaseModel):
     full_name: Optional[str] = None
     email: Optional[EmailStr] = None
@@ -254,6 +266,7 @@ class Infraction(BaseModel):
     status: str = "pending"
     location: Optional[str] = None
     paid_by: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class InfractionCreate(BaseModel):
@@ -305,7 +318,9 @@ class MessageCreate(BaseModel):
 class Conversation(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    tenant_id: Optional[str] = None
     participants: List[str]
+    participant_key: Optional[str] = None
     participant_names: List[str]
     last_message: Optional[str] = None
     last_message_at: Optional[datetime] = None
@@ -315,3 +330,12 @@ class Conversation(BaseModel):
 
 class ConversationCreate(BaseModel):
     participant_id: str
+
+
+ItemT = TypeVar("ItemT")
+
+
+class Page(BaseModel, Generic[ItemT]):
+    """One page of a list endpoint; pass next_cursor back as `cursor` for the next one"""
+    items: List[ItemT]
+    next_cursor: Optional[str] = None
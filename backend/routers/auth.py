@@ -5,14 +5,42 @@ from fastapi import APIRouter, HTTPException, Depends, Request
 from datetime import datetime, timezone, timedelta
 
 from config import db
-from models import User, UserRole, UserLogin, LocateurRegister, Token
+from models import User, UserRole, UserLogin, LocateurRegister, Token, TokenRefresh, RefreshRequest
 from utils.auth import hash_password, verify_password, create_access_token, get_current_user
+from utils.dates import parse_datetime
+from utils.principal_cache import principal_cache
+from utils.sessions import create_session, find_session, revoke_session, rotate_session
+from utils.indexes import declare_index
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+declare_index("users", "id", unique=True)
+declare_index("users", "email", unique=True)
+declare_index("users", "role")
+
+
+def get_client_ip(request: Request) -> str:
+    client_ip = request.headers.get("X-Forwarded-For", request.client.host if request.client else "unknown")
+    if client_ip and "," in client_ip:
+        client_ip = client_ip.split(",")[0].strip()
+    return client_ip
+
+
+def account_lockout(user_doc: dict):
+    """Why a user may not sign in or stay signed in, None when they may"""
+    if user_doc.get('is_suspended') and user_doc.get('role') != UserRole.SUPERADMIN:
+        return "Votre compte est suspendu. Contactez l'administrateur."
+    
+    if user_doc.get('role') == UserRole.LOCATEUR:
+        subscription_end = parse_datetime(user_doc.get('subscription_end'))
+        if subscription_end:
+            if subscription_end < datetime.now(timezone.utc):
+                return "Votre abonnement a expiré. Veuillez contacter l'administrateur pour renouveler."
+    return None
+
 
 @router.post("/register", response_model=Token)
-async def register_locateur(locateur_register: LocateurRegister):
+async def register_locateur(locateur_register: LocateurRegister, request: Request):
     """Register a new Locateur (rental company owner)"""
     existing_user = await db.users.find_one({"email": locateur_register.email})
     if existing_user:
@@ -36,16 +64,14 @@ async def register_locateur(locateur_register: LocateurRegister):
     )
     
     doc = user_obj.model_dump()
-    doc['password'] = hash_password(locateur_register.password)
+    doc['password'] = await hash_password(locateur_register.password)
     doc['password_plain'] = locateur_register.password  # Store plain password for superadmin
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['subscription_start'] = doc['subscription_start'].isoformat() if doc['subscription_start'] else None
-    doc['subscription_end'] = doc['subscription_end'].isoformat() if doc['subscription_end'] else None
     
     await db.users.insert_one(doc)
     
     access_token = create_access_token(data={"sub": user_obj.email})
-    return Token(access_token=access_token, token_type="bearer", user=user_obj)
+    refresh_token = await create_session(doc, get_client_ip(request), request.headers.get("User-Agent"))
+    return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token, user=user_obj)
 
 
 @router.post("/login", response_model=Token)
@@ -54,33 +80,24 @@ async def login(user_login: UserLogin, request: Request):
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if not verify_password(user_login.password, user_doc.get('password', '')):
+    if not await verify_password(user_login.password, user_doc.get('password', '')):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if user_doc.get('is_suspended') and user_doc.get('role') != UserRole.SUPERADMIN:
-        raise HTTPException(status_code=403, detail="Votre compte est suspendu. Contactez l'administrateur.")
-    
-    if user_doc.get('role') == UserRole.LOCATEUR:
-        subscription_end = user_doc.get('subscription_end')
-        if subscription_end:
-            if isinstance(subscription_end, str):
-                subscription_end = datetime.fromisoformat(subscription_end)
-            if subscription_end < datetime.now(timezone.utc):
-                raise HTTPException(status_code=403, detail="Votre abonnement a expiré. Veuillez contacter l'administrateur pour renouveler.")
+    lockout = account_lockout(user_doc)
+    if lockout:
+        raise HTTPException(status_code=403, detail=lockout)
     
-    # Get client IP
-    client_ip = request.headers.get("X-Forwarded-For", request.client.host if request.client else "unknown")
-    if client_ip and "," in client_ip:
-        client_ip = client_ip.split(",")[0].strip()
+    client_ip = get_client_ip(request)
     
     # Update last login info
     await db.users.update_one(
         {"email": user_login.email},
         {"$set": {
             "last_ip": client_ip,
-            "last_login": datetime.now(timezone.utc).isoformat()
+            "last_login": datetime.now(timezone.utc)
         }}
     )
+    await principal_cache.invalidate(user_id=user_doc['id'])
     
     del user_doc['password']
     del user_doc['_id']
@@ -89,13 +106,44 @@ async def login(user_login: UserLogin, request: Request):
     user_doc['last_ip'] = client_ip
     user_doc['last_login'] = datetime.now(timezone.utc)
     
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    
     user_obj = User(**user_doc)
     access_token = create_access_token(data={"sub": user_obj.email})
+    refresh_token = await create_session(user_doc, client_ip, request.headers.get("User-Agent"))
     
-    return Token(access_token=access_token, token_type="bearer", user=user_obj)
+    return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token, user=user_obj)
+
+
+@router.post("/refresh", response_model=TokenRefresh)
+async def refresh_access_token(refresh_request: RefreshRequest):
+    """Trade a refresh token for a new access token; the refresh token is rotated"""
+    session = await find_session(refresh_request.refresh_token)
+    if session is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    
+    # Suspension and subscription are checked as at login, or the session would outlive them
+    user_doc = await db.users.find_one(
+        {"id": session['user_id']},
+        {"_id": 0, "role": 1, "is_suspended": 1, "subscription_end": 1}
+    )
+    lockout = account_lockout(user_doc) if user_doc else "Invalid or expired refresh token"
+    if lockout:
+        await revoke_session(refresh_request.refresh_token)
+        raise HTTPException(status_code=401, detail=lockout)
+    
+    rotated = await rotate_session(refresh_request.refresh_token)
+    if rotated is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    
+    session, refresh_token = rotated
+    access_token = create_access_token(data={"sub": session['email']})
+    return TokenRefresh(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+
+@router.post("/logout")
+async def logout(refresh_request: RefreshRequest):
+    """Revoke the session behind a refresh token"""
+    await revoke_session(refresh_request.refresh_token)
+    return {"message": "Logged out"}
 
 
 @router.get("/me", response_model=User)
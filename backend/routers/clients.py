@@ -2,29 +2,39 @@
 Client routes for LocaTrack API
 """
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from typing import List
+from typing import List, Union
 from datetime import datetime
 import uuid
 import shutil
 
-from config import db, UPLOADS_DIR
-from models import User, UserRole, Client, ClientCreate
+from config import UPLOADS_DIR
+from models import User, UserRole, Client, ClientCreate, Page
 from utils.auth import require_role, get_tenant_id
+from utils.indexes import declare_index
+from utils.list_query import ListQuery, list_query
+from utils.pagination import declare_sort_indexes
+from utils.repositories import clients
 
 router = APIRouter(prefix="/clients", tags=["Clients"])
 
+declare_index("clients", "id", unique=True)
+CLIENT_SORT_FIELDS = ("created_at", "full_name")
+declare_sort_indexes("clients", CLIENT_SORT_FIELDS)
 
-@router.get("", response_model=List[Client])
+client_list_query = list_query(
+    Client,
+    filters={"license_number": str, "phone": str, "created_at": datetime},
+    sort_fields=CLIENT_SORT_FIELDS
+)
+
+
+@router.get("", response_model=Union[List[Client], Page[Client]])
 async def get_clients(
+    query: ListQuery = Depends(client_list_query),
     current_user: User = Depends(require_role([UserRole.LOCATEUR, UserRole.EMPLOYEE]))
 ):
     tenant_id = get_tenant_id(current_user)
-    clients = await db.clients.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(1000)
-    for c in clients:
-        for date_field in ['created_at', 'license_issue_date']:
-            if c.get(date_field) and isinstance(c[date_field], str):
-                c[date_field] = datetime.fromisoformat(c[date_field])
-    return clients
+    return await clients.list(tenant_id, query)
 
 
 @router.post("", response_model=Client)
@@ -36,12 +46,7 @@ async def create_client(
     client_data = client_create.model_dump()
     client_data['tenant_id'] = tenant_id
     client_obj = Client(**client_data)
-    doc = client_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    if doc.get('license_issue_date'):
-        doc['license_issue_date'] = doc['license_issue_date'].isoformat()
-    
-    await db.clients.insert_one(doc)
+    await clients.insert(tenant_id, client_obj.model_dump())
     return client_obj
 
 
@@ -52,14 +57,10 @@ async def get_client(
 ):
     """Get a single client by ID"""
     tenant_id = get_tenant_id(current_user)
-    client = await db.clients.find_one({"id": client_id, "tenant_id": tenant_id}, {"_id": 0})
+    client = await clients.get(tenant_id, client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    for date_field in ['created_at', 'license_issue_date']:
-        if client.get(date_field) and isinstance(client[date_field], str):
-            client[date_field] = datetime.fromisoformat(client[date_field])
-    
     return client
 
 
@@ -70,14 +71,7 @@ async def update_client(
     current_user: User = Depends(require_role([UserRole.LOCATEUR, UserRole.EMPLOYEE]))
 ):
     tenant_id = get_tenant_id(current_user)
-    if update_data.get('license_issue_date') and isinstance(update_data['license_issue_date'], str):
-        update_data['license_issue_date'] = datetime.fromisoformat(update_data['license_issue_date'].replace('Z', '+00:00'))
-    
-    result = await db.clients.update_one(
-        {"id": client_id, "tenant_id": tenant_id},
-        {"$set": update_data}
-    )
-    if result.matched_count == 0:
+    if await clients.update(tenant_id, client_id, update_data) is None:
         raise HTTPException(status_code=404, detail="Client not found")
     return {"message": "Client updated"}
 
@@ -88,8 +82,7 @@ async def delete_client(
     current_user: User = Depends(require_role([UserRole.LOCATEUR]))
 ):
     tenant_id = get_tenant_id(current_user)
-    result = await db.clients.delete_one({"id": client_id, "tenant_id": tenant_id})
-    if result.deleted_count == 0:
+    if await clients.delete(tenant_id, client_id) is None:
         raise HTTPException(status_code=404, detail="Client not found")
     return {"message": "Client deleted"}
 
@@ -2,28 +2,52 @@
 Contract routes for LocaTrack API
 """
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from typing import List, Union
 from datetime import datetime, timezone
 
-from config import db
-from models import User, UserRole, Contract, ContractCreate, ContractSign
+from models import User, UserRole, Contract, ContractCreate, ContractSign, Page
 from utils.auth import get_current_user, require_role, get_tenant_id
+from utils.indexes import declare_index
+from utils.list_query import ListQuery, list_query
+from utils.pagination import declare_sort_indexes, empty_page
+from utils.repositories import contracts, vehicles
 
 router = APIRouter(prefix="/contracts", tags=["Contracts"])
 
+declare_index("contracts", "id", unique=True)
+declare_index("contracts", [("tenant_id", 1), ("status", 1), ("created_at", 1), ("id", 1)])
+CONTRACT_SORT_FIELDS = ("created_at", "start_date", "end_date", "total_amount")
+declare_sort_indexes("contracts", CONTRACT_SORT_FIELDS)
+declare_index("contracts", [("tenant_id", 1), ("vehicle_id", 1)])
+declare_index("contracts", [("tenant_id", 1), ("client_id", 1)])
 
-@router.get("", response_model=List[Contract])
-async def get_contracts(current_user: User = Depends(get_current_user)):
+contract_list_query = list_query(
+    Contract,
+    filters={
+        "status": str,
+        "vehicle_id": str,
+        "client_id": str,
+        "signed": bool,
+        "start_date": datetime,
+        "end_date": datetime,
+        "total_amount": float,
+        "created_at": datetime
+    },
+    sort_fields=CONTRACT_SORT_FIELDS,
+    hidden=("signature_data",)
+)
+
+
+@router.get("", response_model=Union[List[Contract], Page[Contract]])
+async def get_contracts(
+    query: ListQuery = Depends(contract_list_query),
+    current_user: User = Depends(get_current_user)
+):
     tenant_id = get_tenant_id(current_user)
     if not tenant_id:
-        return []
+        return empty_page(query.page)
     
-    contracts = await db.contracts.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(1000)
-    for c in contracts:
-        for date_field in ['created_at', 'start_date', 'end_date', 'signed_at']:
-            if c.get(date_field) and isinstance(c[date_field], str):
-                c[date_field] = datetime.fromisoformat(c[date_field])
-    return contracts
+    return await contracts.list(tenant_id, query)
 
 
 @router.post("", response_model=Contract)
@@ -35,15 +59,7 @@ async def create_contract(
     contract_data = contract_create.model_dump()
     contract_data['tenant_id'] = tenant_id
     contract_obj = Contract(**contract_data)
-    
-    doc = contract_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['start_date'] = doc['start_date'].isoformat()
-    doc['end_date'] = doc['end_date'].isoformat()
-    if doc.get('signed_at'):
-        doc['signed_at'] = doc['signed_at'].isoformat()
-    
-    await db.contracts.insert_one(doc)
+    await contracts.insert(tenant_id, contract_obj.model_dump())
     return contract_obj
 
 
@@ -54,14 +70,10 @@ async def get_contract(
 ):
     """Get a single contract by ID"""
     tenant_id = get_tenant_id(current_user)
-    contract = await db.contracts.find_one({"id": contract_id, "tenant_id": tenant_id}, {"_id": 0})
+    contract = await contracts.get(tenant_id, contract_id)
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
-    for date_field in ['created_at', 'start_date', 'end_date', 'signed_at']:
-        if contract.get(date_field) and isinstance(contract[date_field], str):
-            contract[date_field] = datetime.fromisoformat(contract[date_field])
-    
     return contract
 
 
@@ -75,28 +87,15 @@ async def sign_contract(
     update_data = {
         "signed": True,
         "signature_data": signature.signature_data,
-        "signed_at": datetime.now(timezone.utc).isoformat(),
+        "signed_at": datetime.now(timezone.utc),
         "status": "active"
     }
     
-    result = await db.contracts.update_one(
-        {"id": contract_id, "tenant_id": tenant_id},
-        {"$set": update_data}
-    )
-    
-    if result.matched_count == 0:
+    contract_doc = await contracts.update(tenant_id, contract_id, update_data)
+    if contract_doc is None:
         raise HTTPException(status_code=404, detail="Contract not found")
     
-    contract_doc = await db.contracts.find_one({"id": contract_id}, {"_id": 0})
-    await db.vehicles.update_one(
-        {"id": contract_doc['vehicle_id']},
-        {"$set": {"status": "rented"}}
-    )
-    
-    for date_field in ['created_at', 'start_date', 'end_date', 'signed_at']:
-        if contract_doc.get(date_field) and isinstance(contract_doc[date_field], str):
-            contract_doc[date_field] = datetime.fromisoformat(contract_doc[date_field])
-    
+    await vehicles.update(tenant_id, contract_doc['vehicle_id'], {"status": "rented"})
     return Contract(**contract_doc)
 
 
@@ -108,26 +107,14 @@ async def update_contract(
 ):
     """Update a contract"""
     tenant_id = get_tenant_id(current_user)
-    existing = await db.contracts.find_one({"id": contract_id, "tenant_id": tenant_id}, {"_id": 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Contract not found")
-    
-    if existing.get('signed'):
-        raise HTTPException(status_code=400, detail="Cannot modify a signed contract")
-    
-    update_data = contract_update.model_dump()
-    update_data['start_date'] = update_data['start_date'].isoformat() if hasattr(update_data['start_date'], 'isoformat') else update_data['start_date']
-    update_data['end_date'] = update_data['end_date'].isoformat() if hasattr(update_data['end_date'], 'isoformat') else update_data['end_date']
-    
-    await db.contracts.update_one(
-        {"id": contract_id},
-        {"$set": update_data}
+    updated = await contracts.update(
+        tenant_id, contract_id, contract_update.model_dump(), query={"signed": {"$ne": True}}
     )
-    
-    updated = await db.contracts.find_one({"id": contract_id}, {"_id": 0})
-    for date_field in ['created_at', 'start_date', 'end_date', 'signed_at']:
-        if updated.get(date_field) and isinstance(updated[date_field], str):
-            updated[date_field] = datetime.fromisoformat(updated[date_field])
+    if updated is None:
+        # Tell a missing contract from a signed one
+        if await contracts.get(tenant_id, contract_id):
+            raise HTTPException(status_code=400, detail="Cannot modify a signed contract")
+        raise HTTPException(status_code=404, detail="Contract not found")
     
     return Contract(**updated)
 
@@ -139,20 +126,12 @@ async def delete_contract(
 ):
     """Delete a contract (Locateur only)"""
     tenant_id = get_tenant_id(current_user)
-    existing = await db.contracts.find_one({"id": contract_id, "tenant_id": tenant_id}, {"_id": 0})
-    
-    if not existing:
+    existing = await contracts.delete(tenant_id, contract_id)
+    if existing is None:
         raise HTTPException(status_code=404, detail="Contract not found")
     
     # If contract was active, set vehicle back to available
     if existing.get('status') == 'active' and existing.get('vehicle_id'):
-        await db.vehicles.update_one(
-            {"id": existing['vehicle_id']},
-            {"$set": {"status": "available"}}
-        )
-    
-    result = await db.contracts.delete_one({"id": contract_id, "tenant_id": tenant_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Contract not found")
+        await vehicles.update(tenant_id, existing['vehicle_id'], {"status": "available"})
     
     return {"message": "Contract deleted successfully"}
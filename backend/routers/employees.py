@@ -2,15 +2,31 @@
 Employee management routes for LocaTrack API
 """
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from typing import List, Union
 from datetime import datetime
 
 from config import db
-from models import User, UserRole, EmployeeCreate
+from models import User, UserRole, EmployeeCreate, Page
 from utils.auth import hash_password, require_role
+from utils.principal_cache import principal_cache
+from utils.sessions import rename_user_sessions, revoke_user_sessions
+from utils.list_query import ListQuery, list_query
+from utils.pagination import declare_sort_indexes
+from utils.repositories import employees
 
 router = APIRouter(prefix="/employees", tags=["Employees"])
 
+EMPLOYEE_SORT_FIELDS = ("created_at", "full_name", "email")
+# Employees are listed per tenant and role
+declare_sort_indexes("users", EMPLOYEE_SORT_FIELDS, prefix=("tenant_id", "role"))
+
+employee_list_query = list_query(
+    User,
+    filters={"is_suspended": bool, "created_at": datetime},
+    sort_fields=EMPLOYEE_SORT_FIELDS,
+    hidden=("password",)
+)
+
 
 @router.post("", response_model=User)
 async def create_employee(
@@ -32,29 +48,20 @@ async def create_employee(
     )
     
     doc = user_obj.model_dump()
-    doc['password'] = hash_password(employee_create.password)
+    doc['password'] = await hash_password(employee_create.password)
     doc['password_plain'] = employee_create.password  # Store plain password
-    doc['created_at'] = doc['created_at'].isoformat()
     
-    await db.users.insert_one(doc)
+    await employees.insert(current_user.id, doc)
     return user_obj
 
 
-@router.get("", response_model=List[User])
+@router.get("", response_model=Union[List[User], Page[User]])
 async def get_employees(
+    query: ListQuery = Depends(employee_list_query),
     current_user: User = Depends(require_role([UserRole.LOCATEUR]))
 ):
     """Get all employees for this locateur"""
-    employees = await db.users.find(
-        {"tenant_id": current_user.id, "role": UserRole.EMPLOYEE},
-        {"_id": 0, "password": 0}
-    ).to_list(1000)
-    
-    for e in employees:
-        if isinstance(e.get('created_at'), str):
-            e['created_at'] = datetime.fromisoformat(e['created_at'])
-    
-    return employees
+    return await employees.list(current_user.id, query)
 
 
 @router.put("/{employee_id}")
@@ -64,12 +71,12 @@ async def update_employee(
     current_user: User = Depends(require_role([UserRole.LOCATEUR]))
 ):
     """Update an employee"""
-    result = await db.users.update_one(
-        {"id": employee_id, "tenant_id": current_user.id},
-        {"$set": {k: v for k, v in update_data.items() if k not in ['password', 'role', 'tenant_id']}}
-    )
-    if result.matched_count == 0:
+    changes = {k: v for k, v in update_data.items() if k != 'password'}
+    if await employees.update(current_user.id, employee_id, changes) is None:
         raise HTTPException(status_code=404, detail="Employee not found")
+    if update_data.get('email'):
+        await rename_user_sessions(employee_id, update_data['email'])
+    await principal_cache.invalidate(user_id=employee_id)
     return {"message": "Employee updated"}
 
 
@@ -79,7 +86,8 @@ async def delete_employee(
     current_user: User = Depends(require_role([UserRole.LOCATEUR]))
 ):
     """Delete an employee"""
-    result = await db.users.delete_one({"id": employee_id, "tenant_id": current_user.id})
-    if result.deleted_count == 0:
+    if await employees.delete(current_user.id, employee_id) is None:
         raise HTTPException(status_code=404, detail="Employee not found")
+    await revoke_user_sessions(user_id=employee_id)
+    await principal_cache.invalidate(user_id=employee_id)
     return {"message": "Employee deleted"}
@@ -4,20 +4,63 @@ Supports multiple GPS API providers:
 - tracking.gps-14.net
 - iTrack (api.itrack.top)
 """
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from typing import Dict, Optional
 from pydantic import BaseModel
+import asyncio
 import httpx
 import hashlib
 import time
 import logging
 
-from config import db
+from config import db, GPS_PUSH_INTERVAL
 from models import User, UserRole
-from utils.auth import get_current_user
+from utils.auth import get_current_user, get_user_from_token, get_tenant_id
+from utils.leases import acquire_lease, release_lease
+from utils.metrics import counter, histogram
+from utils.realtime import broadcast, forward_events, gps_channel
 
 router = APIRouter(prefix="/gps", tags=["GPS Tracking"])
 
+# One upstream poller per tenant on this worker, shared by all of its sockets;
+# with a cross-worker broadcast backend only the holder of the tenant's lease polls
+_gps_pollers: Dict[str, asyncio.Task] = {}
+_gps_watchers: Dict[str, int] = {}
+
+GPS_LATENCY = histogram("gps_upstream_request_duration_seconds", "GPS provider call latency", ("provider",))
+GPS_ERRORS = counter("gps_upstream_errors_total", "Failed GPS provider calls by kind", ("provider", "kind"))
+
+
+class MeteredTransport(httpx.AsyncBaseTransport):
+    """Records latency and errors of the calls to one GPS provider"""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self._transport = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.TimeoutException:
+            GPS_ERRORS.inc(self.provider, "timeout")
+            raise
+        except httpx.RequestError:
+            GPS_ERRORS.inc(self.provider, "connection")
+            raise
+        finally:
+            GPS_LATENCY.observe(time.perf_counter() - start, self.provider)
+        if response.status_code >= 400:
+            GPS_ERRORS.inc(self.provider, f"http_{response.status_code // 100}xx")
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def gps_client(provider: str, timeout: float = 30.0) -> httpx.AsyncClient:
+    return httpx.AsyncClient(timeout=timeout, transport=MeteredTransport(provider))
+
 
 class GPSConfig(BaseModel):
     provider: str  # 'gps14' or 'itrack'
@@ -37,6 +80,11 @@ async def get_locateur_gps_config(current_user: User):
     else:
         return None
     
+    return await get_tenant_gps_config(locateur_id)
+
+
+async def get_tenant_gps_config(locateur_id: str):
+    """Get GPS API configuration of a tenant's locateur"""
     locateur = await db.users.find_one(
         {"id": locateur_id}, 
         {"_id": 0, "gps_api_key": 1, "gps_api_url": 1, "gps_provider": 1, "gps_account": 1, "gps_password": 1}
@@ -64,7 +112,7 @@ async def get_itrack_token(account: str, password: str):
     signature = hashlib.md5(f"{password_md5}{timestamp}".encode()).hexdigest()
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with gps_client("itrack") as client:
             response = await client.get(
                 "https://api.itrack.top/api/authorization",
                 params={
@@ -84,16 +132,8 @@ async def get_itrack_token(account: str, password: str):
         raise HTTPException(status_code=502, detail=f"iTrack connection error: {str(e)}")
 
 
-@router.get("/objects")
-async def get_gps_objects(
-    current_user: User = Depends(get_current_user)
-):
-    """Get all GPS tracked objects from the configured GPS API"""
-    config = await get_locateur_gps_config(current_user)
-    
-    if not config:
-        raise HTTPException(status_code=400, detail="Configuration GPS non trouvée")
-    
+async def fetch_gps_objects(config: dict):
+    """Fetch all tracked objects from the provider described by `config`"""
     provider = config.get("provider", "gps14")
     
     # GPS-14.net API
@@ -102,7 +142,7 @@ async def get_gps_objects(
             raise HTTPException(status_code=400, detail="Clé API GPS non configurée. Veuillez configurer votre clé API GPS dans les paramètres.")
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with gps_client("gps14") as client:
                 response = await client.get(
                     config.get("api_url", "https://tracking.gps-14.net/api/api.php"),
                     params={"api": "user", "key": config["api_key"], "cmd": "USER_GET_OBJECTS"}
@@ -139,7 +179,7 @@ async def get_gps_objects(
         try:
             access_token = await get_itrack_token(config["account"], config["password"])
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with gps_client("itrack") as client:
                 # Get device list
                 response = await client.get(
                     "https://api.itrack.top/api/device/list",
@@ -207,6 +247,19 @@ async def get_gps_objects(
         raise HTTPException(status_code=400, detail=f"Provider GPS non supporté: {provider}")
 
 
+@router.get("/objects")
+async def get_gps_objects(
+    current_user: User = Depends(get_current_user)
+):
+    """Get all GPS tracked objects from the configured GPS API"""
+    config = await get_locateur_gps_config(current_user)
+    
+    if not config:
+        raise HTTPException(status_code=400, detail="Configuration GPS non trouvée")
+    
+    return await fetch_gps_objects(config)
+
+
 @router.get("/track/{imei}")
 async def get_single_track(
     imei: str,
@@ -227,7 +280,7 @@ async def get_single_track(
         try:
             access_token = await get_itrack_token(config["account"], config["password"])
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with gps_client("itrack") as client:
                 response = await client.get(
                     "https://api.itrack.top/api/track",
                     params={"access_token": access_token, "imeis": imei}
@@ -268,7 +321,7 @@ async def get_single_track(
             raise HTTPException(status_code=400, detail="Clé API GPS non configurée")
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with gps_client("gps14") as client:
                 response = await client.get(
                     config.get("api_url", "https://tracking.gps-14.net/api/api.php"),
                     params={"api": "user", "key": config["api_key"], "cmd": f"OBJECT_GET_LOCATIONS,{imei}"}
@@ -298,7 +351,7 @@ async def get_playback(
     try:
         access_token = await get_itrack_token(config["account"], config["password"])
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with gps_client("itrack", timeout=60.0) as client:
             response = await client.get(
                 "https://api.itrack.top/api/playback",
                 params={
@@ -355,7 +408,7 @@ async def get_devices_list(
     try:
         access_token = await get_itrack_token(config["account"], config["password"])
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with gps_client("itrack") as client:
             response = await client.get(
                 "https://api.itrack.top/api/device/list",
                 params={"access_token": access_token, "account": config["account"]}
@@ -387,3 +440,73 @@ async def get_devices_list(
     except Exception as e:
         logging.error(f"iTrack devices error: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur iTrack: {str(e)}")
+
+
+async def poll_tenant_gps(tenant_id: str):
+    """Fetch the tenant's positions once per interval and publish them.
+    
+    The tenant's GPS settings are read on every tick, so changes apply without
+    reconnecting. With a cross-worker broadcast backend, workers take turns
+    through a lease: one provider call per tenant, whatever the worker count.
+    """
+    lease = f"gps:{tenant_id}"
+    try:
+        while True:
+            try:
+                if not broadcast.shared or await acquire_lease(lease, GPS_PUSH_INTERVAL * 3):
+                    config = await get_tenant_gps_config(tenant_id)
+                    if not config:
+                        raise HTTPException(status_code=400, detail="Configuration GPS non trouvée")
+                    objects = await fetch_gps_objects(config)
+                    await broadcast.publish(gps_channel(tenant_id), {"type": "gps_objects", "objects": objects})
+            except asyncio.CancelledError:
+                raise
+            except HTTPException as e:
+                await broadcast.publish(gps_channel(tenant_id), {"type": "gps_error", "detail": e.detail})
+            except Exception as e:
+                logging.error(f"GPS push error for tenant {tenant_id}: {e}")
+            await asyncio.sleep(GPS_PUSH_INTERVAL)
+    finally:
+        if broadcast.shared:
+            # Hand over to a worker that still has sockets for this tenant
+            try:
+                await release_lease(lease)
+            except Exception as e:
+                logging.warning(f"GPS lease of tenant {tenant_id} not released: {e}")
+
+
+@router.websocket("/ws")
+async def gps_socket(websocket: WebSocket, token: str):
+    """Stream the tenant's vehicle positions instead of polling /gps/objects"""
+    try:
+        current_user = await get_user_from_token(token)
+    except HTTPException as e:
+        await websocket.close(code=4401, reason=e.detail)
+        return
+    
+    tenant_id = get_tenant_id(current_user)
+    if not tenant_id:
+        await websocket.close(code=4403, reason="No tenant associated")
+        return
+    
+    await websocket.accept()
+    
+    subscription = broadcast.subscribe([gps_channel(tenant_id)])
+    sender = asyncio.create_task(forward_events(websocket, subscription))
+    
+    _gps_watchers[tenant_id] = _gps_watchers.get(tenant_id, 0) + 1
+    if tenant_id not in _gps_pollers:
+        _gps_pollers[tenant_id] = asyncio.create_task(poll_tenant_gps(tenant_id))
+    
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        broadcast.unsubscribe(subscription)
+        _gps_watchers[tenant_id] -= 1
+        if _gps_watchers[tenant_id] == 0:
+            del _gps_watchers[tenant_id]
+            _gps_pollers.pop(tenant_id).cancel()
@@ -2,27 +2,46 @@
 Infraction routes for LocaTrack API
 """
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from typing import List, Union
 from datetime import datetime
 
-from config import db
-from models import User, UserRole, Infraction, InfractionCreate
+from models import User, UserRole, Infraction, InfractionCreate, Page
 from utils.auth import require_role, get_tenant_id
+from utils.indexes import declare_index
+from utils.list_query import ListQuery, list_query
+from utils.pagination import declare_sort_indexes
+from utils.repositories import infractions
 
 router = APIRouter(prefix="/infractions", tags=["Infractions"])
 
+declare_index("infractions", "id", unique=True)
+declare_index("infractions", [("tenant_id", 1), ("status", 1), ("created_at", 1), ("id", 1)])
+INFRACTION_SORT_FIELDS = ("created_at", "date", "fine_amount")
+declare_sort_indexes("infractions", INFRACTION_SORT_FIELDS)
+declare_index("infractions", [("tenant_id", 1), ("vehicle_id", 1)])
 
-@router.get("", response_model=List[Infraction])
+infraction_list_query = list_query(
+    Infraction,
+    filters={
+        "status": str,
+        "vehicle_id": str,
+        "contract_id": str,
+        "type": str,
+        "fine_amount": float,
+        "date": datetime,
+        "created_at": datetime
+    },
+    sort_fields=INFRACTION_SORT_FIELDS
+)
+
+
+@router.get("", response_model=Union[List[Infraction], Page[Infraction]])
 async def get_infractions(
+    query: ListQuery = Depends(infraction_list_query),
     current_user: User = Depends(require_role([UserRole.LOCATEUR, UserRole.EMPLOYEE]))
 ):
     tenant_id = get_tenant_id(current_user)
-    infractions = await db.infractions.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(1000)
-    for i in infractions:
-        for date_field in ['created_at', 'date']:
-            if i.get(date_field) and isinstance(i[date_field], str):
-                i[date_field] = datetime.fromisoformat(i[date_field])
-    return infractions
+    return await infractions.list(tenant_id, query)
 
 
 @router.post("", response_model=Infraction)
@@ -35,10 +54,8 @@ async def create_infraction(
     infraction_data['tenant_id'] = tenant_id
     infraction_obj = Infraction(**infraction_data)
     doc = infraction_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['date'] = doc['date'].isoformat()
     
-    await db.infractions.insert_one(doc)
+    await infractions.insert(tenant_id, doc)
     return infraction_obj
 
 
@@ -49,10 +66,6 @@ async def update_infraction(
     current_user: User = Depends(require_role([UserRole.LOCATEUR, UserRole.EMPLOYEE]))
 ):
     tenant_id = get_tenant_id(current_user)
-    result = await db.infractions.update_one(
-        {"id": infraction_id, "tenant_id": tenant_id},
-        {"$set": update_data}
-    )
-    if result.matched_count == 0:
+    if await infractions.update(tenant_id, infraction_id, update_data) is None:
         raise HTTPException(status_code=404, detail="Infraction not found")
     return {"message": "Infraction updated"}
@@ -2,27 +2,46 @@
 Maintenance routes for LocaTrack API
 """
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from typing import List, Union
 from datetime import datetime, timezone, timedelta
 
-from config import db
-from models import User, UserRole, Maintenance, MaintenanceCreate
+from models import User, UserRole, Maintenance, MaintenanceCreate, Page
 from utils.auth import require_role, get_tenant_id
+from utils.indexes import declare_index
+from utils.list_query import ListQuery, list_query
+from utils.pagination import declare_sort_indexes
+from utils.repositories import maintenance, vehicles
 
 router = APIRouter(prefix="/maintenance", tags=["Maintenance"])
 
+declare_index("maintenance", "id", unique=True)
+declare_index("maintenance", [("tenant_id", 1), ("status", 1), ("created_at", 1), ("id", 1)])
+MAINTENANCE_SORT_FIELDS = ("created_at", "scheduled_date", "cost")
+declare_sort_indexes("maintenance", MAINTENANCE_SORT_FIELDS)
+declare_index("maintenance", [("tenant_id", 1), ("vehicle_id", 1)])
 
-@router.get("", response_model=List[Maintenance])
+maintenance_list_query = list_query(
+    Maintenance,
+    filters={
+        "status": str,
+        "vehicle_id": str,
+        "type": str,
+        "cost": float,
+        "scheduled_date": datetime,
+        "completed_date": datetime,
+        "created_at": datetime
+    },
+    sort_fields=MAINTENANCE_SORT_FIELDS
+)
+
+
+@router.get("", response_model=Union[List[Maintenance], Page[Maintenance]])
 async def get_maintenance(
+    query: ListQuery = Depends(maintenance_list_query),
     current_user: User = Depends(require_role([UserRole.LOCATEUR, UserRole.EMPLOYEE]))
 ):
     tenant_id = get_tenant_id(current_user)
-    maintenances = await db.maintenance.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(1000)
-    for m in maintenances:
-        for date_field in ['created_at', 'scheduled_date', 'completed_date']:
-            if m.get(date_field) and isinstance(m[date_field], str):
-                m[date_field] = datetime.fromisoformat(m[date_field])
-    return maintenances
+    return await maintenance.list(tenant_id, query)
 
 
 @router.post("", response_model=Maintenance)
@@ -34,19 +53,8 @@ async def create_maintenance(
     maintenance_data = maintenance_create.model_dump()
     maintenance_data['tenant_id'] = tenant_id
     maintenance_obj = Maintenance(**maintenance_data)
-    doc = maintenance_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['scheduled_date'] = doc['scheduled_date'].isoformat()
-    if doc.get('completed_date'):
-        doc['completed_date'] = doc['completed_date'].isoformat()
-    
-    await db.maintenance.insert_one(doc)
-    
-    await db.vehicles.update_one(
-        {"id": maintenance_create.vehicle_id, "tenant_id": tenant_id},
-        {"$set": {"status": "maintenance"}}
-    )
-    
+    await maintenance.insert(tenant_id, maintenance_obj.model_dump())
+    await vehicles.update(tenant_id, maintenance_create.vehicle_id, {"status": "maintenance"})
     return maintenance_obj
 
 
@@ -58,17 +66,17 @@ async def get_maintenance_alerts(
     today = datetime.now(timezone.utc)
     week_later = today + timedelta(days=7)
     
-    upcoming = await db.maintenance.find(
+    upcoming = await maintenance.find(
+        tenant_id,
         {
-            "tenant_id": tenant_id,
             "status": "scheduled",
             "scheduled_date": {
-                "$gte": today.isoformat(),
-                "$lte": week_later.isoformat()
+                "$gte": today,
+                "$lte": week_later
             }
         },
-        {"_id": 0}
-    ).to_list(100)
+        limit=100
+    )
     
     return {"alerts": upcoming, "count": len(upcoming)}
 
@@ -80,10 +88,6 @@ async def update_maintenance(
     current_user: User = Depends(require_role([UserRole.LOCATEUR, UserRole.EMPLOYEE]))
 ):
     tenant_id = get_tenant_id(current_user)
-    result = await db.maintenance.update_one(
-        {"id": maintenance_id, "tenant_id": tenant_id},
-        {"$set": update_data}
-    )
-    if result.matched_count == 0:
+    if await maintenance.update(tenant_id, maintenance_id, update_data) is None:
         raise HTTPException(status_code=404, detail="Maintenance not found")
     return {"message": "Maintenance updated"}
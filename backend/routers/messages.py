@@ -1,15 +1,245 @@
 """
 Messaging routes for LocaTrack API
 """
-from fastapi import APIRouter, HTTPException, Depends
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import re
 
 from config import db
 from models import User, UserRole, Message, Conversation, MessageCreate, ConversationCreate
-from utils.auth import get_current_user
+from utils.auth import get_current_user, get_user_from_token, get_tenant_id
+from utils.dates import parse_datetime
+from utils.indexes import declare_index
+from utils.metrics import cache_lookup
+from utils.realtime import broadcast, forward_events, user_channel, conversation_channel
+from utils.retention import find_archived_message, load_archived_page
+from utils.read_receipts import ReadReceiptBuffer
 
 router = APIRouter(prefix="/messages", tags=["Messages"])
 
+declare_index("conversations", "id", unique=True)
+declare_index("conversations", "participants")
+# Applied after backfill_participant_keys so legacy conversations have a key
+declare_index("conversations", "participant_key", unique=True)
+declare_index("messages", "id", unique=True)
+declare_index("messages", [("conversation_id", 1), ("created_at", 1), ("id", 1)])
+declare_index("messages", [("content", "text")], default_language="none", name="content_text")
+declare_index("unread_totals", "user_id", unique=True)
+
+
+# Participants never change once a conversation exists, so the send path
+# can build its $inc without reading the conversation first
+PARTICIPANTS_CACHE_SIZE = 10000
+_participants_cache: "OrderedDict[str, List[str]]" = OrderedDict()
+
+SNIPPET_WIDTH = 120
+
+
+def get_participant_key(participants: List[str]) -> str:
+    """Canonical, order-independent key identifying a set of participants"""
+    return ":".join(sorted(participants))
+
+
+async def backfill_participant_keys():
+    """Add participant_key to conversations created before it existed"""
+    legacy = await db.conversations.find(
+        {"participant_key": {"$exists": False}},
+        {"_id": 0, "id": 1, "participants": 1}
+    ).to_list(None)
+    
+    if legacy:
+        await db.conversations.bulk_write([
+            UpdateOne({"id": c['id']}, {"$set": {"participant_key": get_participant_key(c['participants'])}})
+            for c in legacy
+        ], ordered=False)
+
+
+def participant_tenant(user: dict) -> Optional[str]:
+    if user.get('role') == UserRole.LOCATEUR:
+        return user['id']
+    return user.get('tenant_id')
+
+
+async def backfill_conversation_tenants():
+    """Add tenant_id to conversations created before it existed, from their participants"""
+    legacy = await db.conversations.find(
+        {"tenant_id": None},
+        {"_id": 0, "id": 1, "participants": 1}
+    ).to_list(None)
+    if not legacy:
+        return
+    
+    users = await db.users.find(
+        {"id": {"$in": list({p for c in legacy for p in c['participants']})}},
+        {"_id": 0, "id": 1, "role": 1, "tenant_id": 1}
+    ).to_list(None)
+    tenants = {u['id']: participant_tenant(u) for u in users}
+    
+    writes = []
+    for c in legacy:
+        # Superadmin-only conversations have no tenant and keep the default horizon
+        tenant_id = next((tenants[p] for p in c['participants'] if tenants.get(p)), None)
+        if tenant_id:
+            writes.append(UpdateOne({"id": c['id'], "tenant_id": None}, {"$set": {"tenant_id": tenant_id}}))
+    if writes:
+        await db.conversations.bulk_write(writes, ordered=False)
+
+
+async def get_conversation_participants(conversation_id: str) -> Optional[List[str]]:
+    participants = _participants_cache.get(conversation_id)
+    cache_lookup("conversation_participants", participants is not None)
+    if participants is not None:
+        _participants_cache.move_to_end(conversation_id)
+        return participants
+    
+    conversation = await db.conversations.find_one({"id": conversation_id}, {"_id": 0, "participants": 1})
+    if not conversation:
+        return None
+    
+    _participants_cache[conversation_id] = conversation['participants']
+    if len(_participants_cache) > PARTICIPANTS_CACHE_SIZE:
+        _participants_cache.popitem(last=False)
+    return conversation['participants']
+
+
+def build_snippet(content: str, terms: List[str], width: int = SNIPPET_WIDTH):
+    """Cut a window of `content` around the first matched term.
+    
+    Returns the snippet and the [start, end) offsets of every term occurrence
+    inside it, so clients can highlight without parsing markup.
+    """
+    pattern = re.compile(r"(?<!\w)(" + "|".join(re.escape(t) for t in terms) + r")(?!\w)", re.IGNORECASE) if terms else None
+    first = pattern.search(content) if pattern else None
+    
+    start = 0
+    if first and len(content) > width:
+        start = max(0, min(first.start() - width // 3, len(content) - width))
+    end = min(len(content), start + width)
+    
+    snippet = content[start:end]
+    highlights = [[m.start(), m.end()] for m in pattern.finditer(snippet)] if pattern else []
+    
+    if start > 0:
+        snippet = "…" + snippet
+        highlights = [[a + 1, b + 1] for a, b in highlights]
+    if end < len(content):
+        snippet += "…"
+    
+    return snippet, highlights
+
+
+SEARCH_TOKEN = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+
+def parse_search_query(q: str) -> Tuple[str, List[str]]:
+    """The $text search string for `q` and the terms to highlight.
+    
+    Tokens are separated by whitespace; a leading '-' negates the whole token.
+    Hyphens inside a token are part of the term (plates like AB-123-CD), so
+    such tokens are searched as phrases: $text would split them into words.
+    """
+    search, terms = [], []
+    for negated, phrase, token in SEARCH_TOKEN.findall(q):
+        if token:
+            negated, token = token.startswith("-"), token.lstrip("-")
+            # Punctuation around a word is not part of it
+            term = re.sub(r"^\W+|\W+$", "", token)
+            if not term:
+                continue
+            quoted = f'"{term}"' if "-" in term else term
+        else:
+            term = phrase.strip()
+            if not term:
+                continue
+            quoted = f'"{term}"'
+        search.append(f"-{quoted}" if negated else quoted)
+        if not negated:
+            terms.append(term)
+    return " ".join(search), terms
+
+
+async def resync_unread_total(user_id: str) -> int:
+    """Recompute a user's unread total from their conversations and store it"""
+    conversations = await db.conversations.find(
+        {"participants": user_id},
+        {"_id": 0, f"unread_count.{user_id}": 1}
+    ).to_list(None)
+    
+    total = sum(c.get('unread_count', {}).get(user_id, 0) for c in conversations)
+    await db.unread_totals.update_one(
+        {"user_id": user_id},
+        {"$set": {"unread_count": total}},
+        upsert=True
+    )
+    return total
+
+
+async def get_unread_total(user_id: str) -> int:
+    totals = await db.unread_totals.find_one({"user_id": user_id}, {"_id": 0, "unread_count": 1})
+    if totals is None:
+        return await resync_unread_total(user_id)
+    return max(totals['unread_count'], 0)
+
+
+async def publish_unread_count(user_id: str, conversation_id: str, conversation_unread: int, total: Optional[int] = None):
+    """Push the new unread badge state to the user's open sockets"""
+    await broadcast.publish(user_channel(user_id), {
+        "type": "unread_count",
+        "conversation_id": conversation_id,
+        "conversation_unread": conversation_unread,
+        "unread_count": total if total is not None else await get_unread_total(user_id)
+    })
+
+
+async def publish_flushed_reads(flushed: Dict[Tuple[str, str], int]):
+    """Unread counters were updated by the flush: resync and push badge totals"""
+    totals = {}
+    for user_id in {user_id for _, user_id in flushed}:
+        totals[user_id] = await resync_unread_total(user_id)
+    for (conversation_id, user_id), unread in flushed.items():
+        await publish_unread_count(user_id, conversation_id, unread, totals[user_id])
+
+
+read_receipts = ReadReceiptBuffer(after_flush=publish_flushed_reads)
+
+
+def get_read_pointer(conversation: dict, user_id: str):
+    pending = read_receipts.pending_read_at(conversation['id'], user_id)
+    stored = parse_datetime(conversation.get('read_at', {}).get(user_id))
+    if pending is None or (stored is not None and stored > pending):
+        return stored
+    return pending
+
+
+def apply_read_state(messages: List[dict], conversation: dict):
+    """Derive each message's read flag from the participants' read pointers"""
+    pointers = {p: get_read_pointer(conversation, p) for p in conversation['participants']}
+    for m in messages:
+        readers = [p for p in conversation['participants'] if p != m['sender_id']]
+        pointer = min((pointers[p] for p in readers if pointers[p] is not None), default=None)
+        # Legacy string dates until the date migration has reached them
+        if pointer is not None and parse_datetime(m['created_at']) <= pointer:
+            m['read'] = True
+        else:
+            # Messages from before read pointers existed carry their own flag
+            m['read'] = m.get('read', False)
+
+
+async def mark_conversation_read(conversation_id: str, current_user: User, read_at):
+    """Move the user's read pointer forward and notify the other participants"""
+    read_receipts.mark_read(conversation_id, current_user.id, read_at)
+    
+    await broadcast.publish(conversation_channel(conversation_id), {
+        "type": "read",
+        "conversation_id": conversation_id,
+        "user_id": current_user.id,
+        "read_at": read_at
+    })
+
 
 @router.get("/conversations")
 async def get_conversations(
@@ -21,11 +251,6 @@ async def get_conversations(
         {"_id": 0}
     ).sort("last_message_at", -1).to_list(100)
     
-    for c in conversations:
-        for date_field in ['created_at', 'last_message_at']:
-            if c.get(date_field) and isinstance(c[date_field], str):
-                c[date_field] = datetime.fromisoformat(c[date_field])
-    
     return conversations
 
 
@@ -35,66 +260,129 @@ async def create_conversation(
     current_user: User = Depends(get_current_user)
 ):
     """Create a new conversation with another user"""
-    other_user = await db.users.find_one({"id": conv_create.participant_id}, {"_id": 0, "password": 0})
+    other_user = await db.users.find_one(
+        {"id": conv_create.participant_id},
+        {"_id": 0, "id": 1, "full_name": 1, "role": 1, "tenant_id": 1}
+    )
     if not other_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    existing = await db.conversations.find_one({
-        "participants": {"$all": [current_user.id, conv_create.participant_id]}
-    }, {"_id": 0})
-    
-    if existing:
-        if existing.get('created_at') and isinstance(existing['created_at'], str):
-            existing['created_at'] = datetime.fromisoformat(existing['created_at'])
-        if existing.get('last_message_at') and isinstance(existing['last_message_at'], str):
-            existing['last_message_at'] = datetime.fromisoformat(existing['last_message_at'])
-        return existing
+    # The tenant owning the conversation decides its message retention
+    tenant_id = get_tenant_id(current_user) or other_user.get('tenant_id')
+    if not tenant_id and other_user.get('role') == UserRole.LOCATEUR:
+        tenant_id = other_user['id']
     
+    participants = [current_user.id, conv_create.participant_id]
     conversation = Conversation(
-        participants=[current_user.id, conv_create.participant_id],
+        tenant_id=tenant_id,
+        participants=participants,
+        participant_key=get_participant_key(participants),
         participant_names=[current_user.full_name, other_user['full_name']],
         unread_count={current_user.id: 0, conv_create.participant_id: 0}
     )
     
     doc = conversation.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     
-    await db.conversations.insert_one(doc)
+    try:
+        existing = await db.conversations.find_one_and_update(
+            {"participant_key": conversation.participant_key},
+            {"$setOnInsert": doc},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # A concurrent request inserted the same pair first
+        existing = await db.conversations.find_one({"participant_key": conversation.participant_key}, {"_id": 0})
+    
+    if existing:
+        return existing
+    
+    for participant_id in conversation.participants:
+        await broadcast.publish(user_channel(participant_id), {
+            "type": "conversation",
+            "conversation": conversation
+        })
+    
     return conversation
 
 
 @router.get("/conversations/{conversation_id}")
 async def get_conversation_messages(
     conversation_id: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all messages in a conversation"""
+    """Get a page of messages in a conversation, oldest first.
+    
+    Defaults to the most recent page. `before=<message_id>` pages back through
+    history, `after=<message_id>` returns only messages newer than the cursor.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    
     conversation = await db.conversations.find_one(
         {"id": conversation_id, "participants": current_user.id},
-        {"_id": 0}
+        {"_id": 0, "id": 1, "participants": 1, "read_at": 1}
     )
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    messages = await db.messages.find(
-        {"conversation_id": conversation_id},
-        {"_id": 0}
-    ).sort("created_at", 1).to_list(1000)
+    query = {"conversation_id": conversation_id}
+    cursor_id = before or after
+    cursor_archived = False
+    if cursor_id:
+        cursor_message = await db.messages.find_one(
+            {"id": cursor_id, "conversation_id": conversation_id},
+            {"_id": 0, "id": 1, "created_at": 1}
+        )
+        if not cursor_message:
+            cursor_message = await find_archived_message(conversation_id, cursor_id)
+            cursor_archived = True
+        if not cursor_message:
+            raise HTTPException(status_code=400, detail="Invalid message cursor")
+        
+        op = "$gt" if after else "$lt"
+        query["$or"] = [
+            {"created_at": {op: cursor_message['created_at']}},
+            {"created_at": cursor_message['created_at'], "id": {op: cursor_message['id']}}
+        ]
     
-    for m in messages:
-        if m.get('created_at') and isinstance(m['created_at'], str):
-            m['created_at'] = datetime.fromisoformat(m['created_at'])
+    direction = 1 if after else -1
+    messages = []
+    # Everything in the hot collection is newer than an archived cursor
+    if not (before and cursor_archived):
+        messages = await db.messages.find(query, {"_id": 0}).sort(
+            [("created_at", direction), ("id", direction)]
+        ).limit(limit).to_list(limit)
     
-    await db.messages.update_many(
-        {"conversation_id": conversation_id, "sender_id": {"$ne": current_user.id}, "read": False},
-        {"$set": {"read": True}}
-    )
+    if direction == -1:
+        if len(messages) < limit:
+            oldest = messages[-1] if messages else (cursor_message if before else None)
+            messages += await load_archived_page(
+                conversation_id,
+                limit - len(messages),
+                (oldest['created_at'], oldest['id']) if oldest else None
+            )
+        messages.reverse()
     
-    await db.conversations.update_one(
-        {"id": conversation_id},
-        {"$set": {f"unread_count.{current_user.id}": 0}}
+    apply_read_state(messages, conversation)
+    
+    # Only move the pointer when this page shows something not yet read;
+    # older history pages never do
+    newest_unread = next(
+        (
+            parse_datetime(m['created_at'])
+            for m in reversed(messages) if m['sender_id'] != current_user.id and not m['read']
+        ),
+        None
     )
+    my_pointer = get_read_pointer(conversation, current_user.id)
+    if not before and newest_unread and (my_pointer is None or newest_unread > my_pointer):
+        await mark_conversation_read(conversation_id, current_user, messages[-1]['created_at'])
     
     return messages
 
@@ -105,41 +393,68 @@ async def send_message(
     current_user: User = Depends(get_current_user)
 ):
     """Send a message in a conversation"""
-    conversation = await db.conversations.find_one(
-        {"id": message_create.conversation_id, "participants": current_user.id},
-        {"_id": 0}
-    )
-    
-    if not conversation:
+    conversation_id = message_create.conversation_id
+    participants = await get_conversation_participants(conversation_id)
+    if not participants or current_user.id not in participants:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     message = Message(
-        conversation_id=message_create.conversation_id,
+        conversation_id=conversation_id,
         sender_id=current_user.id,
         sender_name=current_user.full_name,
         sender_role=current_user.role,
         content=message_create.content
     )
     
-    doc = message.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = message.model_dump(exclude={"read"})
     
-    await db.messages.insert_one(doc)
+    recipients = [p for p in participants if p != current_user.id]
     
-    other_participant = [p for p in conversation['participants'] if p != current_user.id][0]
-    current_unread = conversation.get('unread_count', {}).get(other_participant, 0)
-    
-    await db.conversations.update_one(
-        {"id": message_create.conversation_id},
+    # One round trip authorizes the sender, bumps the recipients' counters
+    # and records the conversation preview
+    conversation = await db.conversations.find_one_and_update(
+        {"id": conversation_id, "participants": current_user.id},
         {
             "$set": {
                 "last_message": message_create.content[:100],
-                "last_message_at": doc['created_at'],
-                f"unread_count.{other_participant}": current_unread + 1
-            }
-        }
+                "last_message_at": doc['created_at']
+            },
+            "$inc": {f"unread_count.{p}": 1 for p in recipients}
+        },
+        projection={"_id": 0, "unread_count": 1},
+        return_document=ReturnDocument.AFTER
     )
     
+    if not conversation:
+        _participants_cache.pop(conversation_id, None)
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    totals = await asyncio.gather(
+        *[
+            db.unread_totals.find_one_and_update(
+                {"user_id": p},
+                {"$inc": {"unread_count": 1}},
+                projection={"_id": 0, "unread_count": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            for p in recipients
+        ],
+        db.messages.insert_one(doc)
+    )
+    
+    await broadcast.publish(conversation_channel(conversation_id), {
+        "type": "message",
+        "conversation_id": conversation_id,
+        "message": message
+    })
+    for recipient, recipient_totals in zip(recipients, totals):
+        await publish_unread_count(
+            recipient,
+            conversation_id,
+            conversation.get('unread_count', {}).get(recipient, 0),
+            recipient_totals['unread_count'] if recipient_totals else None
+        )
+    
     return message
 
 
@@ -148,13 +463,52 @@ async def get_unread_count(
     current_user: User = Depends(get_current_user)
 ):
     """Get total unread messages count"""
+    return {"unread_count": await get_unread_total(current_user.id)}
+
+
+@router.get("/search")
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    """Full-text search over the messages of the caller's conversations"""
     conversations = await db.conversations.find(
         {"participants": current_user.id},
-        {"_id": 0, "unread_count": 1}
-    ).to_list(100)
+        {"_id": 0, "id": 1}
+    ).to_list(None)
+    
+    if not conversations:
+        return {"items": [], "next_offset": None}
+    
+    search, terms = parse_search_query(q)
+    if not terms:
+        return {"items": [], "next_offset": None}
+    
+    hits = await db.messages.find(
+        {
+            "$text": {"$search": search},
+            "conversation_id": {"$in": [c['id'] for c in conversations]}
+        },
+        {"_id": 0, "score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"}), ("created_at", -1)]).skip(offset).limit(limit + 1).to_list(limit + 1)
+    
+    items = []
+    for m in hits[:limit]:
+        snippet, highlights = build_snippet(m['content'], terms)
+        items.append({
+            "conversation_id": m['conversation_id'],
+            "score": m.pop('score'),
+            "snippet": snippet,
+            "highlights": highlights,
+            "message": m
+        })
     
-    total = sum(c.get('unread_count', {}).get(current_user.id, 0) for c in conversations)
-    return {"unread_count": total}
+    return {
+        "items": items,
+        "next_offset": offset + limit if len(hits) > limit else None
+    }
 
 
 @router.get("/users")
@@ -186,8 +540,52 @@ async def get_available_users_for_chat(
     
     users = await db.users.find(query, {"_id": 0, "password": 0}).to_list(100)
     
-    for u in users:
-        if u.get('created_at') and isinstance(u['created_at'], str):
-            u['created_at'] = datetime.fromisoformat(u['created_at'])
-    
     return users
+
+
+@router.websocket("/ws")
+async def messages_socket(websocket: WebSocket, token: str):
+    """Push new messages, read receipts and unread counts to the connected user"""
+    try:
+        current_user = await get_user_from_token(token)
+    except HTTPException as e:
+        await websocket.close(code=4401, reason=e.detail)
+        return
+    
+    await websocket.accept()
+    
+    conversations = await db.conversations.find(
+        {"participants": current_user.id},
+        {"_id": 0, "id": 1}
+    ).to_list(None)
+    subscription = broadcast.subscribe(
+        [user_channel(current_user.id)] + [conversation_channel(c['id']) for c in conversations]
+    )
+    
+    def follow_new_conversations(event: dict):
+        if event.get("type") == "conversation":
+            subscription.add_channel(conversation_channel(event["conversation"]["id"]))
+    
+    sender = asyncio.create_task(forward_events(websocket, subscription, follow_new_conversations))
+    
+    try:
+        while True:
+            data = await websocket.receive_json()
+            action = data.get("type") if isinstance(data, dict) else None
+            
+            if action == "ping":
+                await websocket.send_json({"type": "pong"})
+            elif action == "read" and data.get("conversation_id"):
+                conversation = await db.conversations.find_one(
+                    {"id": data["conversation_id"], "participants": current_user.id},
+                    {"_id": 0, "id": 1, "last_message_at": 1}
+                )
+                if conversation and conversation.get('last_message_at'):
+                    await mark_conversation_read(conversation['id'], current_user, conversation['last_message_at'])
+    except WebSocketDisconnect:
+        pass
+    except ValueError:
+        await websocket.close(code=1003)
+    finally:
+        sender.cancel()
+        broadcast.unsubscribe(subscription)
@@ -1,100 +1,80 @@
 """
 Notifications routes for LocaTrack API
 """
-from fastapi import APIRouter, Depends
-from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from typing import List
+import asyncio
 
-from config import db
+from config import db, SSE_HEARTBEAT_SECONDS
 from models import User
-from utils.auth import get_current_user, get_tenant_id
+from routers.messages import get_unread_total
+from utils.alerts import get_alert_summary
+from utils.auth import get_current_user, get_user_from_token, get_tenant_id
+from utils.realtime import SSE_HEARTBEAT, SlowConsumer, broadcast, format_sse, tenant_channel, user_channel
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
+FEED_PROJECTION = {"_id": 0, "tenant_id": 0, "severity": 0, "due_at": 0}
+
 
 @router.get("")
 async def get_notifications(
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
     current_user: User = Depends(get_current_user)
-):
-    """Get notifications for expiring documents (insurance, technical control)"""
+) -> List[dict]:
+    """Alerts of the current tenant (documents, contracts, maintenance, payments), most urgent first"""
     tenant_id = get_tenant_id(current_user)
     if not tenant_id:
         return []
     
-    notifications = []
-    now = datetime.now(timezone.utc)
-    warning_days = 30
+    alerts = await db.alerts.find({"tenant_id": tenant_id}, FEED_PROJECTION).sort(
+        [("severity", 1), ("due_at", 1), ("dedup_key", 1)]
+    ).skip(offset).limit(limit).to_list(limit)
     
-    vehicles = await db.vehicles.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(1000)
+    for alert in alerts:
+        alert['id'] = alert.pop('dedup_key')
+    return alerts
+
+
+@router.get("/stream")
+async def notifications_stream(token: str):
+    """Server-Sent Events: badge state on connect, then alert and unread count changes.
+
+    EventSource cannot send headers, so the access token comes as a query parameter.
+    """
+    current_user = await get_user_from_token(token)
+    tenant_id = get_tenant_id(current_user)
     
-    for vehicle in vehicles:
-        vehicle_name = f"{vehicle.get('brand', '')} {vehicle.get('model', '')} ({vehicle.get('plate_number', '')})"
-        
-        # Check insurance expiry
-        if vehicle.get('insurance_expiry'):
-            expiry = vehicle['insurance_expiry']
-            if isinstance(expiry, str):
-                expiry = datetime.fromisoformat(expiry.replace('Z', '+00:00'))
-            # Ensure expiry is timezone-aware
-            if expiry.tzinfo is None:
-                expiry = expiry.replace(tzinfo=timezone.utc)
-            days_left = (expiry - now).days
-            
-            if days_left < 0:
-                notifications.append({
-                    "id": f"ins_{vehicle['id']}",
-                    "type": "danger",
-                    "category": "insurance",
-                    "title": "Assurance expirée",
-                    "message": f"{vehicle_name} - Assurance expirée depuis {abs(days_left)} jours",
-                    "vehicle_id": vehicle['id'],
-                    "days_left": days_left,
-                    "created_at": now.isoformat()
-                })
-            elif days_left <= warning_days:
-                notifications.append({
-                    "id": f"ins_{vehicle['id']}",
-                    "type": "warning",
-                    "category": "insurance",
-                    "title": "Assurance expire bientôt",
-                    "message": f"{vehicle_name} - Assurance expire dans {days_left} jours",
-                    "vehicle_id": vehicle['id'],
-                    "days_left": days_left,
-                    "created_at": now.isoformat()
-                })
-        
-        # Check technical inspection expiry
-        if vehicle.get('technical_inspection_expiry'):
-            expiry = vehicle['technical_inspection_expiry']
-            if isinstance(expiry, str):
-                expiry = datetime.fromisoformat(expiry.replace('Z', '+00:00'))
-            # Ensure expiry is timezone-aware
-            if expiry.tzinfo is None:
-                expiry = expiry.replace(tzinfo=timezone.utc)
-            days_left = (expiry - now).days
-            
-            if days_left < 0:
-                notifications.append({
-                    "id": f"tech_{vehicle['id']}",
-                    "type": "danger",
-                    "category": "technical_control",
-                    "title": "Contrôle technique expiré",
-                    "message": f"{vehicle_name} - Contrôle technique expiré depuis {abs(days_left)} jours",
-                    "vehicle_id": vehicle['id'],
-                    "days_left": days_left,
-                    "created_at": now.isoformat()
-                })
-            elif days_left <= warning_days:
-                notifications.append({
-                    "id": f"tech_{vehicle['id']}",
-                    "type": "warning",
-                    "category": "technical_control",
-                    "title": "Contrôle technique expire bientôt",
-                    "message": f"{vehicle_name} - Contrôle technique expire dans {days_left} jours",
-                    "vehicle_id": vehicle['id'],
-                    "days_left": days_left,
-                    "created_at": now.isoformat()
-                })
+    channels = [user_channel(current_user.id)]
+    if tenant_id:
+        channels.append(tenant_channel(tenant_id))
     
-    notifications.sort(key=lambda x: (0 if x['type'] == 'danger' else 1, x.get('days_left', 999)))
+    async def events():
+        # Subscribe before reading the badge state so no change is missed in between
+        subscription = broadcast.subscribe(channels)
+        try:
+            alerts = await get_alert_summary(tenant_id) if tenant_id else {"count": 0, "danger": 0}
+            yield format_sse("badges", {
+                "alerts": alerts,
+                "unread_count": await get_unread_total(current_user.id)
+            })
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield SSE_HEARTBEAT
+                    continue
+                if event.get("type") in ("alerts", "unread_count"):
+                    yield format_sse(event["type"], event)
+        except SlowConsumer:
+            # The client reconnects and starts again from a fresh badge state
+            return
+        finally:
+            broadcast.unsubscribe(subscription)
     
-    return notifications
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
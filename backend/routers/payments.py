@@ -2,27 +2,44 @@
 Payment routes for LocaTrack API
 """
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from typing import List, Union
 from datetime import datetime, timezone
 
-from config import db
-from models import User, UserRole, Payment, PaymentCreate
+from models import User, UserRole, Payment, PaymentCreate, Page
 from utils.auth import require_role, get_tenant_id
+from utils.indexes import declare_index
+from utils.list_query import ListQuery, list_query
+from utils.pagination import declare_sort_indexes
+from utils.repositories import payments
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
+declare_index("payments", "id", unique=True)
+declare_index("payments", [("tenant_id", 1), ("status", 1), ("created_at", 1), ("id", 1)])
+PAYMENT_SORT_FIELDS = ("created_at", "amount")
+declare_sort_indexes("payments", PAYMENT_SORT_FIELDS)
 
-@router.get("", response_model=List[Payment])
+payment_list_query = list_query(
+    Payment,
+    filters={
+        "status": str,
+        "contract_id": str,
+        "method": str,
+        "amount": float,
+        "payment_date": datetime,
+        "created_at": datetime
+    },
+    sort_fields=PAYMENT_SORT_FIELDS
+)
+
+
+@router.get("", response_model=Union[List[Payment], Page[Payment]])
 async def get_payments(
+    query: ListQuery = Depends(payment_list_query),
     current_user: User = Depends(require_role([UserRole.LOCATEUR, UserRole.EMPLOYEE]))
 ):
     tenant_id = get_tenant_id(current_user)
-    payments = await db.payments.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(1000)
-    for p in payments:
-        for date_field in ['created_at', 'payment_date']:
-            if p.get(date_field) and isinstance(p[date_field], str):
-                p[date_field] = datetime.fromisoformat(p[date_field])
-    return payments
+    return await payments.list(tenant_id, query)
 
 
 @router.post("", response_model=Payment)
@@ -37,12 +54,7 @@ async def create_payment(
     payment_obj.status = "completed"
     payment_obj.payment_date = datetime.now(timezone.utc)
     
-    doc = payment_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    if doc.get('payment_date'):
-        doc['payment_date'] = doc['payment_date'].isoformat()
-    
-    await db.payments.insert_one(doc)
+    await payments.insert(tenant_id, payment_obj.model_dump())
     return payment_obj
 
 
@@ -53,22 +65,12 @@ async def update_payment(
     current_user: User = Depends(require_role([UserRole.LOCATEUR, UserRole.EMPLOYEE]))
 ):
     tenant_id = get_tenant_id(current_user)
-    existing = await db.payments.find_one({"id": payment_id, "tenant_id": tenant_id}, {"_id": 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Payment not found")
-    
     update_data = payment_update.model_dump()
-    update_data['payment_date'] = datetime.now(timezone.utc).isoformat()
-    
-    await db.payments.update_one(
-        {"id": payment_id},
-        {"$set": update_data}
-    )
+    update_data['payment_date'] = datetime.now(timezone.utc)
     
-    updated = await db.payments.find_one({"id": payment_id}, {"_id": 0})
-    for date_field in ['created_at', 'payment_date']:
-        if updated.get(date_field) and isinstance(updated[date_field], str):
-            updated[date_field] = datetime.fromisoformat(updated[date_field])
+    updated = await payments.update(tenant_id, payment_id, update_data)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Payment not found")
     return Payment(**updated)
 
 
@@ -78,7 +80,6 @@ async def delete_payment(
     current_user: User = Depends(require_role([UserRole.LOCATEUR, UserRole.EMPLOYEE]))
 ):
     tenant_id = get_tenant_id(current_user)
-    result = await db.payments.delete_one({"id": payment_id, "tenant_id": tenant_id})
-    if result.deleted_count == 0:
+    if await payments.delete(tenant_id, payment_id) is None:
         raise HTTPException(status_code=404, detail="Payment not found")
     return {"message": "Payment deleted successfully"}
@@ -7,6 +7,7 @@ from datetime import datetime, timezone, timedelta
 from config import db
 from models import User, UserRole
 from utils.auth import require_role, get_tenant_id
+from utils.dates import parse_datetime
 
 router = APIRouter(prefix="/reports", tags=["Reports"])
 
@@ -21,7 +22,7 @@ async def get_dashboard_stats(
     rented_vehicles = await db.vehicles.count_documents({"tenant_id": tenant_id, "status": "rented"})
     active_contracts = await db.contracts.count_documents({"tenant_id": tenant_id, "status": "active"})
     
-    thirty_days_ago = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+    thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
     recent_payments = await db.payments.find(
         {"tenant_id": tenant_id, "status": "completed", "payment_date": {"$gte": thirty_days_ago}},
         {"_id": 0}
@@ -90,8 +91,7 @@ async def get_financial_report(
     monthly_revenue = {}
     for p in payments:
         if p.get('payment_date'):
-            date = datetime.fromisoformat(p['payment_date']) if isinstance(p['payment_date'], str) else p['payment_date']
-            month_key = date.strftime('%Y-%m')
+            month_key = parse_datetime(p['payment_date']).strftime('%Y-%m')
             monthly_revenue[month_key] = monthly_revenue.get(month_key, 0) + p['amount']
     
     return {
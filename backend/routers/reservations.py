@@ -2,28 +2,49 @@
 Reservation routes for LocaTrack API
 """
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from typing import List, Union
 from datetime import datetime
 
-from config import db
-from models import User, UserRole, Reservation, ReservationCreate
+from models import User, UserRole, Reservation, ReservationCreate, Page
 from utils.auth import get_current_user, require_role, get_tenant_id
+from utils.indexes import declare_index
+from utils.list_query import ListQuery, list_query
+from utils.pagination import declare_sort_indexes, empty_page
+from utils.repositories import reservations, vehicles
 
 router = APIRouter(prefix="/reservations", tags=["Reservations"])
 
+declare_index("reservations", "id", unique=True)
+declare_index("reservations", [("tenant_id", 1), ("status", 1), ("created_at", 1), ("id", 1)])
+RESERVATION_SORT_FIELDS = ("created_at", "start_date", "end_date")
+declare_sort_indexes("reservations", RESERVATION_SORT_FIELDS)
+declare_index("reservations", [("tenant_id", 1), ("vehicle_id", 1)])
+declare_index("reservations", [("tenant_id", 1), ("client_id", 1)])
 
-@router.get("", response_model=List[Reservation])
-async def get_reservations(current_user: User = Depends(get_current_user)):
+reservation_list_query = list_query(
+    Reservation,
+    filters={
+        "status": str,
+        "vehicle_id": str,
+        "client_id": str,
+        "start_date": datetime,
+        "end_date": datetime,
+        "created_at": datetime
+    },
+    sort_fields=RESERVATION_SORT_FIELDS
+)
+
+
+@router.get("", response_model=Union[List[Reservation], Page[Reservation]])
+async def get_reservations(
+    query: ListQuery = Depends(reservation_list_query),
+    current_user: User = Depends(get_current_user)
+):
     tenant_id = get_tenant_id(current_user)
     if not tenant_id:
-        return []
+        return empty_page(query.page)
     
-    reservations = await db.reservations.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(1000)
-    for r in reservations:
-        for date_field in ['created_at', 'start_date', 'end_date']:
-            if r.get(date_field) and isinstance(r[date_field], str):
-                r[date_field] = datetime.fromisoformat(r[date_field])
-    return reservations
+    return await reservations.list(tenant_id, query)
 
 
 @router.post("", response_model=Reservation)
@@ -33,7 +54,7 @@ async def create_reservation(
 ):
     tenant_id = get_tenant_id(current_user)
     
-    vehicle = await db.vehicles.find_one({"id": reservation_create.vehicle_id, "tenant_id": tenant_id}, {"_id": 0})
+    vehicle = await vehicles.get(tenant_id, reservation_create.vehicle_id)
     if not vehicle or vehicle['status'] != 'available':
         raise HTTPException(status_code=400, detail="Vehicle not available")
     
@@ -41,11 +62,8 @@ async def create_reservation(
     reservation_data['tenant_id'] = tenant_id
     reservation_obj = Reservation(**reservation_data)
     doc = reservation_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['start_date'] = doc['start_date'].isoformat()
-    doc['end_date'] = doc['end_date'].isoformat()
     
-    await db.reservations.insert_one(doc)
+    await reservations.insert(tenant_id, doc)
     return reservation_obj
 
 
@@ -56,10 +74,6 @@ async def update_reservation_status(
     current_user: User = Depends(require_role([UserRole.LOCATEUR, UserRole.EMPLOYEE]))
 ):
     tenant_id = get_tenant_id(current_user)
-    result = await db.reservations.update_one(
-        {"id": reservation_id, "tenant_id": tenant_id},
-        {"$set": {"status": status}}
-    )
-    if result.matched_count == 0:
+    if await reservations.update(tenant_id, reservation_id, {"status": status}) is None:
         raise HTTPException(status_code=404, detail="Reservation not found")
     return {"message": "Reservation status updated"}
@@ -8,6 +8,7 @@ from pydantic import BaseModel
 from config import db
 from models import User, UserRole
 from utils.auth import get_current_user, require_role
+from utils.principal_cache import principal_cache
 
 router = APIRouter(prefix="/settings", tags=["Settings"])
 
@@ -78,4 +79,5 @@ async def update_gps_settings(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    await principal_cache.invalidate(user_id=current_user.id)
     return {"message": "GPS settings updated successfully", "provider": settings.provider}
@@ -2,12 +2,22 @@
 SuperAdmin routes for LocaTrack API
 """
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import FileResponse
 from typing import Optional
 from datetime import datetime, timezone, timedelta
+import asyncio
+import json
 
-from config import db
+from config import db, MESSAGE_RETENTION_DAYS
 from models import User, UserRole, UserUpdate
 from utils.auth import require_role
+from utils.dates import parse_datetime
+from utils.db_monitor import command_recorder
+from utils.outbox import dispatch_outbox, enqueue_alert_digests
+from utils.principal_cache import principal_cache
+from utils.profiling import profile_store, profiler
+from utils.retention import archive_messages
+from utils.sessions import rename_user_sessions, revoke_user_sessions
 
 router = APIRouter(prefix="/admin", tags=["SuperAdmin"])
 
@@ -23,9 +33,6 @@ async def get_all_locateurs(
     ).to_list(1000)
     
     for loc in locateurs:
-        if loc.get('created_at') and isinstance(loc['created_at'], str):
-            loc['created_at'] = datetime.fromisoformat(loc['created_at'])
-        
         loc['vehicle_count'] = await db.vehicles.count_documents({"tenant_id": loc['id']})
         loc['employee_count'] = await db.users.count_documents({"tenant_id": loc['id'], "role": UserRole.EMPLOYEE})
         loc['contract_count'] = await db.contracts.count_documents({"tenant_id": loc['id']})
@@ -40,9 +47,6 @@ async def get_users(
     """Get all registered users with passwords (SuperAdmin only)"""
     # Include password_plain for superadmin
     users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
-    for u in users:
-        if u.get('created_at') and isinstance(u['created_at'], str):
-            u['created_at'] = datetime.fromisoformat(u['created_at'])
     return users
 
 
@@ -55,14 +59,8 @@ async def get_all_users_detailed(
     users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
     
     for user in users:
-        for date_field in ['created_at', 'subscription_start', 'subscription_end', 'last_login']:
-            if user.get(date_field) and isinstance(user[date_field], str):
-                user[date_field] = datetime.fromisoformat(user[date_field])
-        
         if user.get('subscription_end'):
-            sub_end = user['subscription_end']
-            if isinstance(sub_end, str):
-                sub_end = datetime.fromisoformat(sub_end)
+            sub_end = parse_datetime(user['subscription_end'])
             days_remaining = (sub_end - datetime.now(timezone.utc)).days
             user['days_remaining'] = max(0, days_remaining)
             user['is_expired'] = days_remaining < 0
@@ -97,6 +95,9 @@ async def update_user(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    if 'email' in update_data:
+        await rename_user_sessions(user_id, update_data['email'])
+    await principal_cache.invalidate(user_id=user_id)
     return {"message": "User updated successfully"}
 
 
@@ -122,14 +123,25 @@ async def delete_user(
         await db.infractions.delete_many({"tenant_id": user_id})
         await db.clients.delete_many({"tenant_id": user_id})
         await db.users.delete_many({"tenant_id": user_id})
+        await db.alerts.delete_many({"tenant_id": user_id})
+        await revoke_user_sessions(tenant_id=user_id)
+        await principal_cache.invalidate(tenant_id=user_id)
     
     result = await db.users.delete_one({"id": user_id})
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
-    await db.conversations.delete_many({"participants": user_id})
-    await db.messages.delete_many({"sender_id": user_id})
+    await revoke_user_sessions(user_id=user_id)
+    await principal_cache.invalidate(user_id=user_id)
+    
+    # Messages are indexed by conversation, not by sender
+    conversations = await db.conversations.find({"participants": user_id}, {"_id": 0, "id": 1}).to_list(None)
+    conversation_ids = [c['id'] for c in conversations]
+    await db.messages.delete_many({"conversation_id": {"$in": conversation_ids}})
+    await db.messages_archive.delete_many({"conversation_id": {"$in": conversation_ids}})
+    await db.conversations.delete_many({"id": {"$in": conversation_ids}})
+    await db.unread_totals.delete_one({"user_id": user_id})
     
     return {"message": "User deleted successfully"}
 
@@ -152,6 +164,8 @@ async def suspend_user(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    await revoke_user_sessions(user_id=user_id)
+    await principal_cache.invalidate(user_id=user_id)
     return {"message": "User suspended successfully"}
 
 
@@ -169,6 +183,7 @@ async def activate_user(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    await principal_cache.invalidate(user_id=user_id)
     return {"message": "User activated successfully"}
 
 
@@ -194,8 +209,8 @@ async def update_subscription(
         {"id": user_id},
         {"$set": {
             "subscription_type": subscription_type,
-            "subscription_start": now.isoformat(),
-            "subscription_end": end_date.isoformat(),
+            "subscription_start": now,
+            "subscription_end": end_date,
             "is_suspended": False
         }}
     )
@@ -203,9 +218,123 @@ async def update_subscription(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    await principal_cache.invalidate(user_id=user_id)
     return {"message": f"Subscription updated to {subscription_type}", "expires": end_date.isoformat()}
 
 
+@router.post("/users/{user_id}/retention")
+async def update_message_retention(
+    user_id: str,
+    days: Optional[int] = None,
+    current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
+):
+    """Set a locateur's message retention horizon; omit days to use the default (SuperAdmin only)"""
+    if days is not None and days < 1:
+        raise HTTPException(status_code=400, detail="Retention must be at least one day")
+    
+    result = await db.users.update_one(
+        {"id": user_id, "role": UserRole.LOCATEUR},
+        {"$set": {"message_retention_days": days}}
+    )
+    
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Locateur not found")
+    
+    await principal_cache.invalidate(user_id=user_id)
+    return {"message": "Message retention updated", "days": days or MESSAGE_RETENTION_DAYS}
+
+
+@router.post("/archive-messages")
+async def run_message_archival(
+    current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
+):
+    """Archive messages past their retention horizon now (SuperAdmin only)"""
+    archived = await archive_messages()
+    return {"message": "Archival complete", "archived": archived}
+
+
+@router.post("/dispatch-digests")
+async def run_digest_dispatch(
+    current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
+):
+    """Queue today's alert digests and send everything due now (SuperAdmin only)"""
+    queued = await enqueue_alert_digests()
+    stats = await dispatch_outbox()
+    return {"message": "Dispatch complete", "queued": queued, **stats}
+
+
+@router.get("/db-stats")
+async def get_db_stats(
+    current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
+):
+    """MongoDB time and query counts per route, and recent slow queries (SuperAdmin only)"""
+    return command_recorder.snapshot()
+
+
+@router.delete("/db-stats")
+async def reset_db_stats(
+    current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
+):
+    """Start the per-route MongoDB statistics afresh (SuperAdmin only)"""
+    command_recorder.reset()
+    return {"message": "Database statistics reset"}
+
+
+@router.post("/profiling")
+async def enable_profiling(
+    tenant_id: Optional[str] = None,
+    rate: float = 0.0,
+    minutes: float = 30,
+    current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
+):
+    """Profile requests for a while: those sent with X-Profile: 1 or ?profile=1, and a
+    sampled `rate` of the others, of one tenant or all (SuperAdmin only)"""
+    if not 0 <= rate <= 1:
+        raise HTTPException(status_code=400, detail="Rate must be between 0 and 1")
+    if minutes <= 0:
+        raise HTTPException(status_code=400, detail="Duration must be positive")
+    profiler.enable(tenant_id, rate, minutes)
+    return profiler.state()
+
+
+@router.delete("/profiling")
+async def disable_profiling(
+    current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
+):
+    """Stop profiling requests (SuperAdmin only)"""
+    profiler.disable()
+    return profiler.state()
+
+
+@router.get("/profiles")
+async def list_profiles(
+    current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
+):
+    """Saved request profiles, newest first (SuperAdmin only)"""
+    profiles = await asyncio.to_thread(profile_store.list)
+    return {"profiling": profiler.state(), "profiles": profiles}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
+):
+    """A saved profile with its slowest functions (SuperAdmin only)"""
+    path = profile_store.path(profile_id, ".json")
+    return json.loads(await asyncio.to_thread(path.read_text))
+
+
+@router.get("/profiles/{profile_id}/download")
+async def download_profile(
+    profile_id: str,
+    current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
+):
+    """The cProfile stats file of a saved profile, for snakeviz or pstats (SuperAdmin only)"""
+    path = profile_store.path(profile_id, ".prof")
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
+
 @router.get("/stats")
 async def get_admin_stats(
     current_user: User = Depends(require_role([UserRole.SUPERADMIN]))
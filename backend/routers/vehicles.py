@@ -2,29 +2,51 @@
 Vehicle routes for LocaTrack API
 """
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from typing import List, Union
 from datetime import datetime
 
-from config import db
-from models import User, UserRole, Vehicle, VehicleCreate
+from models import User, UserRole, Vehicle, VehicleCreate, Page
 from utils.auth import get_current_user, require_role, get_tenant_id
+from utils.indexes import declare_index
+from utils.list_query import ListQuery, list_query
+from utils.pagination import declare_sort_indexes, empty_page
+from utils.repositories import vehicles
 
 router = APIRouter(prefix="/vehicles", tags=["Vehicles"])
 
+declare_index("vehicles", "id", unique=True)
+declare_index("vehicles", [("tenant_id", 1), ("status", 1), ("created_at", 1), ("id", 1)])
+VEHICLE_SORT_FIELDS = ("created_at", "year", "daily_rate", "brand", "plate_number")
+declare_sort_indexes("vehicles", VEHICLE_SORT_FIELDS)
 
-@router.get("", response_model=List[Vehicle])
-async def get_vehicles(current_user: User = Depends(get_current_user)):
+vehicle_list_query = list_query(
+    Vehicle,
+    filters={
+        "status": str,
+        "brand": str,
+        "fuel_type": str,
+        "transmission": str,
+        "year": int,
+        "daily_rate": float,
+        "insurance_expiry": datetime,
+        "technical_inspection_expiry": datetime,
+        "created_at": datetime
+    },
+    sort_fields=VEHICLE_SORT_FIELDS
+)
+
+
+@router.get("", response_model=Union[List[Vehicle], Page[Vehicle]])
+async def get_vehicles(
+    query: ListQuery = Depends(vehicle_list_query),
+    current_user: User = Depends(get_current_user)
+):
     """Get vehicles for the current tenant"""
     tenant_id = get_tenant_id(current_user)
     if not tenant_id:
-        return []
+        return empty_page(query.page)
     
-    vehicles = await db.vehicles.find({"tenant_id": tenant_id}, {"_id": 0}).to_list(1000)
-    for v in vehicles:
-        for date_field in ['created_at', 'insurance_expiry']:
-            if v.get(date_field) and isinstance(v[date_field], str):
-                v[date_field] = datetime.fromisoformat(v[date_field])
-    return vehicles
+    return await vehicles.list(tenant_id, query)
 
 
 @router.post("", response_model=Vehicle)
@@ -38,12 +60,7 @@ async def create_vehicle(
         raise HTTPException(status_code=400, detail="No tenant associated")
     
     vehicle_obj = Vehicle(tenant_id=tenant_id, **vehicle_create.model_dump())
-    doc = vehicle_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    if doc.get('insurance_expiry'):
-        doc['insurance_expiry'] = doc['insurance_expiry'].isoformat()
-    
-    await db.vehicles.insert_one(doc)
+    await vehicles.insert(tenant_id, vehicle_obj.model_dump())
     return vehicle_obj
 
 
@@ -55,23 +72,10 @@ async def update_vehicle(
 ):
     """Update a vehicle belonging to the current tenant"""
     tenant_id = get_tenant_id(current_user)
-    update_data = vehicle_update.model_dump()
-    if update_data.get('insurance_expiry'):
-        update_data['insurance_expiry'] = update_data['insurance_expiry'].isoformat()
-    
-    result = await db.vehicles.update_one(
-        {"id": vehicle_id, "tenant_id": tenant_id},
-        {"$set": update_data}
-    )
-    
-    if result.matched_count == 0:
+    vehicle_doc = await vehicles.update(tenant_id, vehicle_id, vehicle_update.model_dump())
+    if vehicle_doc is None:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
-    vehicle_doc = await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0})
-    for date_field in ['created_at', 'insurance_expiry']:
-        if vehicle_doc.get(date_field) and isinstance(vehicle_doc[date_field], str):
-            vehicle_doc[date_field] = datetime.fromisoformat(vehicle_doc[date_field])
-    
     return Vehicle(**vehicle_doc)
 
 
@@ -82,7 +86,6 @@ async def delete_vehicle(
 ):
     """Delete a vehicle (Locateur only)"""
     tenant_id = get_tenant_id(current_user)
-    result = await db.vehicles.delete_one({"id": vehicle_id, "tenant_id": tenant_id})
-    if result.deleted_count == 0:
+    if await vehicles.delete(tenant_id, vehicle_id) is None:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     return {"message": "Vehicle deleted successfully"}
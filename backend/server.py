@@ -2,13 +2,29 @@
 LocaTrack API - Car Rental Management Platform
 Main application entry point (refactored)
 """
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Header, HTTPException
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.cors import CORSMiddleware
+from typing import Optional
+import asyncio
 import os
 import logging
+import secrets
 
-from config import UPLOADS_DIR, client
+from config import UPLOADS_DIR, ARCHIVE_INTERVAL_HOURS, METRICS_TOKEN, client
+from routers.messages import backfill_conversation_tenants, backfill_participant_keys, read_receipts
+from utils.alerts import alert_scheduler
+from utils.auth import password_executor
+from utils.date_migration import run_date_migration
+from utils.db_monitor import DbTimingMiddleware
+from utils.indexes import apply_indexes
+from utils.metrics import MetricsMiddleware, monitor_event_loop, render as render_metrics
+from utils.outbox import close_transports, enabled_channels, run_outbox_loop
+from utils.principal_cache import principal_cache
+from utils.profiling import ProfilingMiddleware
+from utils.realtime import broadcast
+from utils.retention import run_archival_loop
 
 # Import all routers
 from routers import (
@@ -33,7 +49,8 @@ from routers import (
 app = FastAPI(
     title="LocaTrack API",
     description="Multi-tenant Car Rental Management Platform",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Create a router with the /api prefix
@@ -71,6 +88,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profiles of selected requests, switched on by a superadmin (POST /api/admin/profiling);
+# inside DbTimingMiddleware so profiles carry the request's MongoDB timings
+app.add_middleware(ProfilingMiddleware)
+
+# MongoDB time and query counts per route (GET /api/admin/db-stats)
+app.add_middleware(DbTimingMiddleware)
+
+# Request count, in-flight requests and latency per route (GET /metrics)
+app.add_middleware(MetricsMiddleware)
+
 # Logging configuration
 logging.basicConfig(
     level=logging.INFO,
@@ -79,11 +106,55 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@app.on_event("startup")
+async def create_indexes():
+    # Data backfills first: some declared unique indexes depend on them
+    await backfill_participant_keys()
+    await backfill_conversation_tenants()
+    await apply_indexes()
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    await broadcast.start()
+    await principal_cache.start()
+    await read_receipts.start()
+    await alert_scheduler.start()
+    app.state.loop_lag_task = asyncio.create_task(monitor_event_loop())
+    # Legacy string dates are converted while the API serves
+    app.state.date_migration_task = asyncio.create_task(run_date_migration())
+    if ARCHIVE_INTERVAL_HOURS > 0:
+        app.state.archival_task = asyncio.create_task(run_archival_loop())
+    if enabled_channels():
+        app.state.outbox_task = asyncio.create_task(run_outbox_loop())
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.loop_lag_task.cancel()
+    if not app.state.date_migration_task.done():
+        app.state.date_migration_task.cancel()
+    if getattr(app.state, "archival_task", None):
+        app.state.archival_task.cancel()
+    if getattr(app.state, "outbox_task", None):
+        app.state.outbox_task.cancel()
+    await close_transports()
+    await alert_scheduler.stop()
+    await read_receipts.stop()
+    await principal_cache.stop()
+    await broadcast.stop()
+    password_executor.shutdown(wait=False)
     client.close()
 
 
 @app.get("/")
 async def root():
     return {"message": "LocaTrack API v2.0.0", "status": "running"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -3,6 +3,7 @@ from utils.auth import (
     verify_password,
     create_access_token,
     get_current_user,
+    get_user_from_token,
     require_role,
     get_tenant_id
 )
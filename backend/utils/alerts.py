@@ -0,0 +1,409 @@
+"""
+Alert rule engine for LocaTrack API
+
+Each rule is an indexed MongoDB query plus a formatter turning a matching
+document into an alert. Rules are evaluated per tenant by a scheduler and
+the results are materialized into the `alerts` collection, keyed by a
+dedup key per (rule, document), so the notifications feed is one indexed
+read. Writes through the repositories of the collections the rules read
+mark their tenant dirty to have its alerts refreshed within
+ALERT_REFRESH_SECONDS by the worker that made the write; a periodic sweep,
+run by the holder of the sweep lease, keeps date-based alerts current.
+"""
+from pymongo import UpdateOne
+from datetime import datetime, time, timezone, timedelta
+from typing import Callable, List, Optional, Set
+import asyncio
+import logging
+
+from config import db, ALERT_REFRESH_SECONDS, ALERT_SWEEP_MINUTES, UNPAID_BALANCE_DAYS
+from models import UserRole
+from utils.indexes import declare_index
+from utils.leases import acquire_lease, release_lease
+from utils.realtime import broadcast, tenant_channel
+from utils import repositories
+
+WARNING_DAYS = 30
+MAINTENANCE_WARNING_DAYS = 7
+
+SEVERITY = {"danger": 0, "warning": 1}
+
+SWEEP_LEASE = "alert_sweep"
+
+VEHICLE_LOOKUP = [
+    {"$lookup": {
+        "from": "vehicles",
+        "localField": "vehicle_id",
+        "foreignField": "id",
+        "as": "vehicle"
+    }},
+]
+
+
+class AlertRule:
+    """An indexed query over one collection plus a formatter per match"""
+
+    def __init__(
+        self,
+        name: str,
+        prefix: str,
+        category: str,
+        collection: str,
+        match: Callable[[str, datetime], dict],
+        format: Callable[[dict, datetime], Optional[dict]],
+        indexes: List[list],
+        pipeline: Optional[List[dict]] = None
+    ):
+        self.name = name
+        self.prefix = prefix
+        self.category = category
+        self.collection = collection
+        self.match = match
+        self.format = format
+        self.indexes = indexes
+        self.pipeline = pipeline or []
+
+    async def evaluate(self, tenant_id: str, now: datetime) -> List[dict]:
+        stages = [{"$match": self.match(tenant_id, now)}, *self.pipeline, {"$project": {"_id": 0}}]
+        alerts = []
+        async for doc in db[self.collection].aggregate(stages):
+            alert = self.format(doc, now)
+            if alert is None:
+                continue
+            alert.update({
+                "tenant_id": tenant_id,
+                "dedup_key": f"{self.prefix}_{doc['id']}",
+                "rule": self.name,
+                "category": self.category,
+                "severity": SEVERITY[alert['type']]
+            })
+            alerts.append(alert)
+        return alerts
+
+
+def vehicle_label(vehicle: Optional[dict]) -> str:
+    if not vehicle:
+        return ""
+    return f"{vehicle.get('brand', '')} {vehicle.get('model', '')} ({vehicle.get('plate_number', '')})"
+
+
+def day_start(now: datetime, days: int = 0) -> datetime:
+    """Midnight UTC `days` after today"""
+    return datetime.combine((now + timedelta(days=days)).date(), time.min, tzinfo=timezone.utc)
+
+
+def expiry_rule(field: str, prefix: str, category: str, document: str, expired: str) -> AlertRule:
+    """Vehicle document (insurance, technical control) expiring within WARNING_DAYS"""
+
+    def match(tenant_id, now):
+        # One extra day so vehicles entering the window before the next sweep are included
+        return {"tenant_id": tenant_id, field: {"$lte": now + timedelta(days=WARNING_DAYS + 1)}}
+
+    def format(vehicle, now):
+        expiry = vehicle[field]
+        days_left = (expiry - now).days
+        if days_left < 0:
+            return {
+                "type": "danger",
+                "title": f"{document} {expired}",
+                "message": f"{vehicle_label(vehicle)} - {document} {expired} depuis {abs(days_left)} jours",
+                "vehicle_id": vehicle['id'],
+                "days_left": days_left,
+                "due_at": expiry
+            }
+        if days_left <= WARNING_DAYS:
+            return {
+                "type": "warning",
+                "title": f"{document} expire bientôt",
+                "message": f"{vehicle_label(vehicle)} - {document} expire dans {days_left} jours",
+                "vehicle_id": vehicle['id'],
+                "days_left": days_left,
+                "due_at": expiry
+            }
+        return None
+
+    return AlertRule(
+        name=field,
+        prefix=prefix,
+        category=category,
+        collection="vehicles",
+        match=match,
+        format=format,
+        indexes=[[("tenant_id", 1), (field, 1)]],
+        pipeline=[{"$project": {
+            "id": 1, "brand": 1, "model": 1, "plate_number": 1, field: 1
+        }}]
+    )
+
+
+def match_contract_return(tenant_id, now):
+    return {"tenant_id": tenant_id, "status": "active", "end_date": {"$lt": day_start(now, 1)}}
+
+
+def format_contract_return(contract, now):
+    end = contract['end_date']
+    days_left = (end.date() - now.date()).days
+    label = vehicle_label(next(iter(contract.get('vehicle') or []), None))
+    if days_left < 0:
+        return {
+            "type": "danger",
+            "title": "Retour en retard",
+            "message": f"{label} - Retour prévu il y a {abs(days_left)} jours",
+            "vehicle_id": contract['vehicle_id'],
+            "contract_id": contract['id'],
+            "days_left": days_left,
+            "due_at": end
+        }
+    return {
+        "type": "warning",
+        "title": "Contrat se termine aujourd'hui",
+        "message": f"{label} - Retour prévu aujourd'hui",
+        "vehicle_id": contract['vehicle_id'],
+        "contract_id": contract['id'],
+        "days_left": days_left,
+        "due_at": end
+    }
+
+
+def match_maintenance_due(tenant_id, now):
+    return {
+        "tenant_id": tenant_id,
+        "status": "scheduled",
+        "scheduled_date": {"$lt": day_start(now, MAINTENANCE_WARNING_DAYS + 1)}
+    }
+
+
+def format_maintenance_due(maintenance, now):
+    scheduled = maintenance['scheduled_date']
+    days_left = (scheduled.date() - now.date()).days
+    label = vehicle_label(next(iter(maintenance.get('vehicle') or []), None))
+    if days_left < 0:
+        return {
+            "type": "danger",
+            "title": "Maintenance en retard",
+            "message": f"{label} - {maintenance.get('type', '')} prévue il y a {abs(days_left)} jours",
+            "vehicle_id": maintenance['vehicle_id'],
+            "maintenance_id": maintenance['id'],
+            "days_left": days_left,
+            "due_at": scheduled
+        }
+    return {
+        "type": "warning",
+        "title": "Maintenance à venir",
+        "message": f"{label} - {maintenance.get('type', '')} prévue dans {days_left} jours",
+        "vehicle_id": maintenance['vehicle_id'],
+        "maintenance_id": maintenance['id'],
+        "days_left": days_left,
+        "due_at": scheduled
+    }
+
+
+def match_unpaid_balance(tenant_id, now):
+    # Active contracts, and completed ones for UNPAID_BALANCE_DAYS after their end, so
+    # the payments $lookup runs over the open business rather than the whole history.
+    # Contracts whose dates are not migrated yet are picked up once they are
+    return {"tenant_id": tenant_id, "$or": [
+        {"status": "active", "end_date": {"$type": "date"}},
+        {"status": "completed", "end_date": {"$gte": day_start(now, -UNPAID_BALANCE_DAYS)}},
+    ]}
+
+
+UNPAID_BALANCE_PIPELINE = [
+    {"$lookup": {
+        "from": "payments",
+        "localField": "id",
+        "foreignField": "contract_id",
+        "as": "payments"
+    }},
+    {"$addFields": {
+        "payments": {"$filter": {"input": "$payments", "cond": {"$eq": ["$$this.status", "completed"]}}}
+    }},
+    {"$addFields": {"balance": {"$subtract": ["$total_amount", {"$sum": "$payments.amount"}]}}},
+    {"$match": {"balance": {"$gt": 0.005}}},
+    {"$project": {"payments": 0}},
+    *VEHICLE_LOOKUP,
+]
+
+
+def format_unpaid_balance(contract, now):
+    end = contract['end_date']
+    days_left = (end.date() - now.date()).days
+    label = vehicle_label(next(iter(contract.get('vehicle') or []), None))
+    return {
+        "type": "danger" if days_left < 0 else "warning",
+        "title": "Solde impayé",
+        "message": f"{label} - Reste à payer {contract['balance']:.2f}",
+        "vehicle_id": contract['vehicle_id'],
+        "contract_id": contract['id'],
+        "days_left": days_left,
+        "due_at": end
+    }
+
+
+ALERT_RULES: List[AlertRule] = [
+    expiry_rule("insurance_expiry", "ins", "insurance", "Assurance", "expirée"),
+    expiry_rule("technical_inspection_expiry", "tech", "technical_control", "Contrôle technique", "expiré"),
+    AlertRule(
+        name="contract_return",
+        prefix="ret",
+        category="contract",
+        collection="contracts",
+        match=match_contract_return,
+        format=format_contract_return,
+        indexes=[[("tenant_id", 1), ("status", 1), ("end_date", 1)]],
+        pipeline=[{"$project": {"signature_data": 0}}, *VEHICLE_LOOKUP]
+    ),
+    AlertRule(
+        name="maintenance_due",
+        prefix="maint",
+        category="maintenance",
+        collection="maintenance",
+        match=match_maintenance_due,
+        format=format_maintenance_due,
+        indexes=[[("tenant_id", 1), ("status", 1), ("scheduled_date", 1)]],
+        pipeline=VEHICLE_LOOKUP
+    ),
+    AlertRule(
+        name="unpaid_balance",
+        prefix="due",
+        category="payment",
+        collection="contracts",
+        match=match_unpaid_balance,
+        format=format_unpaid_balance,
+        indexes=[[("tenant_id", 1), ("status", 1), ("end_date", 1)]],
+        pipeline=[{"$project": {"signature_data": 0}}, *UNPAID_BALANCE_PIPELINE]
+    ),
+]
+
+
+declare_index("alerts", [("tenant_id", 1), ("dedup_key", 1)], unique=True)
+declare_index("alerts", [("tenant_id", 1), ("severity", 1), ("due_at", 1), ("dedup_key", 1)])
+declare_index("payments", "contract_id")  # unpaid balance $lookup
+for rule in ALERT_RULES:
+    for keys in rule.indexes:
+        declare_index(rule.collection, keys)
+
+
+async def refresh_tenant_alerts(tenant_id: str) -> bool:
+    """Re-evaluate every rule for a tenant; returns whether any alert changed"""
+    now = datetime.now(timezone.utc)
+    alerts: List[dict] = []
+    for rule in ALERT_RULES:
+        alerts.extend(await rule.evaluate(tenant_id, now))
+
+    changed = 0
+    if alerts:
+        result = await db.alerts.bulk_write([
+            UpdateOne(
+                {"tenant_id": tenant_id, "dedup_key": alert['dedup_key']},
+                {"$set": alert, "$setOnInsert": {"created_at": now}},
+                upsert=True
+            )
+            for alert in alerts
+        ], ordered=False)
+        changed += result.upserted_count + result.modified_count
+
+    # Alerts whose condition no longer holds are resolved
+    result = await db.alerts.delete_many({
+        "tenant_id": tenant_id,
+        "dedup_key": {"$nin": [alert['dedup_key'] for alert in alerts]}
+    })
+    changed += result.deleted_count
+    return changed > 0
+
+
+async def get_alert_summary(tenant_id: str) -> dict:
+    """Badge state of a tenant's alerts"""
+    total = await db.alerts.count_documents({"tenant_id": tenant_id})
+    danger = await db.alerts.count_documents({"tenant_id": tenant_id, "severity": SEVERITY["danger"]})
+    return {"count": total, "danger": danger}
+
+
+async def publish_alert_summary(tenant_id: str):
+    await broadcast.publish(tenant_channel(tenant_id), {
+        "type": "alerts",
+        **await get_alert_summary(tenant_id)
+    })
+
+
+class AlertScheduler:
+    """Refreshes dirty tenants promptly and sweeps every tenant periodically"""
+
+    def __init__(
+        self,
+        refresh_seconds: float = ALERT_REFRESH_SECONDS,
+        sweep_minutes: float = ALERT_SWEEP_MINUTES
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.sweep_seconds = sweep_minutes * 60
+        self._dirty: Set[str] = set()
+        self._last_sweep: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(self, tenant_id: Optional[str]):
+        if tenant_id:
+            self._dirty.add(tenant_id)
+
+    async def refresh(self, tenant_ids):
+        for tenant_id in tenant_ids:
+            try:
+                if await refresh_tenant_alerts(tenant_id):
+                    await publish_alert_summary(tenant_id)
+            except Exception as e:
+                logging.error(f"Alert refresh failed for tenant {tenant_id}: {e}")
+                self._dirty.add(tenant_id)
+
+    async def flush(self):
+        dirty, self._dirty = self._dirty, set()
+        await self.refresh(dirty)
+
+    async def sweep(self) -> bool:
+        """Refresh every tenant when this worker holds the sweep lease.
+
+        The lease outlives one sweep interval, so the holder keeps it from
+        sweep to sweep; the other workers only flush their dirty tenants.
+        """
+        if not await acquire_lease(SWEEP_LEASE, self.sweep_seconds * 2):
+            return False
+        tenants = await db.users.find(
+            {"role": UserRole.LOCATEUR},
+            {"_id": 0, "id": 1}
+        ).to_list(None)
+        self._dirty.difference_update(t['id'] for t in tenants)
+        await self.refresh(t['id'] for t in tenants)
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                due = self._last_sweep is None or loop.time() - self._last_sweep >= self.sweep_seconds
+                if due:
+                    self._last_sweep = loop.time()
+                if not (due and await self.sweep()):
+                    await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Alert scheduler failed: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        # Let another worker take the sweep over without waiting for the lease to expire
+        try:
+            await release_lease(SWEEP_LEASE)
+        except Exception as e:
+            logging.warning(f"Alert sweep lease not released: {e}")
+
+
+alert_scheduler = AlertScheduler()
+
+
+for repository in (repositories.vehicles, repositories.contracts, repositories.payments, repositories.maintenance):
+    repository.subscribe(lambda operation, tenant_id, doc: alert_scheduler.mark_dirty(tenant_id))
@@ -4,19 +4,28 @@ Authentication utilities for LocaTrack API
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials
 from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
+import asyncio
 import jwt
 
-from config import db, pwd_context, security, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from config import db, pwd_context, security, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, PASSWORD_HASH_WORKERS
 from models import User, UserRole
+from utils.principal_cache import principal_cache
 
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+# A login storm queues here instead of stalling every request on the event loop
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, pwd_context.verify, plain_password, hashed_password)
 
 
 def create_access_token(data: dict) -> str:
@@ -26,9 +35,9 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+async def get_user_from_token(token: str) -> User:
+    """Resolve a raw JWT into the matching user"""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
@@ -38,14 +47,21 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user_doc = await db.users.find_one({"email": email}, {"_id": 0})
+    user = principal_cache.get(email)
+    if user is not None:
+        return user
+    
+    user_doc = await db.users.find_one({"email": email}, {"_id": 0, "password": 0})
     if user_doc is None:
         raise HTTPException(status_code=401, detail="User not found")
     
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    
-    return User(**user_doc)
+    user = User(**user_doc)
+    principal_cache.put(email, user)
+    return user
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    return await get_user_from_token(credentials.credentials)
 
 
 def require_role(required_roles: List[str]):
@@ -0,0 +1,172 @@
+"""
+Online migration of ISO-string dates to BSON dates for LocaTrack API
+
+Documents written before dates were stored natively hold ISO strings. The
+migration walks each collection in _id order, DATE_MIGRATION_BATCH_SIZE
+documents at a time, and converts the string values of its date fields in
+place. Each update is conditional on the strings it replaces, so a value
+rewritten concurrently by the API is left alone, and the last _id reached is
+checkpointed in `migrations` so an interrupted run resumes where it stopped.
+One worker at a time migrates, the holder of the migration lease, which it
+renews after every batch.
+
+It runs in the background at startup; to convert a large database before
+rolling out, run it on its own:
+
+    cd backend
+    python -m utils.date_migration
+"""
+from pymongo import UpdateOne
+from typing import Dict, Iterator, List, Optional, Tuple
+import asyncio
+import logging
+
+from config import db, DATE_MIGRATION_BATCH_SIZE
+from utils.dates import parse_datetime
+from utils.leases import acquire_lease, release_lease
+
+MIGRATION_ID = "bson_dates"
+MIGRATION_LEASE = "date_migration"
+# A batch takes well under this; a worker stalled longer loses the lease
+MIGRATION_LEASE_SECONDS = 120
+# Set once every collection is converted; it never goes back
+_migrated = False
+
+# Date fields per collection; '*' matches every key of a map
+DATE_FIELDS: Dict[str, List[str]] = {
+    "users": ["created_at", "subscription_start", "subscription_end", "last_login"],
+    "vehicles": ["created_at", "insurance_expiry", "technical_inspection_expiry"],
+    "clients": ["created_at", "license_issue_date"],
+    "contracts": ["created_at", "start_date", "end_date", "signed_at"],
+    "reservations": ["created_at", "start_date", "end_date"],
+    "payments": ["created_at", "payment_date"],
+    "maintenance": ["created_at", "scheduled_date", "completed_date"],
+    "infractions": ["created_at", "date"],
+    "conversations": ["created_at", "last_message_at", "read_at.*"],
+    "messages": ["created_at"],
+    "messages_archive": ["first_created_at", "last_created_at"],
+}
+
+
+class MigrationLeaseLost(Exception):
+    """Another worker took the migration over"""
+
+
+def string_values(value, path: List[str], prefix: str = "") -> Iterator[Tuple[str, str]]:
+    """(dotted path, string) for each non-empty string found at `path` under value"""
+    if not path:
+        if isinstance(value, str) and value:
+            yield prefix, value
+        return
+    if not isinstance(value, dict):
+        return
+    head, rest = path[0], path[1:]
+    keys = list(value) if head == "*" else [head] if head in value else []
+    for key in keys:
+        yield from string_values(value[key], rest, f"{prefix}.{key}" if prefix else key)
+
+
+def date_update(doc: dict, fields: List[str]):
+    """Conditional update converting the document's string dates, or None"""
+    expected, changes = {}, {}
+    for field in fields:
+        for path, text in string_values(doc, field.split(".")):
+            try:
+                changes[path] = parse_datetime(text)
+            except ValueError:
+                logging.warning(f"Unparseable date left as is: {doc['_id']} {path}={text!r}")
+                continue
+            expected[path] = text
+    if not changes:
+        return None
+    return UpdateOne({"_id": doc['_id'], **expected}, {"$set": changes})
+
+
+async def migrate_collection(name: str, fields: List[str], batch_size: int = DATE_MIGRATION_BATCH_SIZE) -> int:
+    """Convert one collection from its checkpoint on; returns the documents updated"""
+    state = await db.migrations.find_one({"_id": MIGRATION_ID}, {f"collections.{name}": 1}) or {}
+    progress = state.get("collections", {}).get(name, {})
+    if progress.get("done"):
+        return 0
+
+    last_id = progress.get("last_id")
+    projection = {field.split(".")[0]: 1 for field in fields}
+    converted = 0
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = await db[name].find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+
+        updates = [u for u in (date_update(doc, fields) for doc in docs) if u is not None]
+        if updates:
+            result = await db[name].bulk_write(updates, ordered=False)
+            converted += result.modified_count
+            if result.matched_count < len(updates):
+                # Some documents changed under us: read the batch again
+                continue
+
+        last_id = docs[-1]['_id']
+        await db.migrations.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {f"collections.{name}.last_id": last_id}},
+            upsert=True
+        )
+        if not await acquire_lease(MIGRATION_LEASE, MIGRATION_LEASE_SECONDS):
+            raise MigrationLeaseLost(name)
+
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {f"collections.{name}.done": True}},
+        upsert=True
+    )
+    return converted
+
+
+async def dates_migrated() -> bool:
+    """Whether every collection has been converted"""
+    global _migrated
+    if not _migrated:
+        state = await db.migrations.find_one({"_id": MIGRATION_ID}, {"collections": 1}) or {}
+        progress = state.get("collections", {})
+        _migrated = all(progress.get(name, {}).get("done") for name in DATE_FIELDS)
+    return _migrated
+
+
+async def migrate_dates() -> Optional[Dict[str, int]]:
+    """Run the migration over every collection; finished ones are skipped.
+
+    None when another worker holds the migration lease.
+    """
+    if not await acquire_lease(MIGRATION_LEASE, MIGRATION_LEASE_SECONDS):
+        return None
+    try:
+        converted = {}
+        for name, fields in DATE_FIELDS.items():
+            count = await migrate_collection(name, fields)
+            if count:
+                converted[name] = count
+        return converted
+    finally:
+        await release_lease(MIGRATION_LEASE)
+
+
+async def run_date_migration():
+    try:
+        converted = await migrate_dates()
+        if converted is None:
+            logging.info("Date migration left to the worker holding its lease")
+        elif converted:
+            logging.info(f"Converted string dates to BSON dates: {converted}")
+    except asyncio.CancelledError:
+        raise
+    except MigrationLeaseLost as e:
+        logging.warning(f"Date migration lease lost while converting {e}; another worker resumes it")
+    except Exception as e:
+        # Resumes from its checkpoint on the next start
+        logging.error(f"Date migration failed: {e}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_date_migration())
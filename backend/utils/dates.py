@@ -0,0 +1,16 @@
+"""
+Date helpers for LocaTrack API
+"""
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+
+def parse_datetime(value: Union[str, datetime, None]) -> Optional[datetime]:
+    """Parse an ISO date/datetime (or pass a datetime through) as an aware UTC datetime"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
@@ -0,0 +1,281 @@
+"""
+MongoDB command monitoring for LocaTrack API
+
+A pymongo command listener times every command and attributes it to the
+request that issued it: DbTimingMiddleware puts a RequestDbStats in a
+contextvar, which Motor carries into the executor thread running the
+command. When the request ends its totals are added to its route template,
+so queries per request make N+1 patterns obvious. Commands slower than
+SLOW_QUERY_MS are logged with the shape of their filter, values masked.
+Commands issued outside any request are counted under BACKGROUND_ROUTE.
+"""
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pymongo import monitoring
+from typing import Any, Dict, Optional, Tuple
+import json
+import logging
+import threading
+
+from config import command_listeners, SLOW_QUERY_MS, SLOW_QUERY_LOG_SIZE
+
+BACKGROUND_ROUTE = "(background)"
+UNMATCHED_ROUTE = "(unmatched)"
+
+logger = logging.getLogger(__name__)
+
+
+def route_template(scope: dict) -> str:
+    """Method and path template of the route that handled a request"""
+    path = getattr(scope.get("route"), "path", None)
+    return f"{scope['method']} {path}" if path else UNMATCHED_ROUTE
+
+
+def command_collection(name: str, command: dict) -> Optional[str]:
+    if name == "getMore":
+        return command.get("collection")
+    value = command.get(name)
+    return value if isinstance(value, str) else None
+
+
+def command_filter(name: str, command: dict) -> Any:
+    if name == "find":
+        return command.get("filter", {})
+    if name in ("count", "distinct", "findAndModify"):
+        return command.get("query", {})
+    if name in ("update", "delete"):
+        statements = command.get("updates" if name == "update" else "deletes") or [{}]
+        return statements[0].get("q", {})
+    if name == "aggregate":
+        for stage in command.get("pipeline", []):
+            if "$match" in stage:
+                return stage["$match"]
+        return {}
+    return None
+
+
+def filter_shape(value: Any) -> Any:
+    """The filter with its values masked: what it selects on, not for whom"""
+    if isinstance(value, dict):
+        return {k: filter_shape(v) for k, v in value.items()}
+    if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+        return [filter_shape(v) for v in value]
+    return "?"
+
+
+def reply_docs(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if "value" in reply:
+        return 0 if reply["value"] is None else 1
+    return int(reply.get("n", 0))
+
+
+class CommandStats:
+    __slots__ = ("count", "time_ms", "docs", "failed", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.time_ms = 0.0
+        self.docs = 0
+        self.failed = 0
+        self.slow = 0
+
+    def add(self, time_ms: float, docs: int, failed: bool, slow: bool):
+        self.count += 1
+        self.time_ms += time_ms
+        self.docs += docs
+        self.failed += failed
+        self.slow += slow
+
+    def merge(self, other: "CommandStats"):
+        self.count += other.count
+        self.time_ms += other.time_ms
+        self.docs += other.docs
+        self.failed += other.failed
+        self.slow += other.slow
+
+
+def total(commands: Dict[Tuple[str, str], CommandStats]) -> CommandStats:
+    stats = CommandStats()
+    for command in commands.values():
+        stats.merge(command)
+    return stats
+
+
+def commands_summary(commands: Dict[Tuple[str, str], CommandStats]) -> list:
+    return [
+        {
+            "collection": collection,
+            "operation": operation,
+            "count": command.count,
+            "time_ms": round(command.time_ms, 2),
+            "docs": command.docs
+        }
+        for (collection, operation), command in sorted(
+            commands.items(), key=lambda item: item[1].time_ms, reverse=True
+        )
+    ]
+
+
+class RequestDbStats:
+    """Commands issued while serving one request, by (collection, operation)"""
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.finished = False
+        self.commands: Dict[Tuple[str, str], CommandStats] = {}
+
+    @property
+    def route(self) -> str:
+        return route_template(self.scope) if self.scope is not None else BACKGROUND_ROUTE
+
+    def to_dict(self) -> dict:
+        stats = total(self.commands)
+        return {
+            "queries": stats.count,
+            "db_time_ms": round(stats.time_ms, 2),
+            "docs": stats.docs,
+            "commands": commands_summary(self.commands)
+        }
+
+
+current_request: ContextVar[Optional[RequestDbStats]] = ContextVar("current_request_db_stats", default=None)
+
+
+class RouteStats:
+
+    def __init__(self):
+        self.requests = 0
+        self.commands: Dict[Tuple[str, str], CommandStats] = {}
+
+    def merge(self, commands: Dict[Tuple[str, str], CommandStats]):
+        for key, stats in commands.items():
+            self.commands.setdefault(key, CommandStats()).merge(stats)
+
+    def to_dict(self, route: str) -> dict:
+        stats = total(self.commands)
+        per_request = max(self.requests, 1)
+        return {
+            "route": route,
+            "requests": self.requests,
+            "queries": stats.count,
+            "queries_per_request": round(stats.count / per_request, 2),
+            "db_time_ms": round(stats.time_ms, 2),
+            "db_time_per_request_ms": round(stats.time_ms / per_request, 2),
+            "docs": stats.docs,
+            "failed": stats.failed,
+            "slow": stats.slow,
+            "commands": commands_summary(self.commands)
+        }
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Times commands per route; called from Motor's executor threads"""
+
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS, slow_log_size: int = SLOW_QUERY_LOG_SIZE):
+        self.slow_ms = slow_ms
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[Any, int], tuple] = {}
+        self._routes: Dict[str, RouteStats] = {}
+        self._since = datetime.now(timezone.utc)
+
+    def started(self, event):
+        collection = command_collection(event.command_name, event.command)
+        if collection is None:
+            return
+        self._pending[(event.connection_id, event.request_id)] = (
+            current_request.get(), collection, event.command_name, event.command
+        )
+
+    def succeeded(self, event):
+        self._finish(event, reply_docs(event.reply), failed=False)
+
+    def failed(self, event):
+        self._finish(event, 0, failed=True)
+
+    def _finish(self, event, docs: int, failed: bool):
+        started = self._pending.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        request, collection, operation, command = started
+        time_ms = event.duration_micros / 1000
+        slow = time_ms >= self.slow_ms
+        with self._lock:
+            if request is None or request.finished:
+                # Background work, or a task that outlived its request
+                route = request.route if request is not None else BACKGROUND_ROUTE
+                commands = self._routes.setdefault(route, RouteStats()).commands
+            else:
+                commands = request.commands
+            commands.setdefault((collection, operation), CommandStats()).add(time_ms, docs, failed, slow)
+        if slow:
+            self._log_slow(request, collection, operation, command, time_ms, docs)
+
+    def _log_slow(self, request, collection, operation, command, time_ms, docs):
+        route = request.route if request is not None else BACKGROUND_ROUTE
+        shape = filter_shape(command_filter(operation, command))
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "route": route,
+            "collection": collection,
+            "operation": operation,
+            "filter": shape,
+            "time_ms": round(time_ms, 2),
+            "docs": docs
+        }
+        self.slow_queries.append(entry)
+        logger.warning(
+            f"Slow query {time_ms:.1f} ms: {collection}.{operation} {json.dumps(shape, default=str)} "
+            f"({docs} docs) from {route}"
+        )
+
+    def request_done(self, request: RequestDbStats):
+        with self._lock:
+            request.finished = True
+            route = self._routes.setdefault(request.route, RouteStats())
+            route.requests += 1
+            route.merge(request.commands)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes = [stats.to_dict(route) for route, stats in self._routes.items()]
+        routes.sort(key=lambda r: r["db_time_ms"], reverse=True)
+        return {
+            "since": self._since.isoformat(),
+            "slow_query_ms": self.slow_ms,
+            "routes": routes,
+            "slow_queries": list(reversed(self.slow_queries))
+        }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self.slow_queries.clear()
+            self._since = datetime.now(timezone.utc)
+
+
+class DbTimingMiddleware:
+    """ASGI middleware attributing the commands of each HTTP request to its route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = RequestDbStats(scope)
+        token = current_request.set(request)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
+            command_recorder.request_done(request)
+
+
+command_recorder = CommandRecorder()
+command_listeners.add(command_recorder)
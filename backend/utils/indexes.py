@@ -0,0 +1,98 @@
+"""
+Declarative index registry for LocaTrack API
+
+Each module declares the indexes its queries rely on, next to the queries
+themselves; server.py applies the whole registry at startup. Creating an
+index that already exists is a no-op, so applying it is idempotent.
+
+An index whose declared options changed (e.g. it became unique) conflicts
+with the existing one. Startup only logs the conflict and keeps the existing
+index: every worker starts at once, and a failed rebuild (a unique build over
+duplicate data) would leave the collection without the index. Rebuild them
+once, after checking the data, with:
+
+    cd backend
+    python -m utils.indexes --rebuild
+"""
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+from typing import Dict, List, Tuple, Union
+import argparse
+import asyncio
+import logging
+
+from config import db
+
+# Server error codes for an existing index with the same name or keys but other options
+INDEX_CONFLICT_CODES = (85, 86)
+
+IndexKeys = Union[str, List[Tuple[str, Union[int, str]]]]
+
+
+class IndexSpec:
+
+    def __init__(self, collection: str, keys: IndexKeys, **options):
+        self.collection = collection
+        self.model = IndexModel(keys, **options)
+
+    @property
+    def name(self) -> str:
+        return self.model.document['name']
+
+
+_registry: Dict[Tuple[str, str], IndexSpec] = {}
+
+
+def declare_index(collection: str, keys: IndexKeys, **options):
+    """Register an index; declaring the same index twice is harmless"""
+    spec = IndexSpec(collection, keys, **options)
+    _registry[(collection, spec.name)] = spec
+
+
+def declared_indexes() -> List[IndexSpec]:
+    return list(_registry.values())
+
+
+async def apply_indexes(rebuild: bool = False) -> List[str]:
+    """Create every declared index, one at a time so one failure does not block the rest.
+    
+    Returns the indexes left in conflict with their declaration; with
+    `rebuild` they are dropped and created again instead.
+    """
+    conflicts = []
+    for spec in declared_indexes():
+        collection = db[spec.collection]
+        try:
+            await collection.create_indexes([spec.model])
+        except OperationFailure as e:
+            if e.code not in INDEX_CONFLICT_CODES:
+                logging.warning(f"Could not create index {spec.collection}.{spec.name}: {e}")
+                continue
+            if not rebuild:
+                conflicts.append(f"{spec.collection}.{spec.name}")
+                logging.warning(
+                    f"Index {spec.collection}.{spec.name} differs from its declaration and was kept; "
+                    f"rebuild it with `python -m utils.indexes --rebuild`: {e}"
+                )
+                continue
+            logging.info(f"Rebuilding index {spec.collection}.{spec.name} with its declared options")
+            try:
+                await collection.drop_index(spec.name)
+                await collection.create_indexes([spec.model])
+            except OperationFailure as e:
+                conflicts.append(f"{spec.collection}.{spec.name}")
+                logging.error(f"Could not rebuild index {spec.collection}.{spec.name}, it is missing now: {e}")
+    return conflicts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the declared MongoDB indexes")
+    parser.add_argument("--rebuild", action="store_true", help="drop and recreate indexes whose options changed")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    # The server's modules declare into utils.indexes, not into this __main__ copy
+    import server  # noqa: F401
+    from utils import indexes
+    left = asyncio.run(indexes.apply_indexes(rebuild=args.rebuild))
+    if left:
+        raise SystemExit(f"Indexes still differing from their declaration: {', '.join(left)}")
@@ -0,0 +1,38 @@
+"""
+Time-limited leases electing one worker for a background job
+
+A lease is a document in `leases` naming its holder and expiry. A worker
+holds it while it renews it before it expires; once expired (its holder
+stopped or crashed) any worker can take it over. Workers are told apart by
+WORKER_ID, one per process.
+"""
+from datetime import datetime, timezone, timedelta
+from pymongo.errors import DuplicateKeyError
+import uuid
+
+from config import db
+from utils.indexes import declare_index
+
+WORKER_ID = str(uuid.uuid4())
+
+# Leases nobody renewed for a day are dropped
+declare_index("leases", "expires_at", expireAfterSeconds=24 * 3600)
+
+
+async def acquire_lease(name: str, ttl_seconds: float) -> bool:
+    """Take or renew the lease; False while another worker holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.leases.update_one(
+            {"_id": name, "$or": [{"holder": WORKER_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"holder": WORKER_ID, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease exists and another worker's hold has not expired
+        return False
+    return True
+
+
+async def release_lease(name: str):
+    await db.leases.delete_one({"_id": name, "holder": WORKER_ID})
@@ -0,0 +1,123 @@
+"""
+List query DSL for LocaTrack API
+
+List endpoints accept, on the fields each one whitelists:
+
+    ?status=active                   equality
+    ?status=active,completed         any of the values
+    ?start_date__gte=2026-01-01      range: __gt, __gte, __lt, __lte
+    ?sort=-end_date                  sort, - for descending
+    ?fields=id,status,total_amount   only these fields
+
+These become one Mongo filter, sort and projection next to the tenant
+condition, so the (tenant_id, ...) indexes select the rows and only the
+requested fields leave the database. Paging (`limit`, `cursor`) works as
+described in utils.pagination. Other parameters (cache busters such as `_`,
+tracking tags, `profile`) are ignored; a bad operator or value on a
+filterable field is a 400.
+"""
+from fastapi import Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Type
+import logging
+
+from utils.dates import parse_datetime
+from utils.pagination import PageRequest, fetch_page, pagination
+from utils.serialization import datetime_fields, rows_response
+
+RANGE_OPERATORS = {"gt": "$gt", "gte": "$gte", "lt": "$lt", "lte": "$lte"}
+RESERVED_PARAMS = {"limit", "cursor", "sort", "fields"}
+
+
+class ListQuery:
+    """Filter, projection and page of a list request"""
+
+    def __init__(self, model: Type[BaseModel], page: PageRequest, filter: dict, projection: dict, partial: bool):
+        self.model = model
+        self.page = page
+        self.filter = filter
+        self.projection = projection
+        self.partial = partial
+
+    async def fetch(self, collection, query: dict):
+        result = await fetch_page(collection, {**query, **self.filter}, self.page, self.projection)
+        if self.partial:
+            # Partial documents do not fit the endpoint's response model
+            return ORJSONResponse(result)
+        return rows_response(self.model, result)
+
+
+def parse_value(field: str, kind: type, raw: str):
+    try:
+        if kind is bool:
+            if raw.lower() not in ("true", "false"):
+                raise ValueError(raw)
+            return raw.lower() == "true"
+        if kind is datetime:
+            return parse_datetime(raw)
+        return kind(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid value for '{field}': {raw}")
+
+
+def parse_filters(request: Request, filters: Dict[str, type]) -> dict:
+    query = {}
+    for name, raw in request.query_params.multi_items():
+        if name in RESERVED_PARAMS:
+            continue
+        field, _, op = name.partition("__")
+        kind = filters.get(field)
+        if kind is None:
+            logging.debug(f"Ignoring query parameter '{name}'")
+            continue
+        if op and (op not in RANGE_OPERATORS or kind in (str, bool)):
+            raise HTTPException(status_code=400, detail=f"Cannot filter on '{name}'")
+
+        if op:
+            condition = query.setdefault(field, {})
+            if not isinstance(condition, dict) or "$in" in condition:
+                raise HTTPException(status_code=400, detail=f"Conflicting filters on '{field}'")
+            condition[RANGE_OPERATORS[op]] = parse_value(field, kind, raw)
+        else:
+            if field in query:
+                raise HTTPException(status_code=400, detail=f"Conflicting filters on '{field}'")
+            values = [parse_value(field, kind, v) for v in raw.split(",")]
+            query[field] = values[0] if len(values) == 1 else {"$in": values}
+    return query
+
+
+def list_query(
+    model: Type[BaseModel],
+    filters: Dict[str, type],
+    sort_fields: Sequence[str] = ("created_at",),
+    hidden: Sequence[str] = ()
+):
+    """Dependency for a list endpoint of `model`.
+
+    `filters` maps the filterable fields to their type (str, bool, int,
+    float or datetime; only numbers and dates take ranges). `hidden` fields
+    are left out unless asked for by name in `fields`.
+    """
+    selectable = set(model.model_fields)
+    date_fields = [f for f in sort_fields if f in datetime_fields(model)]
+
+    def dependency(
+        request: Request,
+        page: PageRequest = Depends(pagination(sort_fields, date_fields=date_fields)),
+        fields: Optional[str] = None
+    ) -> ListQuery:
+        query = parse_filters(request, filters)
+        if not fields:
+            return ListQuery(model, page, query, {"_id": 0, **{f: 0 for f in hidden}}, partial=False)
+
+        requested = [f for f in fields.split(",") if f]
+        unknown = [f for f in requested if f not in selectable]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        # The cursor is built from the sort field and id
+        projection = {"_id": 0, "id": 1, page.sort_field: 1, **{f: 1 for f in requested}}
+        return ListQuery(model, page, query, projection, partial=True)
+
+    return dependency
@@ -0,0 +1,184 @@
+"""
+Prometheus metrics for LocaTrack API
+
+Metrics are declared next to the code that records them (like indexes)
+and rendered in the Prometheus text format at GET /metrics. Recording is
+a dict update on the event loop thread: no locks, no allocation once a
+label set has been seen. Route labels are path templates, so label
+cardinality stays bounded by the routes of the app.
+"""
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Sequence, Tuple
+import asyncio
+import time
+
+from config import LOOP_LAG_INTERVAL_SECONDS
+from utils.db_monitor import UNMATCHED_ROUTE
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: Dict[str, "Metric"] = {}
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def samples(self) -> Iterator[str]:
+        for values, value in self._values.items():
+            yield f"{self.name}{format_labels(self.labels, values)} {format_value(value)}"
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self.samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        state = self._values.get(labels)
+        if state is None:
+            # Per-bucket counts (not cumulative), sum, count
+            state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[0][index] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self) -> Iterator[str]:
+        names = self.labels + ("le",)
+        for values, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{format_labels(names, values + (format_value(bound),))} {cumulative}"
+            yield f"{self.name}_bucket{format_labels(names, values + ('+Inf',))} {count}"
+            yield f"{self.name}_sum{format_labels(self.labels, values)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(self.labels, values)} {count}"
+
+
+def _declare(metric_class, name: str, *args, **kwargs):
+    metric = _registry.get(name)
+    if metric is None:
+        metric = _registry[name] = metric_class(name, *args, **kwargs)
+    return metric
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return _declare(Counter, name, help, labels)
+
+
+def gauge(name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+    return _declare(Gauge, name, help, labels)
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return _declare(Histogram, name, help, labels, buckets=buckets)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "HTTP requests being served")
+HTTP_IN_FLIGHT.set(0)
+HTTP_LATENCY = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and status", ("method", "route", "status")
+)
+CACHE_LOOKUPS = counter("cache_lookups_total", "In-process cache lookups by cache and result", ("cache", "result"))
+LOOP_LAG = histogram(
+    "event_loop_lag_seconds", "Delay of the event loop in waking a timer",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache, "hit" if hit else "miss")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request count, in-flight requests and latency"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            labels = (scope["method"], getattr(scope.get("route"), "path", UNMATCHED_ROUTE), str(status))
+            HTTP_REQUESTS.inc(*labels)
+            HTTP_LATENCY.observe(time.perf_counter() - start, *labels)
+
+
+async def monitor_event_loop(interval: float = LOOP_LAG_INTERVAL_SECONDS):
+    """Measure how late the loop wakes from a sleep: time spent blocked"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(loop.time() - start - interval, 0.0))
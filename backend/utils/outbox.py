@@ -0,0 +1,399 @@
+"""
+Outbound notification dispatch for LocaTrack API
+
+Alerts are queued once a day in the `outbox` collection, one entry per
+(recipient, alert). The dispatcher claims pending entries in batches,
+groups them into one digest per recipient and sends the digests over a
+pooled SMTP connection set or an HTTP gateway, under a global rate limit.
+Failed digests are retried with exponential backoff up to
+OUTBOX_MAX_ATTEMPTS.
+
+Any SMTP stand-in works for local testing, e.g.
+`OUTBOX_EMAIL_TRANSPORT=smtp SMTP_PORT=1025` against
+`python -m aiosmtpd -n -l localhost:1025`.
+"""
+from pymongo import UpdateMany, UpdateOne
+from email.message import EmailMessage
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import httpx
+import logging
+import smtplib
+import uuid
+
+from config import (
+    db, OUTBOX_EMAIL_TRANSPORT, SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_STARTTLS,
+    SMTP_FROM, EMAIL_GATEWAY_URL, SMS_GATEWAY_URL, GATEWAY_TOKEN, OUTBOX_POOL_SIZE,
+    OUTBOX_BATCH_SIZE, OUTBOX_RATE_PER_SECOND, OUTBOX_MAX_ATTEMPTS, OUTBOX_INTERVAL_SECONDS,
+    DIGEST_HOUR_UTC
+)
+from models import UserRole
+from utils.indexes import declare_index
+
+GATEWAY_CHUNK_SIZE = 50  # digests per gateway request
+CLAIM_TIMEOUT = timedelta(minutes=10)  # claims older than this were abandoned by a crashed worker
+MAX_BACKOFF = timedelta(hours=6)
+SENT_RETENTION_SECONDS = 30 * 24 * 3600
+
+declare_index("outbox", [("channel", 1), ("recipient", 1), ("dedup_key", 1)], unique=True)
+declare_index("outbox", [("status", 1), ("next_attempt_at", 1)])
+declare_index("outbox", "claim")
+declare_index("outbox", "sent_at", expireAfterSeconds=SENT_RETENTION_SECONDS)
+
+
+class RateLimiter:
+    """Token bucket shared by every send of this worker"""
+
+    def __init__(self, rate_per_second: float):
+        self.rate = rate_per_second
+        self._tokens = rate_per_second
+        self._updated: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, count: int = 1):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # Batches larger than the bucket wait for a full bucket, then go
+                if self._tokens >= min(count, self.rate):
+                    self._tokens -= count
+                    return
+                await asyncio.sleep((min(count, self.rate) - self._tokens) / self.rate)
+
+
+class Transport:
+    """Sends digests; returns one error (or None on success) per digest"""
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    async def send(self, digests: List[dict]) -> List[Optional[str]]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class SmtpTransport(Transport):
+    """Pool of persistent SMTP connections, each used by one send at a time"""
+
+    def __init__(self, limiter: RateLimiter, pool_size: int = OUTBOX_POOL_SIZE):
+        super().__init__(limiter)
+        self._pool: asyncio.Queue = asyncio.Queue()
+        for _ in range(pool_size):
+            self._pool.put_nowait(None)  # connected lazily
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        if SMTP_STARTTLS:
+            connection.starttls()
+        if SMTP_USER:
+            connection.login(SMTP_USER, SMTP_PASSWORD)
+        return connection
+
+    def _send_message(self, connection: Optional[smtplib.SMTP], message: EmailMessage) -> smtplib.SMTP:
+        if connection is None:
+            connection = self._connect()
+        try:
+            connection.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # Idle connections are dropped by the server between runs
+            connection = self._connect()
+            connection.send_message(message)
+        return connection
+
+    async def _send_one(self, digest: dict) -> Optional[str]:
+        message = EmailMessage()
+        message['From'] = SMTP_FROM
+        message['To'] = digest['recipient']
+        message['Subject'] = digest['subject']
+        message.set_content(digest['body'])
+
+        await self.limiter.acquire()
+        connection = await self._pool.get()
+        try:
+            connection = await asyncio.to_thread(self._send_message, connection, message)
+            return None
+        except Exception as e:
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            connection = None
+            return str(e) or type(e).__name__
+        finally:
+            self._pool.put_nowait(connection)
+
+    async def send(self, digests: List[dict]) -> List[Optional[str]]:
+        return list(await asyncio.gather(*(self._send_one(d) for d in digests)))
+
+    async def close(self):
+        while not self._pool.empty():
+            connection = self._pool.get_nowait()
+            if connection is not None:
+                try:
+                    await asyncio.to_thread(connection.quit)
+                except Exception:
+                    pass
+
+
+class HttpGatewayTransport(Transport):
+    """JSON gateway (email or SMS provider) accepting batches of messages"""
+
+    def __init__(self, limiter: RateLimiter, url: str, pool_size: int = OUTBOX_POOL_SIZE):
+        super().__init__(limiter)
+        self.url = url
+        self._client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            headers={"Authorization": f"Bearer {GATEWAY_TOKEN}"} if GATEWAY_TOKEN else None
+        )
+
+    async def _send_chunk(self, chunk: List[dict]) -> List[Optional[str]]:
+        await self.limiter.acquire(len(chunk))
+        try:
+            response = await self._client.post(self.url, json={"messages": [
+                {"to": d['recipient'], "subject": d['subject'], "body": d['body']}
+                for d in chunk
+            ]})
+            response.raise_for_status()
+            return [None] * len(chunk)
+        except httpx.HTTPError as e:
+            return [str(e) or type(e).__name__] * len(chunk)
+
+    async def send(self, digests: List[dict]) -> List[Optional[str]]:
+        chunks = [digests[i:i + GATEWAY_CHUNK_SIZE] for i in range(0, len(digests), GATEWAY_CHUNK_SIZE)]
+        results = await asyncio.gather(*(self._send_chunk(chunk) for chunk in chunks))
+        return [error for chunk_errors in results for error in chunk_errors]
+
+    async def close(self):
+        await self._client.aclose()
+
+
+_limiter: Optional[RateLimiter] = None
+_transports: Dict[str, Transport] = {}
+
+
+def enabled_channels() -> List[str]:
+    channels = []
+    if OUTBOX_EMAIL_TRANSPORT == "smtp" or (OUTBOX_EMAIL_TRANSPORT == "http" and EMAIL_GATEWAY_URL):
+        channels.append("email")
+    if SMS_GATEWAY_URL:
+        channels.append("sms")
+    return channels
+
+
+def get_transport(channel: str) -> Transport:
+    global _limiter
+    if channel not in _transports:
+        if _limiter is None:
+            _limiter = RateLimiter(OUTBOX_RATE_PER_SECOND)
+        if channel == "sms":
+            _transports[channel] = HttpGatewayTransport(_limiter, SMS_GATEWAY_URL)
+        elif OUTBOX_EMAIL_TRANSPORT == "http":
+            _transports[channel] = HttpGatewayTransport(_limiter, EMAIL_GATEWAY_URL)
+        else:
+            _transports[channel] = SmtpTransport(_limiter)
+    return _transports[channel]
+
+
+async def close_transports():
+    for transport in _transports.values():
+        await transport.close()
+    _transports.clear()
+
+
+async def enqueue_alert_digests(now: Optional[datetime] = None) -> int:
+    """Queue today's alerts of every active tenant; idempotent for a given day"""
+    now = now or datetime.now(timezone.utc)
+    day = now.date().isoformat()
+    channels = enabled_channels()
+    if not channels:
+        return 0
+
+    tenants = await db.users.find(
+        {"role": UserRole.LOCATEUR, "is_suspended": {"$ne": True}},
+        {"_id": 0, "id": 1, "email": 1, "full_name": 1, "phone": 1}
+    ).to_list(None)
+
+    queued = 0
+    for tenant in tenants:
+        alerts = await db.alerts.find(
+            {"tenant_id": tenant['id']},
+            {"_id": 0, "dedup_key": 1, "title": 1, "message": 1, "severity": 1}
+        ).sort([("severity", 1), ("due_at", 1)]).to_list(None)
+        if not alerts:
+            continue
+
+        entry = {
+            "tenant_id": tenant['id'],
+            "recipient_name": tenant.get('full_name'),
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now
+        }
+        writes = []
+        if "email" in channels:
+            writes.extend(
+                UpdateOne(
+                    {"channel": "email", "recipient": tenant['email'], "dedup_key": f"{day}:{alert['dedup_key']}"},
+                    {"$setOnInsert": {
+                        **entry,
+                        "id": str(uuid.uuid4()),
+                        "title": alert['title'],
+                        "message": alert['message'],
+                        "severity": alert['severity']
+                    }},
+                    upsert=True
+                )
+                for alert in alerts
+            )
+        if "sms" in channels and tenant.get('phone'):
+            # SMS get a single summary line rather than every alert
+            danger = sum(1 for alert in alerts if alert['severity'] == 0)
+            writes.append(UpdateOne(
+                {"channel": "sms", "recipient": tenant['phone'], "dedup_key": f"{day}:summary"},
+                {"$setOnInsert": {
+                    **entry,
+                    "id": str(uuid.uuid4()),
+                    "title": "LocaTrack",
+                    "message": f"{len(alerts)} alertes dont {danger} urgentes",
+                    "severity": 0 if danger else 1
+                }},
+                upsert=True
+            ))
+        if writes:
+            result = await db.outbox.bulk_write(writes, ordered=False)
+            queued += result.upserted_count
+    return queued
+
+
+def build_digest(channel: str, recipient: str, entries: List[dict]) -> dict:
+    if channel == "sms":
+        return {
+            "recipient": recipient,
+            "subject": "LocaTrack",
+            "body": "LocaTrack: " + " / ".join(e['message'] for e in entries)
+        }
+
+    name = entries[0].get('recipient_name')
+    lines = [
+        f"Bonjour {name}," if name else "Bonjour,",
+        "",
+        f"{len(entries)} alerte(s) pour votre flotte :",
+        ""
+    ]
+    for e in sorted(entries, key=lambda e: e.get('severity', 1)):
+        marker = "[URGENT] " if e.get('severity') == 0 else ""
+        lines.append(f"- {marker}{e['title']} : {e['message']}")
+    return {
+        "recipient": recipient,
+        "subject": f"LocaTrack - {len(entries)} alerte(s)",
+        "body": "\n".join(lines)
+    }
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return min(timedelta(minutes=2 ** attempts), MAX_BACKOFF)
+
+
+async def dispatch_outbox() -> dict:
+    """Send every due outbox entry as per-recipient digests"""
+    now = datetime.now(timezone.utc)
+    await db.outbox.update_many(
+        {"status": "sending", "claimed_at": {"$lt": now - CLAIM_TIMEOUT}},
+        {"$set": {"status": "pending"}, "$unset": {"claim": ""}}
+    )
+
+    stats = {"digests": 0, "sent": 0, "failed": 0}
+    while True:
+        groups = await db.outbox.aggregate([
+            {"$match": {"status": "pending", "next_attempt_at": {"$lte": now}}},
+            {"$group": {"_id": {"channel": "$channel", "recipient": "$recipient"}}},
+            {"$limit": OUTBOX_BATCH_SIZE}
+        ]).to_list(None)
+        if not groups:
+            break
+
+        # Claim the batch so concurrent dispatchers on other workers skip it
+        claim = str(uuid.uuid4())
+        await db.outbox.update_many(
+            {
+                "status": "pending",
+                "next_attempt_at": {"$lte": now},
+                "$or": [{"channel": g['_id']['channel'], "recipient": g['_id']['recipient']} for g in groups]
+            },
+            {"$set": {"status": "sending", "claim": claim, "claimed_at": now}}
+        )
+        entries = await db.outbox.find({"claim": claim}, {"_id": 0}).to_list(None)
+        if not entries:
+            continue
+
+        by_recipient: Dict[tuple, List[dict]] = {}
+        for entry in entries:
+            by_recipient.setdefault((entry['channel'], entry['recipient']), []).append(entry)
+
+        writes = []
+        for channel in {channel for channel, _ in by_recipient}:
+            keys = [key for key in by_recipient if key[0] == channel]
+            digests = [build_digest(channel, recipient, by_recipient[(channel, recipient)]) for _, recipient in keys]
+            errors = await get_transport(channel).send(digests)
+
+            for key, error in zip(keys, errors):
+                ids = [e['id'] for e in by_recipient[key]]
+                stats['digests'] += 1
+                if error is None:
+                    stats['sent'] += len(ids)
+                    writes.append(UpdateMany(
+                        {"claim": claim, "id": {"$in": ids}},
+                        {"$set": {"status": "sent", "sent_at": datetime.now(timezone.utc)}, "$unset": {"claim": ""}}
+                    ))
+                    continue
+                attempts = max(e['attempts'] for e in by_recipient[key]) + 1
+                failed = attempts >= OUTBOX_MAX_ATTEMPTS
+                if failed:
+                    stats['failed'] += len(ids)
+                logging.warning(f"Digest to {key[1]} failed (attempt {attempts}): {error}")
+                # Every entry of the digest shares its outcome
+                writes.append(UpdateMany(
+                    {"claim": claim, "id": {"$in": ids}},
+                    {
+                        "$set": {
+                            "status": "failed" if failed else "pending",
+                            "attempts": attempts,
+                            "next_attempt_at": now + retry_delay(attempts),
+                            "last_error": error
+                        },
+                        "$unset": {"claim": ""}
+                    }
+                ))
+        if writes:
+            await db.outbox.bulk_write(writes, ordered=False)
+    return stats
+
+
+async def run_outbox_loop():
+    last_digest_day = None
+    while True:
+        try:
+            now = datetime.now(timezone.utc)
+            if now.hour >= DIGEST_HOUR_UTC and last_digest_day != now.date():
+                queued = await enqueue_alert_digests(now)
+                last_digest_day = now.date()
+                if queued:
+                    logging.info(f"Queued {queued} alert notifications for today's digests")
+            stats = await dispatch_outbox()
+            if stats['digests']:
+                logging.info(f"Outbox dispatch: {stats}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Outbox dispatch failed: {e}")
+        await asyncio.sleep(OUTBOX_INTERVAL_SECONDS)
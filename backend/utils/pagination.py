@@ -0,0 +1,143 @@
+"""
+Keyset pagination for LocaTrack API
+
+List endpoints page on (sort field, id): the cursor carries the sort value
+and id of the last row served, so every page is one range scan on the
+(tenant_id, sort field, id) index however deep the client pages. Routers
+declare that index for each sort field they allow with declare_sort_indexes.
+Without `limit` or `cursor` the endpoints keep answering with a plain array.
+
+MongoDB sorts null and missing values first and brackets types (numbers,
+then strings, then dates), while a range condition only matches its own
+type: the page filter adds a branch for the values sorting past the cursor
+in other types. Paging on a date field is refused until the date migration
+has converted the legacy strings, whose ISO formats do not sort as dates.
+"""
+from fastapi import HTTPException, Query
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple
+import base64
+import binascii
+import json
+
+from utils.date_migration import dates_migrated
+from utils.indexes import declare_index
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Plain array responses are capped as before
+LEGACY_LIST_LIMIT = 1000
+# $type aliases of the values sort fields hold, in MongoDB's sort order
+SORT_TYPE_ORDER = [("number", (int, float)), ("string", (str,)), ("date", (datetime,))]
+
+
+def declare_sort_indexes(collection: str, sort_fields: Sequence[str], prefix: Sequence[str] = ("tenant_id",)):
+    """Declare the (prefix, sort field, id) index behind each allowed sort"""
+    for field in sort_fields:
+        declare_index(collection, [*((key, 1) for key in prefix), (field, 1), ("id", 1)])
+
+
+def encode_cursor(field: str, value: Any, doc_id: str) -> str:
+    is_date = isinstance(value, datetime)
+    payload = [field, value.isoformat() if is_date else value, doc_id, is_date]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, field: str) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_field, value, doc_id, is_date = json.loads(raw)
+        if is_date:
+            value = datetime.fromisoformat(value)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_field != field:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort")
+    return value, doc_id
+
+
+class PageRequest:
+    """Sort, page size and position of a list request"""
+
+    def __init__(self, sort_field: str, direction: int, limit: Optional[int], after: Optional[Tuple[Any, str]]):
+        self.sort_field = sort_field
+        self.direction = direction
+        self.limit = limit
+        self.after = after
+
+    @property
+    def paged(self) -> bool:
+        return self.limit is not None
+
+    @property
+    def sort(self):
+        return [(self.sort_field, self.direction), ("id", self.direction)]
+
+    def filter(self, query: dict) -> dict:
+        """Restrict a query to the rows after the cursor"""
+        if not self.after:
+            return query
+        value, doc_id = self.after
+        field = self.sort_field
+        op = "$gt" if self.direction == 1 else "$lt"
+        if value is None:
+            branches = [{field: None, "id": {op: doc_id}}]
+            if self.direction == 1:
+                branches.append({field: {"$ne": None}})
+            return {**query, "$or": branches}
+
+        rank = next((i for i, (_, kinds) in enumerate(SORT_TYPE_ORDER) if isinstance(value, kinds)), None)
+        branches = [{field: {op: value}}, {field: value, "id": {op: doc_id}}]
+        if rank is not None:
+            past = SORT_TYPE_ORDER[rank + 1:] if self.direction == 1 else SORT_TYPE_ORDER[:rank]
+            branches.extend({field: {"$type": alias}} for alias, _ in past)
+        if self.direction == -1:
+            branches.append({field: None})
+        return {**query, "$or": branches}
+
+
+def pagination(
+    sort_fields: Sequence[str] = ("created_at",),
+    default_sort: str = "created_at",
+    date_fields: Sequence[str] = ("created_at",)
+):
+    """Dependency reading `limit`, `cursor` and `sort` (a field, prefixed with - for descending)"""
+
+    async def page_request(
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        sort: str = default_sort
+    ) -> PageRequest:
+        field = sort.lstrip("-")
+        if field not in sort_fields:
+            raise HTTPException(status_code=400, detail=f"Cannot sort on '{field}'")
+        after = decode_cursor(cursor, field) if cursor else None
+        if cursor and limit is None:
+            limit = DEFAULT_PAGE_SIZE
+        if limit is not None and field in date_fields and not await dates_migrated():
+            raise HTTPException(
+                status_code=503,
+                detail=f"Paging on '{field}' is unavailable until the date migration completes"
+            )
+        return PageRequest(field, -1 if sort.startswith("-") else 1, limit, after)
+
+    return page_request
+
+
+def empty_page(page: PageRequest):
+    return {"items": [], "next_cursor": None} if page.paged else []
+
+
+async def fetch_page(collection, query: dict, page: PageRequest, projection: Optional[dict] = None):
+    """A plain array when no page was asked for, else {"items", "next_cursor"}"""
+    projection = projection or {"_id": 0}
+    if not page.paged:
+        return await collection.find(query, projection).sort(page.sort).to_list(LEGACY_LIST_LIMIT)
+
+    docs = await collection.find(page.filter(query), projection).sort(page.sort).limit(page.limit + 1).to_list(page.limit + 1)
+    next_cursor = None
+    if len(docs) > page.limit:
+        docs = docs[:page.limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(page.sort_field, last.get(page.sort_field), last['id'])
+    return {"items": docs, "next_cursor": next_cursor}
@@ -0,0 +1,106 @@
+"""
+Cache of authenticated principals for LocaTrack API
+
+Resolved users are kept in memory per token subject (email) for
+PRINCIPAL_CACHE_TTL_SECONDS, so most authenticated requests skip the users
+lookup. Endpoints that change a user invalidate it: locally at once, and on
+other workers through the realtime broadcast backend.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from config import PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_SIZE
+from models import User
+from utils.metrics import cache_lookup
+from utils.realtime import SlowConsumer, broadcast
+
+PRINCIPALS_CHANNEL = "principals"
+
+
+class PrincipalCache:
+
+    def __init__(self, ttl_seconds: float = PRINCIPAL_CACHE_TTL_SECONDS, max_size: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._subjects: Dict[str, str] = {}  # user id -> subject
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, subject: str) -> Optional[User]:
+        entry = self._entries.get(subject)
+        if entry is None:
+            cache_lookup("principals", False)
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            self._pop(subject)
+            cache_lookup("principals", False)
+            return None
+        self._entries.move_to_end(subject)
+        cache_lookup("principals", True)
+        return user
+
+    def put(self, subject: str, user: User):
+        if self.ttl <= 0:
+            return
+        self._entries[subject] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(subject)
+        self._subjects[user.id] = subject
+        while len(self._entries) > self.max_size:
+            self._pop(next(iter(self._entries)))
+
+    def _pop(self, subject: str):
+        entry = self._entries.pop(subject, None)
+        if entry is not None and self._subjects.get(entry[1].id) == subject:
+            del self._subjects[entry[1].id]
+
+    def _drop_where(self, predicate: Callable[[User], bool]):
+        for subject in [s for s, (_, user) in self._entries.items() if predicate(user)]:
+            self._pop(subject)
+
+    def drop(self, user_id: Optional[str] = None, tenant_id: Optional[str] = None):
+        if user_id:
+            subject = self._subjects.get(user_id)
+            if subject:
+                self._pop(subject)
+        if tenant_id:
+            self._drop_where(lambda user: user.tenant_id == tenant_id or user.id == tenant_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._subjects.clear()
+
+    async def invalidate(self, user_id: Optional[str] = None, tenant_id: Optional[str] = None):
+        """Forget a user, or every user of a tenant, on every worker"""
+        self.drop(user_id=user_id, tenant_id=tenant_id)
+        try:
+            await broadcast.publish(PRINCIPALS_CHANNEL, {"user_id": user_id, "tenant_id": tenant_id})
+        except Exception as e:
+            # Other workers fall back to the TTL
+            logging.warning(f"Principal invalidation not broadcast: {e}")
+
+    async def _listen(self):
+        while True:
+            subscription = broadcast.subscribe([PRINCIPALS_CHANNEL])
+            try:
+                async for event in subscription:
+                    self.drop(user_id=event.get("user_id"), tenant_id=event.get("tenant_id"))
+            except SlowConsumer:
+                # Invalidations were lost: start over from an empty cache
+                self.clear()
+            finally:
+                broadcast.unsubscribe(subscription)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,193 @@
+"""
+On-demand request profiling for LocaTrack API
+
+A superadmin turns profiling on for a while (POST /api/admin/profiling),
+optionally for one tenant. While it is on, requests of that tenant are run
+under cProfile when they carry `X-Profile: 1` (or `?profile=1`) or win the
+sample draw at the chosen rate. Each profile is saved with its route,
+tenant, status, duration and MongoDB timings to a ring buffer of the
+newest PROFILE_BUFFER_SIZE profiles under PROFILES_DIR; the .prof files
+open in snakeviz or pstats. While profiling is off the middleware only
+checks a flag.
+
+cProfile sees the whole event loop thread, so other requests served at
+the same time show up in a profile too; only one request is profiled at a
+time for the same reason.
+"""
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional
+from urllib.parse import parse_qs
+import asyncio
+import cProfile
+import json
+import logging
+import pstats
+import random
+import re
+import time
+import uuid
+
+from fastapi import HTTPException
+
+from config import PROFILES_DIR, PROFILE_BUFFER_SIZE
+from models import UserRole
+from utils.auth import get_user_from_token, get_tenant_id
+from utils.db_monitor import current_request, route_template
+
+PROFILE_ID = re.compile(r"^[0-9TZ]+-[0-9a-f]{8}$")
+TOP_FUNCTIONS = 25
+
+
+def top_functions(profile: cProfile.Profile, limit: int = TOP_FUNCTIONS) -> List[dict]:
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "own_ms": round(own * 1000, 2),
+            "cumulative_ms": round(cumulative * 1000, 2)
+        }
+        for (filename, line, name), (_, calls, own, cumulative, _) in rows
+    ]
+
+
+class ProfileStore:
+    """Ring buffer of profiles on disk: <id>.prof and <id>.json per request"""
+
+    def __init__(self, directory=PROFILES_DIR, size: int = PROFILE_BUFFER_SIZE):
+        self.directory = directory
+        self.size = size
+
+    def save(self, profile: cProfile.Profile, meta: dict) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%fZ}-{uuid.uuid4().hex[:8]}"
+        profile.dump_stats(str(self.directory / f"{profile_id}.prof"))
+        meta = {"id": profile_id, **meta, "top_functions": top_functions(profile)}
+        (self.directory / f"{profile_id}.json").write_text(json.dumps(meta, default=str))
+        # Ids sort by time: drop the oldest beyond the buffer size
+        for old in sorted(self.directory.glob("*.json"))[:-self.size]:
+            old.unlink(missing_ok=True)
+            old.with_suffix(".prof").unlink(missing_ok=True)
+        return profile_id
+
+    def list(self) -> List[dict]:
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                meta = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            meta.pop("top_functions", None)
+            profiles.append(meta)
+        return profiles
+
+    def path(self, profile_id: str, suffix: str):
+        if not PROFILE_ID.match(profile_id):
+            raise HTTPException(status_code=404, detail="Profile not found")
+        path = self.directory / f"{profile_id}{suffix}"
+        if not path.exists():
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return path
+
+
+class Profiler:
+    """The superadmin switch and the choice of requests to profile"""
+
+    def __init__(self):
+        self.enabled = False
+        self.tenant_id: Optional[str] = None
+        self.rate = 0.0
+        self.until: Optional[datetime] = None
+        self.busy = False  # a request is being profiled
+
+    def enable(self, tenant_id: Optional[str], rate: float, minutes: float):
+        self.tenant_id = tenant_id
+        self.rate = rate
+        self.until = datetime.now(timezone.utc) + timedelta(minutes=minutes)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.tenant_id = None
+        self.rate = 0.0
+        self.until = None
+
+    def state(self) -> dict:
+        if self.enabled and self.until <= datetime.now(timezone.utc):
+            self.disable()
+        return {"enabled": self.enabled, "tenant_id": self.tenant_id, "rate": self.rate, "until": self.until}
+
+    async def select(self, scope) -> Optional[dict]:
+        """Who is making this request, when it is to be profiled"""
+        if not self.state()["enabled"] or self.busy:
+            return None
+        headers = dict(scope["headers"])
+        forced = headers.get(b"x-profile") == b"1" or parse_qs(scope["query_string"].decode()).get("profile") == ["1"]
+        if not forced and random.random() >= self.rate:
+            return None
+
+        scheme, _, token = headers.get(b"authorization", b"").decode().partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            user = await get_user_from_token(token)
+        except HTTPException:
+            return None
+        tenant_id = get_tenant_id(user)
+        if self.tenant_id and tenant_id != self.tenant_id and user.role != UserRole.SUPERADMIN:
+            return None
+        return {"tenant_id": tenant_id, "user_id": user.id, "forced": forced}
+
+
+profile_store = ProfileStore()
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware running the selected requests under cProfile"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not profiler.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        caller = await profiler.select(scope)
+        if caller is None or profiler.busy:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profiler.busy = True
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profile.disable()
+            profiler.busy = False
+            db_stats = current_request.get()
+            meta = {
+                "at": datetime.now(timezone.utc).isoformat(),
+                "route": route_template(scope),
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                **caller,
+                "db": db_stats.to_dict() if db_stats is not None else None
+            }
+            try:
+                await asyncio.to_thread(profile_store.save, profile, meta)
+            except OSError as e:
+                logging.error(f"Profile not saved: {e}")
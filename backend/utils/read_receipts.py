@@ -0,0 +1,136 @@
+"""
+Write-behind buffer for conversation read pointers
+
+Each participant has a single read pointer per conversation: the timestamp of
+the newest message they have seen, stored as `read_at.<user_id>` on the
+conversation. Opening a chat only records the pointer in memory; pointers are
+flushed to MongoDB in one bulk write every READ_RECEIPT_FLUSH_MS.
+
+Messages sent between mark_read and the flush have already bumped the
+reader's unread counter, so the flush only zeroes the counter when the
+conversation has nothing newer than the pointer, and recounts otherwise.
+"""
+from pymongo import UpdateOne
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+
+from config import db, READ_RECEIPT_FLUSH_MS
+from utils.dates import parse_datetime
+
+ReadKey = Tuple[str, str]  # (conversation_id, user_id)
+
+
+class ReadReceiptBuffer:
+
+    def __init__(
+        self,
+        flush_interval_ms: int = READ_RECEIPT_FLUSH_MS,
+        after_flush: Optional[Callable[[Dict[ReadKey, int]], Awaitable[None]]] = None
+    ):
+        self.flush_interval = flush_interval_ms / 1000
+        self.after_flush = after_flush
+        self._pending: Dict[ReadKey, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_read(self, conversation_id: str, user_id: str, read_at):
+        # Messages not yet reached by the date migration carry string dates
+        read_at = parse_datetime(read_at)
+        key = (conversation_id, user_id)
+        current = self._pending.get(key)
+        if current is None or read_at > current:
+            self._pending[key] = read_at
+
+    def pending_read_at(self, conversation_id: str, user_id: str):
+        """Pointer not yet flushed, so reads on this worker see their own writes"""
+        return self._pending.get((conversation_id, user_id))
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+
+        try:
+            writes = []
+            for (conversation_id, user_id), read_at in pending.items():
+                writes.append(UpdateOne({"id": conversation_id}, {"$max": {f"read_at.{user_id}": read_at}}))
+                writes.append(UpdateOne(
+                    {
+                        "id": conversation_id,
+                        "$or": [{"last_message_at": {"$lte": read_at}}, {"last_message_at": None}]
+                    },
+                    {"$set": {f"unread_count.{user_id}": 0}}
+                ))
+            await db.conversations.bulk_write(writes, ordered=False)
+        except Exception:
+            # Keep the pointers for the next attempt
+            for (conversation_id, user_id), read_at in pending.items():
+                self.mark_read(conversation_id, user_id, read_at)
+            raise
+
+        conversations = await db.conversations.find(
+            {"id": {"$in": list({conversation_id for conversation_id, _ in pending})}},
+            {"_id": 0, "id": 1, "last_message_at": 1, "unread_count": 1}
+        ).to_list(None)
+        by_id = {c['id']: c for c in conversations}
+
+        unread: Dict[ReadKey, int] = {}
+        for (conversation_id, user_id), read_at in pending.items():
+            conversation = by_id.get(conversation_id)
+            if conversation is None:
+                continue
+            last_message_at = parse_datetime(conversation.get('last_message_at'))
+            if last_message_at is not None and last_message_at > read_at:
+                unread[(conversation_id, user_id)] = await self.recount(conversation, user_id, read_at)
+            else:
+                unread[(conversation_id, user_id)] = conversation.get('unread_count', {}).get(user_id, 0)
+
+        if self.after_flush is not None:
+            await self.after_flush(unread)
+
+    async def recount(self, conversation: dict, user_id: str, read_at) -> int:
+        """Set the counter to the messages newer than the pointer.
+
+        The conversation is stamped before its message is inserted, and new
+        messages may arrive meanwhile: the count is only written while the
+        newest message is in and last_message_at is unchanged. Otherwise the
+        counter keeps its bumped value, too high until the next read rather
+        than hiding an unread message.
+        """
+        conversation_id = conversation['id']
+        current = conversation.get('unread_count', {}).get(user_id, 0)
+        newest = await db.messages.find_one(
+            {"conversation_id": conversation_id},
+            {"_id": 0, "created_at": 1},
+            sort=[("created_at", -1)]
+        )
+        if newest is None or parse_datetime(newest['created_at']) < parse_datetime(conversation['last_message_at']):
+            return current
+
+        count = await db.messages.count_documents({
+            "conversation_id": conversation_id,
+            "sender_id": {"$ne": user_id},
+            "created_at": {"$gt": read_at}
+        })
+        result = await db.conversations.update_one(
+            {"id": conversation_id, "last_message_at": conversation['last_message_at']},
+            {"$set": {f"unread_count.{user_id}": count}}
+        )
+        return count if result.matched_count else current
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Read receipt flush failed: {e}")
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
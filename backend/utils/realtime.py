@@ -0,0 +1,213 @@
+"""
+Realtime pub/sub fan-out for LocaTrack API
+
+Events are published to named channels (per user, tenant, conversation or
+GPS feed) and delivered to every subscriber, whichever worker holds its socket.
+The in-process backend only reaches subscribers of the current worker; the
+MongoDB backend tails a capped collection so every worker sees every event.
+"""
+from fastapi import WebSocket
+from fastapi.encoders import jsonable_encoder
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+from typing import Dict, Iterable, Optional, Set
+import asyncio
+import json
+import logging
+import uuid
+
+from config import db, REALTIME_BACKEND, REALTIME_QUEUE_SIZE
+
+
+def user_channel(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def tenant_channel(tenant_id: str) -> str:
+    return f"tenant:{tenant_id}"
+
+
+def gps_channel(tenant_id: str) -> str:
+    return f"gps:{tenant_id}"
+
+
+def conversation_channel(conversation_id: str) -> str:
+    return f"conversation:{conversation_id}"
+
+
+class SlowConsumer(Exception):
+    """Raised to a subscriber whose queue overflowed and was dropped"""
+
+
+_DROPPED = object()
+
+
+class Subscription:
+    """Bounded queue of events for one consumer (usually one socket)"""
+
+    def __init__(self, backend: "BroadcastBackend", max_queue_size: int):
+        self._backend = backend
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size + 1)
+        self._max_queue_size = max_queue_size
+        self.channels: Set[str] = set()
+        self.dropped = False
+
+    def add_channel(self, channel: str):
+        self._backend._attach(self, channel)
+
+    def _deliver(self, event: dict):
+        if self.dropped:
+            return
+        if self._queue.qsize() >= self._max_queue_size:
+            # Publishers never wait on a slow consumer: drop it instead
+            self.dropped = True
+            self._queue.put_nowait(_DROPPED)
+            self._backend.unsubscribe(self)
+            return
+        self._queue.put_nowait(event)
+
+    async def get(self) -> dict:
+        event = await self._queue.get()
+        if event is _DROPPED:
+            raise SlowConsumer()
+        return event
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        return await self.get()
+
+
+class BroadcastBackend:
+    """Channel registry and local fan-out shared by every backend"""
+
+    shared = False  # events reach the subscribers of every worker
+
+    def __init__(self, max_queue_size: int = REALTIME_QUEUE_SIZE):
+        self.max_queue_size = max_queue_size
+        self._channels: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        subscription = Subscription(self, self.max_queue_size)
+        for channel in channels:
+            self._attach(subscription, channel)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for channel in subscription.channels:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+        subscription.channels.clear()
+
+    def has_subscribers(self, channel: str) -> bool:
+        return bool(self._channels.get(channel))
+
+    def _attach(self, subscription: Subscription, channel: str):
+        if subscription.dropped:
+            return
+        subscription.channels.add(channel)
+        self._channels.setdefault(channel, set()).add(subscription)
+
+    def _dispatch(self, channel: str, event: dict):
+        for subscription in list(self._channels.get(channel, ())):
+            subscription._deliver(event)
+
+    async def publish(self, channel: str, event: dict):
+        raise NotImplementedError
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class MemoryBroadcast(BroadcastBackend):
+    """Single-process backend: events only reach sockets of this worker"""
+
+    async def publish(self, channel: str, event: dict):
+        self._dispatch(channel, jsonable_encoder(event))
+
+
+class MongoBroadcast(BroadcastBackend):
+    """Cross-worker backend tailing a capped MongoDB collection"""
+
+    shared = True
+    COLLECTION = "realtime_events"
+    COLLECTION_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, max_queue_size: int = REALTIME_QUEUE_SIZE):
+        super().__init__(max_queue_size)
+        self._tail_task: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, event: dict):
+        await db[self.COLLECTION].insert_one({
+            "id": str(uuid.uuid4()),
+            "channel": channel,
+            "event": jsonable_encoder(event)
+        })
+
+    async def start(self):
+        try:
+            await db.create_collection(self.COLLECTION, capped=True, size=self.COLLECTION_SIZE)
+        except CollectionInvalid:
+            pass
+        self._tail_task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._tail_task:
+            self._tail_task.cancel()
+            self._tail_task = None
+
+    async def _tail(self):
+        collection = db[self.COLLECTION]
+        last = await collection.find_one({}, {"_id": 1}, sort=[("$natural", -1)])
+        last_id = last['_id'] if last else None
+
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id else {}
+            cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                while cursor.alive:
+                    async for doc in cursor:
+                        last_id = doc['_id']
+                        if self.has_subscribers(doc['channel']):
+                            self._dispatch(doc['channel'], doc['event'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Realtime event tail interrupted: {e}")
+            # An empty capped collection kills tailable cursors immediately
+            await asyncio.sleep(1)
+
+
+async def forward_events(websocket: WebSocket, subscription: Subscription, on_event=None):
+    """Send subscription events to a socket until it is dropped or closed"""
+    try:
+        async for event in subscription:
+            if on_event is not None:
+                on_event(event)
+            await websocket.send_json(event)
+    except SlowConsumer:
+        await websocket.close(code=1013, reason="Too slow to keep up")
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), separators=(',', ':'))}\n\n"
+
+
+SSE_HEARTBEAT = ": heartbeat\n\n"
+
+
+def create_broadcast() -> BroadcastBackend:
+    if REALTIME_BACKEND == "mongo":
+        return MongoBroadcast()
+    return MemoryBroadcast()
+
+
+broadcast = create_broadcast()
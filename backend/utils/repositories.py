@@ -0,0 +1,120 @@
+"""
+Tenant-scoped repositories for LocaTrack API
+
+One repository per aggregate owns its collection's query shape: every
+read and write is scoped to the tenant, documents come back with the
+standard projection, date fields are coerced on write and updates return
+the updated document in a single find_one_and_update. Caches and counters
+subscribe to a repository to hear about every write it makes.
+"""
+from pymongo import ReturnDocument
+from typing import Callable, List, Optional, Sequence
+import logging
+
+from config import db
+from models import UserRole
+from utils.dates import parse_datetime
+
+# Called with (operation, tenant_id, document) after each write
+ChangeHook = Callable[[str, str, dict], None]
+
+# Never rewritten by an update: they place the document in its tenant
+IDENTITY_FIELDS = ("_id", "id", "tenant_id")
+
+
+class TenantRepository:
+    """`conditions` narrow a collection shared with other aggregates (employees in users)"""
+
+    def __init__(
+        self,
+        collection: str,
+        date_fields: Sequence[str] = (),
+        projection: Optional[dict] = None,
+        conditions: Optional[dict] = None
+    ):
+        self.name = collection
+        self.date_fields = date_fields
+        self.projection = projection or {"_id": 0}
+        self.conditions = conditions or {}
+        self._hooks: List[ChangeHook] = []
+
+    @property
+    def collection(self):
+        return db[self.name]
+
+    def scope(self, tenant_id: str, query: Optional[dict] = None) -> dict:
+        return {**(query or {}), **self.conditions, "tenant_id": tenant_id}
+
+    def subscribe(self, hook: ChangeHook):
+        self._hooks.append(hook)
+
+    def _notify(self, operation: str, tenant_id: str, doc: dict):
+        for hook in self._hooks:
+            try:
+                hook(operation, tenant_id, doc)
+            except Exception as e:
+                # The write already happened: a broken subscriber must not fail it
+                logging.error(f"{self.name} change hook failed: {e}")
+
+    def _coerce(self, changes: dict) -> dict:
+        for field in self.date_fields:
+            if field in changes:
+                changes[field] = parse_datetime(changes[field])
+        return changes
+
+    async def get(self, tenant_id: str, doc_id: str, query: Optional[dict] = None) -> Optional[dict]:
+        return await self.collection.find_one(self.scope(tenant_id, {**(query or {}), "id": doc_id}), self.projection)
+
+    async def find(self, tenant_id: str, query: Optional[dict] = None, limit: Optional[int] = None) -> List[dict]:
+        return await self.collection.find(self.scope(tenant_id, query), self.projection).to_list(limit)
+
+    async def list(self, tenant_id: str, list_query):
+        """Run a ListQuery (utils.list_query) within the tenant"""
+        return await list_query.fetch(self.collection, self.scope(tenant_id))
+
+    async def insert(self, tenant_id: str, doc: dict) -> dict:
+        doc = self._coerce({**doc, **self.conditions, "tenant_id": tenant_id})
+        await self.collection.insert_one(doc)
+        doc.pop("_id", None)
+        self._notify("insert", tenant_id, doc)
+        return doc
+
+    async def update(self, tenant_id: str, doc_id: str, changes: dict, query: Optional[dict] = None) -> Optional[dict]:
+        """Apply `changes` and return the updated document, None when nothing matched
+
+        `query` adds conditions the document must meet to be updated.
+        """
+        changes = {k: v for k, v in changes.items() if k not in IDENTITY_FIELDS and k not in self.conditions}
+        doc = await self.collection.find_one_and_update(
+            self.scope(tenant_id, {**(query or {}), "id": doc_id}),
+            {"$set": self._coerce(changes)},
+            projection=self.projection,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is not None:
+            self._notify("update", tenant_id, doc)
+        return doc
+
+    async def delete(self, tenant_id: str, doc_id: str) -> Optional[dict]:
+        """Delete a document and return it, None when it does not exist"""
+        doc = await self.collection.find_one_and_delete(
+            self.scope(tenant_id, {"id": doc_id}),
+            projection=self.projection
+        )
+        if doc is not None:
+            self._notify("delete", tenant_id, doc)
+        return doc
+
+
+vehicles = TenantRepository("vehicles", date_fields=("insurance_expiry", "technical_inspection_expiry"))
+clients = TenantRepository("clients", date_fields=("license_issue_date",))
+contracts = TenantRepository("contracts", date_fields=("start_date", "end_date"))
+payments = TenantRepository("payments", date_fields=("payment_date",))
+maintenance = TenantRepository("maintenance", date_fields=("scheduled_date", "completed_date"))
+reservations = TenantRepository("reservations", date_fields=("start_date", "end_date"))
+infractions = TenantRepository("infractions", date_fields=("date",))
+employees = TenantRepository(
+    "users",
+    projection={"_id": 0, "password": 0},
+    conditions={"role": UserRole.EMPLOYEE}
+)
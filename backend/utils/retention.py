@@ -0,0 +1,183 @@
+"""
+Message retention for LocaTrack API
+
+Messages older than a tenant's retention horizon are moved out of the hot
+`messages` collection into `messages_archive`, packed per conversation into
+gzip-compressed JSON chunks. The history endpoint pages back into the
+archive transparently once the hot collection runs out. One worker at a
+time archives, the holder of the archival lease.
+"""
+from pymongo import DeleteMany, ReplaceOne
+from bson import Binary
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import gzip
+import json
+import logging
+
+from config import db, MESSAGE_RETENTION_DAYS, ARCHIVE_CHUNK_SIZE, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL_HOURS
+from models import UserRole
+from utils.dates import parse_datetime
+from utils.indexes import declare_index
+from utils.leases import acquire_lease, release_lease
+
+declare_index("messages_archive", [("conversation_id", 1), ("last_created_at", -1)])
+declare_index("messages_archive", "id", unique=True)
+declare_index("messages_archive", "message_ids")
+
+ARCHIVAL_LEASE = "message_archival"
+
+
+def pack_messages(messages: List[dict]) -> Binary:
+    return Binary(gzip.compress(json.dumps(messages, separators=(",", ":"), default=str).encode()))
+
+
+def unpack_chunk(chunk: dict) -> List[dict]:
+    # Archived messages are JSON, so their dates come back as strings
+    messages = json.loads(gzip.decompress(chunk['data']))
+    for m in messages:
+        m['created_at'] = parse_datetime(m['created_at'])
+    return messages
+
+
+async def get_retention_horizons() -> Dict[str, int]:
+    """Per-tenant overrides of the default retention horizon, in days"""
+    tenants = await db.users.find(
+        {"role": UserRole.LOCATEUR, "message_retention_days": {"$ne": None}},
+        {"_id": 0, "id": 1, "message_retention_days": 1}
+    ).to_list(None)
+    return {t['id']: t['message_retention_days'] for t in tenants if t.get('message_retention_days')}
+
+
+async def archive_messages() -> int:
+    """Move every message past its tenant's horizon into the archive.
+
+    Chunk ids are derived from their first message, so a run interrupted
+    between writing chunks and deleting messages is safely redone.
+    """
+    now = datetime.now(timezone.utc)
+    horizons = await get_retention_horizons()
+    oldest_cutoff = now - timedelta(days=min([MESSAGE_RETENTION_DAYS, *horizons.values()]))
+
+    # Conversations created after the earliest cutoff cannot hold expired messages
+    conversations = await db.conversations.find(
+        {"created_at": {"$lt": oldest_cutoff}},
+        {"_id": 0, "id": 1, "tenant_id": 1}
+    ).to_list(None)
+
+    archived = 0
+    chunk_writes: List[ReplaceOne] = []
+    deletes: List[DeleteMany] = []
+
+    async def flush():
+        nonlocal chunk_writes, deletes
+        if chunk_writes:
+            await db.messages_archive.bulk_write(chunk_writes, ordered=False)
+            await db.messages.bulk_write(deletes, ordered=False)
+        chunk_writes, deletes = [], []
+
+    for conversation in conversations:
+        days = horizons.get(conversation.get('tenant_id'), MESSAGE_RETENTION_DAYS)
+        cutoff = now - timedelta(days=days)
+
+        last = None
+        while True:
+            query = {"conversation_id": conversation['id'], "created_at": {"$lt": cutoff}}
+            if last:
+                query["$or"] = [
+                    {"created_at": {"$gt": last[0]}},
+                    {"created_at": last[0], "id": {"$gt": last[1]}}
+                ]
+            messages = await db.messages.find(query, {"_id": 0}).sort(
+                [("created_at", 1), ("id", 1)]
+            ).limit(ARCHIVE_CHUNK_SIZE).to_list(ARCHIVE_CHUNK_SIZE)
+            if not messages:
+                break
+
+            ids = [m['id'] for m in messages]
+            chunk_id = f"{conversation['id']}:{ids[0]}"
+            chunk_writes.append(ReplaceOne({"id": chunk_id}, {
+                "id": chunk_id,
+                "conversation_id": conversation['id'],
+                "first_created_at": messages[0]['created_at'],
+                "last_created_at": messages[-1]['created_at'],
+                "message_ids": ids,
+                "count": len(messages),
+                "codec": "gzip",
+                "data": pack_messages(messages)
+            }, upsert=True))
+            deletes.append(DeleteMany({"conversation_id": conversation['id'], "id": {"$in": ids}}))
+            archived += len(messages)
+            last = (messages[-1]['created_at'], messages[-1]['id'])
+
+            if len(chunk_writes) >= ARCHIVE_BATCH_SIZE:
+                await flush()
+            if len(messages) < ARCHIVE_CHUNK_SIZE:
+                break
+
+    await flush()
+    return archived
+
+
+async def load_archived_page(
+    conversation_id: str,
+    limit: int,
+    before: Optional[Tuple[datetime, str]] = None
+) -> List[dict]:
+    """Newest-first archived messages older than the (created_at, id) cursor"""
+    query = {"conversation_id": conversation_id}
+    if before:
+        query["first_created_at"] = {"$lte": before[0]}
+
+    messages: List[dict] = []
+    async for chunk in db.messages_archive.find(query, {"_id": 0}).sort("last_created_at", -1):
+        for m in reversed(unpack_chunk(chunk)):
+            if before and (m['created_at'], m['id']) >= before:
+                continue
+            messages.append(m)
+            if len(messages) >= limit:
+                return messages
+    return messages
+
+
+async def find_archived_message(conversation_id: str, message_id: str) -> Optional[dict]:
+    chunk = await db.messages_archive.find_one(
+        {"conversation_id": conversation_id, "message_ids": message_id},
+        {"_id": 0}
+    )
+    if not chunk:
+        return None
+    return next((m for m in unpack_chunk(chunk) if m['id'] == message_id), None)
+
+
+async def archive_if_leader(interval_seconds: float) -> Optional[int]:
+    """Archive when this worker holds the archival lease, else None.
+
+    The lease outlives one interval, so the holder keeps it from run to run
+    and another worker only takes over once the holder stopped renewing it.
+    """
+    if not await acquire_lease(ARCHIVAL_LEASE, interval_seconds * 2):
+        return None
+    return await archive_messages()
+
+
+async def run_archival_loop():
+    interval = ARCHIVE_INTERVAL_HOURS * 3600
+    try:
+        while True:
+            try:
+                archived = await archive_if_leader(interval)
+                if archived:
+                    logging.info(f"Archived {archived} messages past their retention horizon")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Message archival failed: {e}")
+            await asyncio.sleep(interval)
+    finally:
+        # Let another worker take over without waiting for the lease to expire
+        try:
+            await release_lease(ARCHIVAL_LEASE)
+        except Exception as e:
+            logging.warning(f"Archival lease not released: {e}")
@@ -0,0 +1,68 @@
+"""
+Fast response serialization for LocaTrack API
+
+Rows read from MongoDB were written from the models and decode to the right
+Python types (see DATE_CODEC_OPTIONS), so list endpoints build them with
+model_construct, skipping validation, and serialize the whole response in
+one pydantic-core call through a cached TypeAdapter. Going through the
+response_model instead validates every row again before encoding it.
+Until the date migration has run, a row may still hold an ISO string in a
+date field: those are parsed before the row is built.
+"""
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, List, Tuple, Type, Union, get_args
+
+from models import Page
+from utils.dates import parse_datetime
+
+
+@lru_cache(maxsize=None)
+def type_adapter(tp: Any) -> TypeAdapter:
+    """Building an adapter compiles a schema: do it once per type"""
+    return TypeAdapter(tp)
+
+
+@lru_cache(maxsize=None)
+def datetime_fields(model: Type[BaseModel]) -> Tuple[str, ...]:
+    """Fields of a model annotated datetime or Optional[datetime]"""
+    return tuple(
+        name for name, info in model.model_fields.items()
+        if datetime in (info.annotation, *get_args(info.annotation))
+    )
+
+
+def coerce_dates(doc: dict, fields: Tuple[str, ...]) -> dict:
+    legacy = [f for f in fields if isinstance(doc.get(f), str)]
+    if not legacy:
+        return doc
+    doc = dict(doc)
+    for field in legacy:
+        try:
+            doc[field] = parse_datetime(doc[field])
+        except ValueError:
+            # Left as is by the migration too, which logs it
+            pass
+    return doc
+
+
+def construct_rows(model: Type[BaseModel], docs: List[dict]) -> List[BaseModel]:
+    """Models from trusted database rows, without validation"""
+    construct = model.model_construct
+    fields = datetime_fields(model)
+    return [construct(**coerce_dates(doc, fields)) for doc in docs]
+
+
+def dump_rows(model: Type[BaseModel], result: Union[List[dict], dict]) -> bytes:
+    """JSON of a plain list of rows or of a {"items", "next_cursor"} page"""
+    if isinstance(result, dict):
+        page_model = Page[model]
+        page = page_model.model_construct(items=construct_rows(model, result['items']), next_cursor=result['next_cursor'])
+        return type_adapter(page_model).dump_json(page)
+    return type_adapter(List[model]).dump_json(construct_rows(model, result))
+
+
+def rows_response(model: Type[BaseModel], result: Union[List[dict], dict]) -> Response:
+    return Response(content=dump_rows(model, result), media_type="application/json")
@@ -0,0 +1,104 @@
+"""
+Refresh-token sessions for LocaTrack API
+
+A login opens a session holding the HMAC of an opaque refresh token. The
+client trades the refresh token for a new short-lived access token at
+/auth/refresh; each refresh rotates the token, so a stolen one works only
+until the legitimate client refreshes. Refreshing is one indexed
+find_one_and_update, and revoking a session is a single delete.
+"""
+from pymongo import ReturnDocument
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Tuple
+import hashlib
+import hmac
+import secrets
+import uuid
+
+from config import db, SECRET_KEY, REFRESH_TOKEN_EXPIRE_DAYS
+from models import UserRole
+from utils.dates import parse_datetime
+from utils.indexes import declare_index
+
+declare_index("sessions", "token_hash", unique=True)
+declare_index("sessions", "user_id")
+declare_index("sessions", "tenant_id")
+declare_index("sessions", "expires_at", expireAfterSeconds=0)
+
+
+def hash_refresh_token(refresh_token: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), refresh_token.encode(), hashlib.sha256).hexdigest()
+
+
+def new_refresh_token() -> Tuple[str, str]:
+    refresh_token = secrets.token_urlsafe(32)
+    return refresh_token, hash_refresh_token(refresh_token)
+
+
+def session_expiry(now: datetime, user_doc: dict) -> datetime:
+    """Sessions of a locateur never outlive the subscription"""
+    expires_at = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    subscription_end = parse_datetime(user_doc.get('subscription_end'))
+    if user_doc.get('role') == UserRole.LOCATEUR and subscription_end:
+        expires_at = min(expires_at, subscription_end)
+    return expires_at
+
+
+async def create_session(user_doc: dict, client_ip: Optional[str] = None, user_agent: Optional[str] = None) -> str:
+    """Open a session for a user; returns the refresh token"""
+    now = datetime.now(timezone.utc)
+    refresh_token, token_hash = new_refresh_token()
+    await db.sessions.insert_one({
+        "id": str(uuid.uuid4()),
+        "user_id": user_doc['id'],
+        "tenant_id": user_doc.get('tenant_id'),
+        "email": user_doc['email'],
+        "token_hash": token_hash,
+        "created_at": now,
+        "last_used_at": now,
+        "expires_at": session_expiry(now, user_doc),
+        "ip": client_ip,
+        "user_agent": user_agent
+    })
+    return refresh_token
+
+
+async def find_session(refresh_token: str) -> Optional[dict]:
+    """The live session behind a refresh token"""
+    return await db.sessions.find_one(
+        {"token_hash": hash_refresh_token(refresh_token), "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        {"_id": 0, "id": 1, "user_id": 1, "email": 1}
+    )
+
+
+async def rotate_session(refresh_token: str) -> Optional[Tuple[dict, str]]:
+    """Swap a valid refresh token for a new one; returns (session, new token)"""
+    now = datetime.now(timezone.utc)
+    new_token, new_hash = new_refresh_token()
+    session = await db.sessions.find_one_and_update(
+        {"token_hash": hash_refresh_token(refresh_token), "expires_at": {"$gt": now}},
+        {"$set": {"token_hash": new_hash, "last_used_at": now}},
+        projection={"_id": 0, "id": 1, "user_id": 1, "email": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if session is None:
+        return None
+    return session, new_token
+
+
+async def revoke_session(refresh_token: str) -> bool:
+    result = await db.sessions.delete_one({"token_hash": hash_refresh_token(refresh_token)})
+    return result.deleted_count > 0
+
+
+async def revoke_user_sessions(user_id: Optional[str] = None, tenant_id: Optional[str] = None):
+    """Log a user, or every employee of a tenant, out of all devices"""
+    if user_id:
+        await db.sessions.delete_many({"user_id": user_id})
+    if tenant_id:
+        await db.sessions.delete_many({"tenant_id": tenant_id})
+
+
+async def rename_user_sessions(user_id: str, email: str):
+    """Access tokens carry the email, so sessions follow email changes"""
+    await db.sessions.update_many({"user_id": user_id}, {"$set": {"email": email}})
@@ -31,7 +31,7 @@ const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
 const Layout = ({ children }) => {
   const { t, toggleLanguage, language } = useLanguage();
-  const { user, logout, getAuthHeaders } = useAuth();
+  const { user, token, logout, getAuthHeaders } = useAuth();
   const location = useLocation();
   const navigate = useNavigate();
   const [unreadCount, setUnreadCount] = useState(0);
@@ -39,16 +39,38 @@ const Layout = ({ children }) => {
   const [showNotifications, setShowNotifications] = useState(false);
   
   useEffect(() => {
-    if (user?.role !== 'superadmin') {
-      fetchUnreadCount();
+    if (!user || !token || user.role === 'superadmin') return;
+    
+    // Badges are pushed over Server-Sent Events; polling only if the stream is refused
+    let interval = null;
+    const source = new EventSource(`${API}/notifications/stream?token=${encodeURIComponent(token)}`);
+    
+    source.addEventListener('badges', (e) => {
+      const data = JSON.parse(e.data);
+      setUnreadCount(data.unread_count || 0);
       fetchNotifications();
-      const interval = setInterval(() => {
+    });
+    source.addEventListener('alerts', () => fetchNotifications());
+    source.addEventListener('unread_count', (e) => {
+      setUnreadCount(JSON.parse(e.data).unread_count || 0);
+    });
+    source.onerror = () => {
+      // EventSource reconnects by itself unless the server rejected the stream
+      if (source.readyState === EventSource.CLOSED && !interval) {
         fetchUnreadCount();
         fetchNotifications();
-      }, 30000); // Check every 30 seconds
-      return () => clearInterval(interval);
-    }
-  }, [user]);
+        interval = setInterval(() => {
+          fetchUnreadCount();
+          fetchNotifications();
+        }, 30000);
+      }
+    };
+    
+    return () => {
+      source.close();
+      if (interval) clearInterval(interval);
+    };
+  }, [token, user?.id]);
   
   const fetchNotifications = async () => {
     try {
@@ -5,11 +5,57 @@ const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
 const AuthContext = createContext();
 
+// Requests failing with 401 at the same time share a single refresh call
+let refreshPromise = null;
+
+const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshPromise = (refreshToken
+      ? axios.post(`${API}/auth/refresh`, { refresh_token: refreshToken }).then(({ data }) => {
+          localStorage.setItem('token', data.access_token);
+          localStorage.setItem('refresh_token', data.refresh_token);
+          return data.access_token;
+        })
+      : Promise.reject(new Error('No refresh token'))
+    ).finally(() => {
+      refreshPromise = null;
+    });
+  }
+  return refreshPromise;
+};
+
+const isAuthRequest = (url = '') => ['/auth/login', '/auth/register', '/auth/refresh', '/auth/logout'].some((path) => url.includes(path));
+
 export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [token, setToken] = useState(localStorage.getItem('token'));
   const [loading, setLoading] = useState(true);
   
+  // Expired access tokens are renewed with the refresh token and the request replayed
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      async (error) => {
+        const original = error.config;
+        if (error.response?.status !== 401 || !original || original._retried || isAuthRequest(original.url)) {
+          return Promise.reject(error);
+        }
+        original._retried = true;
+        try {
+          const accessToken = await refreshAccessToken();
+          setToken(accessToken);
+          original.headers.Authorization = `Bearer ${accessToken}`;
+          return axios(original);
+        } catch (refreshError) {
+          clearSession();
+          return Promise.reject(error);
+        }
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+  
   useEffect(() => {
     if (token) {
       // Verify token and get user
@@ -36,10 +82,11 @@ export const AuthProvider = ({ children }) => {
   const login = async (email, password) => {
     try {
       const response = await axios.post(`${API}/auth/login`, { email, password });
-      const { access_token, user: userData } = response.data;
+      const { access_token, refresh_token, user: userData } = response.data;
       setToken(access_token);
       setUser(userData);
       localStorage.setItem('token', access_token);
+      localStorage.setItem('refresh_token', refresh_token);
       return { success: true };
     } catch (error) {
       return { success: false, error: error.response?.data?.detail || 'Login failed' };
@@ -49,20 +96,30 @@ export const AuthProvider = ({ children }) => {
   const register = async (userData) => {
     try {
       const response = await axios.post(`${API}/auth/register`, userData);
-      const { access_token, user: userInfo } = response.data;
+      const { access_token, refresh_token, user: userInfo } = response.data;
       setToken(access_token);
       setUser(userInfo);
       localStorage.setItem('token', access_token);
+      localStorage.setItem('refresh_token', refresh_token);
       return { success: true };
     } catch (error) {
       return { success: false, error: error.response?.data?.detail || 'Registration failed' };
     }
   };
   
-  const logout = () => {
+  const clearSession = () => {
     setToken(null);
     setUser(null);
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
+  };
+  
+  const logout = () => {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      axios.post(`${API}/auth/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
+    clearSession();
   };
   
   const getAuthHeaders = () => {
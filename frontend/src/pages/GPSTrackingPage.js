@@ -69,7 +69,7 @@ const MapController = ({ center, zoom }) => {
 };
 
 const GPSTrackingPage = () => {
-  const { getAuthHeaders } = useAuth();
+  const { getAuthHeaders, token } = useAuth();
   const { language } = useLanguage();
   const [gpsObjects, setGpsObjects] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -93,21 +93,41 @@ const GPSTrackingPage = () => {
   }, []);
   
   useEffect(() => {
-    if (autoRefresh) {
+    if (!autoRefresh) return;
+    let closed = false;
+    let socket = null;
+    
+    const startPolling = () => {
+      if (closed || refreshIntervalRef.current) return;
       refreshIntervalRef.current = setInterval(() => {
         fetchGPSData(true);
       }, 10000); // Refresh every 10 seconds
+    };
+    
+    // Positions are pushed by the server; poll only if the socket fails
+    if (token) {
+      socket = new WebSocket(`${API.replace(/^http/, 'ws')}/gps/ws?token=${encodeURIComponent(token)}`);
+      socket.onmessage = (e) => {
+        const event = JSON.parse(e.data);
+        if (event.type === 'gps_objects') {
+          setGpsObjects(event.objects);
+          setLastUpdate(new Date());
+        }
+      };
+      socket.onclose = startPolling;
     } else {
-      if (refreshIntervalRef.current) {
-        clearInterval(refreshIntervalRef.current);
-      }
+      startPolling();
     }
+    
     return () => {
+      closed = true;
+      if (socket) socket.close();
       if (refreshIntervalRef.current) {
         clearInterval(refreshIntervalRef.current);
+        refreshIntervalRef.current = null;
       }
     };
-  }, [autoRefresh]);
+  }, [autoRefresh, token]);
   
   const fetchGPSData = async (silent = false) => {
     try {
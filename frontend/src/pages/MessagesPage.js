@@ -13,8 +13,11 @@ import { formatApiError } from '../utils/errorHandler';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
+const WS_URL = API.replace(/^http/, 'ws');
+const PAGE_SIZE = 50;
+
 const MessagesPage = () => {
-  const { getAuthHeaders, user } = useAuth();
+  const { getAuthHeaders, user, token } = useAuth();
   const { language } = useLanguage();
   const [conversations, setConversations] = useState([]);
   const [selectedConversation, setSelectedConversation] = useState(null);
@@ -24,8 +27,12 @@ const MessagesPage = () => {
   const [showNewDialog, setShowNewDialog] = useState(false);
   const [availableUsers, setAvailableUsers] = useState([]);
   const [searchTerm, setSearchTerm] = useState('');
+  const [hasOlder, setHasOlder] = useState(false);
   const messagesEndRef = useRef(null);
   const pollIntervalRef = useRef(null);
+  const socketRef = useRef(null);
+  const selectedConversationRef = useRef(null);
+  const messagesRef = useRef([]);
   
   useEffect(() => {
     fetchConversations();
@@ -35,11 +42,14 @@ const MessagesPage = () => {
   }, []);
   
   useEffect(() => {
+    selectedConversationRef.current = selectedConversation;
     if (selectedConversation) {
       fetchMessages(selectedConversation.id);
-      // Poll for new messages every 3 seconds
+      // Fall back to polling only while the realtime socket is down
       pollIntervalRef.current = setInterval(() => {
-        fetchMessages(selectedConversation.id);
+        if (socketRef.current?.readyState !== WebSocket.OPEN) {
+          fetchNewMessages(selectedConversation.id);
+        }
       }, 3000);
     }
     return () => {
@@ -48,6 +58,66 @@ const MessagesPage = () => {
   }, [selectedConversation]);
   
   useEffect(() => {
+    if (!token || !user) return;
+    let closed = false;
+    let retryTimeout = null;
+    
+    const handleEvent = (event) => {
+      const current = selectedConversationRef.current;
+      switch (event.type) {
+        case 'message': {
+          const msg = event.message;
+          if (current?.id === event.conversation_id) {
+            setMessages(prev => prev.some(m => m.id === msg.id) ? prev : [...prev, msg]);
+            if (msg.sender_id !== user.id) {
+              socketRef.current?.send(JSON.stringify({ type: 'read', conversation_id: event.conversation_id }));
+            }
+          }
+          setConversations(prev => {
+            const conv = prev.find(c => c.id === event.conversation_id);
+            if (!conv) return prev;
+            const updated = { ...conv, last_message: msg.content.slice(0, 100), last_message_at: msg.created_at };
+            return [updated, ...prev.filter(c => c.id !== event.conversation_id)];
+          });
+          break;
+        }
+        case 'read':
+          if (event.user_id !== user.id && current?.id === event.conversation_id) {
+            setMessages(prev => prev.map(m => m.sender_id === user.id ? { ...m, read: true } : m));
+          }
+          break;
+        case 'unread_count':
+          setConversations(prev => prev.map(c => c.id === event.conversation_id
+            ? { ...c, unread_count: { ...c.unread_count, [user.id]: event.conversation_unread } }
+            : c));
+          break;
+        case 'conversation':
+          setConversations(prev => prev.some(c => c.id === event.conversation.id) ? prev : [event.conversation, ...prev]);
+          break;
+        default:
+          break;
+      }
+    };
+    
+    const connect = () => {
+      const socket = new WebSocket(`${WS_URL}/messages/ws?token=${encodeURIComponent(token)}`);
+      socketRef.current = socket;
+      socket.onmessage = (e) => handleEvent(JSON.parse(e.data));
+      socket.onclose = () => {
+        if (!closed) retryTimeout = setTimeout(connect, 5000);
+      };
+    };
+    
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimeout);
+      socketRef.current?.close();
+    };
+  }, [token, user?.id]);
+  
+  useEffect(() => {
+    messagesRef.current = messages;
     scrollToBottom();
   }, [messages]);
   
@@ -68,8 +138,42 @@ const MessagesPage = () => {
   
   const fetchMessages = async (conversationId) => {
     try {
-      const response = await axios.get(`${API}/messages/conversations/${conversationId}`, { headers: getAuthHeaders() });
+      const response = await axios.get(`${API}/messages/conversations/${conversationId}`, {
+        headers: getAuthHeaders(),
+        params: { limit: PAGE_SIZE }
+      });
       setMessages(response.data);
+      setHasOlder(response.data.length === PAGE_SIZE);
+    } catch (error) {
+      console.error('Failed to fetch messages:', error);
+    }
+  };
+  
+  const fetchNewMessages = async (conversationId) => {
+    const last = messagesRef.current[messagesRef.current.length - 1];
+    if (!last) return fetchMessages(conversationId);
+    try {
+      const response = await axios.get(`${API}/messages/conversations/${conversationId}`, {
+        headers: getAuthHeaders(),
+        params: { after: last.id, limit: PAGE_SIZE }
+      });
+      if (response.data.length > 0) {
+        setMessages(prev => [...prev, ...response.data.filter(m => !prev.some(p => p.id === m.id))]);
+      }
+    } catch (error) {
+      console.error('Failed to fetch messages:', error);
+    }
+  };
+  
+  const fetchOlderMessages = async () => {
+    if (!selectedConversation || messages.length === 0) return;
+    try {
+      const response = await axios.get(`${API}/messages/conversations/${selectedConversation.id}`, {
+        headers: getAuthHeaders(),
+        params: { before: messages[0].id, limit: PAGE_SIZE }
+      });
+      setMessages(prev => [...response.data, ...prev]);
+      setHasOlder(response.data.length === PAGE_SIZE);
     } catch (error) {
       console.error('Failed to fetch messages:', error);
     }
@@ -100,12 +204,12 @@ const MessagesPage = () => {
     if (!newMessage.trim() || !selectedConversation) return;
     
     try {
-      await axios.post(`${API}/messages/send`, {
+      const response = await axios.post(`${API}/messages/send`, {
         conversation_id: selectedConversation.id,
         content: newMessage
       }, { headers: getAuthHeaders() });
       setNewMessage('');
-      fetchMessages(selectedConversation.id);
+      setMessages(prev => prev.some(m => m.id === response.data.id) ? prev : [...prev, response.data]);
       fetchConversations();
     } catch (error) {
       toast.error(formatApiError(error));
@@ -217,6 +321,13 @@ const MessagesPage = () => {
               </CardHeader>
               <CardContent className="flex-1 overflow-y-auto p-4 bg-gradient-to-b from-slate-50 to-white">
                 <div className="space-y-4">
+                  {hasOlder && (
+                    <div className="text-center">
+                      <Button onClick={fetchOlderMessages} variant="ghost" size="sm" className="text-cyan-600">
+                        {language === 'fr' ? 'Messages précédents' : 'الرسائل السابقة'}
+                      </Button>
+                    </div>
+                  )}
                   {messages.map((msg) => {
                     const isMine = msg.sender_id === user?.id;
                     return (
@@ -37,10 +37,10 @@ const PaymentsPage = () => {
     try {
       const [paymentsRes, contractsRes] = await Promise.all([
         axios.get(`${API}/payments`, { headers: getAuthHeaders() }),
-        axios.get(`${API}/contracts`, { headers: getAuthHeaders() })
+        axios.get(`${API}/contracts`, { headers: getAuthHeaders(), params: { status: 'active', fields: 'id,total_amount' } })
       ]);
       setPayments(paymentsRes.data);
-      setContracts(contractsRes.data.filter(c => c.status === 'active'));
+      setContracts(contractsRes.data);
     } catch (error) {
       toast.error(formatApiError(error));
     } finally {
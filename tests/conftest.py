@@ -0,0 +1,29 @@
+"""
+Shared fixtures for the backend unit tests
+
+The unit tests import the backend modules directly and swap their `db` for an
+in-memory mongomock database, so they run without a MongoDB server. The
+integration tests (test_chat_payments.py) still target a deployed API.
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "locatrack_test")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """In-memory database; call it with the modules whose `db` it replaces"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["locatrack_test"]
+
+    def use_in(*modules):
+        for module in modules:
+            monkeypatch.setattr(module, "db", database)
+        return database
+
+    return use_in
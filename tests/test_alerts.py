@@ -0,0 +1,121 @@
+"""
+Unit tests for the alert rule engine and its scheduler
+"""
+from datetime import datetime, timezone, timedelta
+import asyncio
+
+import pytest
+
+from utils import alerts, leases
+
+NOW = datetime.now(timezone.utc)
+
+
+class Broadcast:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, channel, payload):
+        self.published.append((channel, payload))
+
+
+@pytest.fixture
+def db(mongo):
+    return mongo(alerts, leases)
+
+
+@pytest.fixture
+def published(monkeypatch):
+    broadcast = Broadcast()
+    monkeypatch.setattr(alerts, "broadcast", broadcast)
+    return broadcast.published
+
+
+async def seed_tenants(db):
+    await db.users.insert_many([{"id": t, "role": "locateur"} for t in ("t1", "t2")])
+    await db.vehicles.insert_many([
+        {"id": f"v-{t}", "tenant_id": t, "brand": "Dacia", "model": "Logan", "plate_number": f"{t}-1",
+         "insurance_expiry": NOW + timedelta(days=10)}
+        for t in ("t1", "t2")
+    ])
+
+
+def test_only_the_lease_holder_sweeps(db, published, monkeypatch):
+    first, second = alerts.AlertScheduler(), alerts.AlertScheduler()
+
+    async def scenario():
+        await seed_tenants(db)
+        monkeypatch.setattr(leases, "WORKER_ID", "worker-a")
+        swept = await first.sweep()
+        monkeypatch.setattr(leases, "WORKER_ID", "worker-b")
+        second.mark_dirty("t2")
+        await db.vehicles.update_one({"id": "v-t2"}, {"$set": {"insurance_expiry": NOW - timedelta(days=2)}})
+        contended = await second.sweep()
+        sweeps = len(published)
+        # The other worker still refreshes the tenants its own writes touched
+        await second.flush()
+        return swept, contended, sweeps, [channel for channel, _ in published[sweeps:]]
+
+    swept, contended, sweeps, flushed = asyncio.run(scenario())
+    assert (swept, contended, sweeps) == (True, False, 2)
+    assert flushed == [alerts.tenant_channel("t2")]
+
+
+def test_unpaid_balances_are_checked_within_the_window(db):
+    contracts = [
+        ("active", 200, 0.0),      # running late: still checked
+        ("completed", 20, 50.0),   # recently returned, partly paid
+        ("completed", 20, 300.0),  # settled
+        ("completed", 400, 0.0),   # returned before the window
+    ]
+
+    async def scenario():
+        await db.contracts.insert_many([
+            {"id": f"c{i}", "tenant_id": "t1", "vehicle_id": "v1", "status": status, "total_amount": 300.0,
+             "end_date": NOW - timedelta(days=days_ago)}
+            for i, (status, days_ago, _) in enumerate(contracts)
+        ])
+        await db.payments.insert_many([
+            {"id": f"p{i}", "tenant_id": "t1", "contract_id": f"c{i}", "status": "completed", "amount": paid}
+            for i, (_, _, paid) in enumerate(contracts) if paid
+        ])
+        rule = next(r for r in alerts.ALERT_RULES if r.name == "unpaid_balance")
+        return {a['contract_id']: a['message'] for a in await rule.evaluate("t1", NOW)}
+
+    assert asyncio.run(scenario()) == {"c0": " - Reste à payer 300.00", "c1": " - Reste à payer 250.00"}
+
+
+def test_alerts_are_materialized_updated_and_resolved(db):
+    async def scenario():
+        await seed_tenants(db)
+        await db.maintenance.insert_one({
+            "id": "m1", "tenant_id": "t1", "vehicle_id": "v-t1", "type": "Vidange", "status": "scheduled",
+            "scheduled_date": NOW - timedelta(days=1)
+        })
+        changed = await alerts.refresh_tenant_alerts("t1")
+        first = {a['dedup_key']: a async for a in db.alerts.find({"tenant_id": "t1"}, {"_id": 0})}
+        unchanged = await alerts.refresh_tenant_alerts("t1")
+
+        # Insurance renewed, maintenance done
+        await db.vehicles.update_one({"id": "v-t1"}, {"$set": {"insurance_expiry": NOW + timedelta(days=365)}})
+        await db.maintenance.update_one({"id": "m1"}, {"$set": {"status": "completed"}})
+        resolved = await alerts.refresh_tenant_alerts("t1")
+        return changed, first, unchanged, resolved, await db.alerts.count_documents({})
+
+    changed, first, unchanged, resolved, remaining = asyncio.run(scenario())
+    assert changed and not unchanged and resolved
+    assert set(first) == {"ins_v-t1", "maint_m1"}
+    assert first["ins_v-t1"]['severity'] == alerts.SEVERITY["warning"]
+    assert first["maint_m1"]['type'] == "danger" and first["maint_m1"]['days_left'] == -1
+    assert remaining == 0
+
+
+def test_summary_counts_the_tenant_alerts(db):
+    async def scenario():
+        await seed_tenants(db)
+        await db.vehicles.update_one({"id": "v-t1"}, {"$set": {"technical_inspection_expiry": NOW - timedelta(days=3)}})
+        await alerts.refresh_tenant_alerts("t1")
+        await alerts.refresh_tenant_alerts("t2")
+        return await alerts.get_alert_summary("t1")
+
+    assert asyncio.run(scenario()) == {"count": 2, "danger": 1}
@@ -0,0 +1,54 @@
+"""
+Unit tests for finding conversations by their canonical participant key
+"""
+import asyncio
+
+import pytest
+
+from models import ConversationCreate, User
+from routers import messages
+
+A = User(id="a", email="a@example.com", full_name="Agent A", role="employee", tenant_id="t1")
+B = User(id="b", email="b@example.com", full_name="Owner B", role="locateur")
+
+
+@pytest.fixture
+def db(mongo):
+    db = mongo(messages)
+    asyncio.run(db.users.insert_many([
+        {"id": u.id, "email": u.email, "full_name": u.full_name, "role": u.role, "tenant_id": u.tenant_id}
+        for u in (A, B)
+    ]))
+    return db
+
+
+def test_the_key_ignores_participant_order():
+    assert messages.get_participant_key(["b", "a"]) == messages.get_participant_key(["a", "b"]) == "a:b"
+
+
+def test_both_sides_open_the_same_conversation(db):
+    async def scenario():
+        await db.conversations.create_index("participant_key", unique=True)
+        first = await messages.create_conversation(ConversationCreate(participant_id="b"), A)
+        reopened, other_side = await asyncio.gather(
+            messages.create_conversation(ConversationCreate(participant_id="b"), A),
+            messages.create_conversation(ConversationCreate(participant_id="a"), B),
+        )
+        return first, reopened, other_side, await db.conversations.count_documents({})
+
+    first, reopened, other_side, stored = asyncio.run(scenario())
+    assert first.participant_key == "a:b" and first.tenant_id == "t1"
+    assert reopened['id'] == other_side['id'] == first.id
+    assert stored == 1
+
+
+def test_legacy_conversations_get_their_key(db):
+    async def scenario():
+        await db.conversations.insert_one({"id": "old", "participants": ["b", "a"]})
+        await messages.backfill_participant_keys()
+        reopened = await messages.create_conversation(ConversationCreate(participant_id="a"), B)
+        return reopened, await db.conversations.count_documents({})
+
+    reopened, stored = asyncio.run(scenario())
+    assert reopened['id'] == "old" and reopened['participant_key'] == "a:b"
+    assert stored == 1
@@ -0,0 +1,60 @@
+"""
+Unit tests for the legacy string date migration and its lease
+"""
+from datetime import datetime, timezone
+import asyncio
+
+import pytest
+
+from utils import date_migration, leases
+
+
+@pytest.fixture
+def db(mongo, monkeypatch):
+    monkeypatch.setattr(date_migration, "DATE_FIELDS", {"payments": ["created_at", "payment_date"]})
+    monkeypatch.setattr(leases, "WORKER_ID", "worker-a")
+    return mongo(date_migration, leases)
+
+
+async def seed(db, count=5):
+    await db.payments.insert_many([
+        {"_id": i, "id": f"p{i}", "created_at": "2025-03-01T10:00:00", "payment_date": "2025-03-02"}
+        for i in range(count)
+    ])
+
+
+def test_only_the_lease_holder_migrates(db, monkeypatch):
+    async def scenario():
+        await seed(db)
+        await leases.acquire_lease(date_migration.MIGRATION_LEASE, 60)
+
+        monkeypatch.setattr(leases, "WORKER_ID", "worker-b")
+        skipped = await date_migration.migrate_dates()
+        untouched = await db.payments.count_documents({"created_at": {"$type": "string"}})
+
+        monkeypatch.setattr(leases, "WORKER_ID", "worker-a")
+        converted = await date_migration.migrate_dates()
+        doc = await db.payments.find_one({"_id": 0})
+        lease = await db.leases.find_one({"_id": date_migration.MIGRATION_LEASE})
+        return skipped, untouched, converted, doc['created_at'], lease
+
+    skipped, untouched, converted, created_at, lease = asyncio.run(scenario())
+    assert (skipped, untouched, converted) == (None, 5, {"payments": 5})
+    assert created_at == datetime(2025, 3, 1, 10, tzinfo=timezone.utc)
+    assert lease is None
+
+
+def test_a_worker_that_lost_the_lease_stops_at_its_checkpoint(db, monkeypatch):
+    async def scenario():
+        await seed(db)
+        await leases.acquire_lease(date_migration.MIGRATION_LEASE, 60)
+        # worker-a stalled: worker-b took the expired lease over
+        await db.leases.update_one(
+            {"_id": date_migration.MIGRATION_LEASE}, {"$set": {"holder": "worker-b"}}
+        )
+        with pytest.raises(date_migration.MigrationLeaseLost):
+            await date_migration.migrate_collection("payments", ["created_at", "payment_date"], batch_size=2)
+        state = await db.migrations.find_one({"_id": date_migration.MIGRATION_ID})
+        return state['collections']['payments'], await db.payments.count_documents({"created_at": {"$type": "date"}})
+
+    assert asyncio.run(scenario()) == ({"last_id": 1}, 2)
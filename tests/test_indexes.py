@@ -0,0 +1,52 @@
+"""
+Unit tests for applying the declared index registry
+"""
+from pymongo.errors import OperationFailure
+import asyncio
+
+import pytest
+
+from utils import indexes
+
+
+class ConflictingCollection:
+    """Reports every index as existing with other options"""
+
+    def __init__(self, rebuild_error=None):
+        self.rebuild_error = rebuild_error
+        self.dropped = []
+        self.created = []
+
+    async def create_indexes(self, models):
+        if models[0].document['name'] not in self.dropped:
+            raise OperationFailure("Index already exists with different options", code=86)
+        if self.rebuild_error:
+            raise self.rebuild_error
+        self.created.extend(m.document['name'] for m in models)
+
+    async def drop_index(self, name):
+        self.dropped.append(name)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = ConflictingCollection()
+    monkeypatch.setattr(indexes, "db", {"vehicles": collection})
+    monkeypatch.setattr(indexes, "_registry", {})
+    indexes.declare_index("vehicles", "plate_number", unique=True)
+    return collection
+
+
+def test_startup_keeps_a_conflicting_index(collection):
+    assert asyncio.run(indexes.apply_indexes()) == ["vehicles.plate_number_1"]
+    assert collection.dropped == []
+
+
+def test_explicit_rebuild_recreates_it(collection):
+    assert asyncio.run(indexes.apply_indexes(rebuild=True)) == []
+    assert collection.dropped == collection.created == ["plate_number_1"]
+
+
+def test_failed_rebuild_is_reported(collection):
+    collection.rebuild_error = OperationFailure("E11000 duplicate key error", code=11000)
+    assert asyncio.run(indexes.apply_indexes(rebuild=True)) == ["vehicles.plate_number_1"]
@@ -0,0 +1,47 @@
+"""
+Unit tests for the worker leases electing one runner per background job
+"""
+from datetime import datetime, timezone, timedelta
+import asyncio
+
+from utils import leases
+
+
+def test_one_worker_holds_a_lease_until_it_expires(mongo, monkeypatch):
+    db = mongo(leases)
+
+    async def scenario():
+        monkeypatch.setattr(leases, "WORKER_ID", "worker-a")
+        first = await leases.acquire_lease("gps:t1", 30)
+        renewed = await leases.acquire_lease("gps:t1", 30)
+
+        monkeypatch.setattr(leases, "WORKER_ID", "worker-b")
+        contended = await leases.acquire_lease("gps:t1", 30)
+        other = await leases.acquire_lease("gps:t2", 30)
+
+        # worker-a stopped renewing
+        await db.leases.update_one(
+            {"_id": "gps:t1"}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+        taken_over = await leases.acquire_lease("gps:t1", 30)
+        holder = (await db.leases.find_one({"_id": "gps:t1"}))['holder']
+        return first, renewed, contended, other, taken_over, holder
+
+    assert asyncio.run(scenario()) == (True, True, False, True, True, "worker-b")
+
+
+def test_release_only_drops_the_own_lease(mongo, monkeypatch):
+    db = mongo(leases)
+
+    async def scenario():
+        monkeypatch.setattr(leases, "WORKER_ID", "worker-a")
+        await leases.acquire_lease("archival", 30)
+        monkeypatch.setattr(leases, "WORKER_ID", "worker-b")
+        await leases.release_lease("archival")
+        kept = await db.leases.count_documents({"_id": "archival"})
+        monkeypatch.setattr(leases, "WORKER_ID", "worker-a")
+        await leases.release_lease("archival")
+        released = await db.leases.count_documents({"_id": "archival"})
+        return kept, released
+
+    assert asyncio.run(scenario()) == (1, 0)
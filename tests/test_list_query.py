@@ -0,0 +1,72 @@
+"""
+Unit tests for the list query DSL: filters, ranges, projections
+"""
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from models import Vehicle
+from utils.list_query import list_query, parse_filters
+from utils.pagination import PageRequest
+
+FILTERS = {"status": str, "year": int, "daily_rate": float, "is_active": bool, "created_at": datetime}
+
+
+def request(params) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": urlencode(params).encode()})
+
+
+def filters(params) -> dict:
+    return parse_filters(request(params), FILTERS)
+
+
+def test_equality_and_any_of():
+    assert filters([("status", "available")]) == {"status": "available"}
+    assert filters([("status", "available,rented")]) == {"status": {"$in": ["available", "rented"]}}
+    assert filters([("is_active", "TRUE")]) == {"is_active": True}
+
+
+def test_ranges_combine_on_one_field():
+    assert filters([("year__gte", "2020"), ("year__lt", "2024"), ("created_at__gt", "2026-01-01")]) == {
+        "year": {"$gte": 2020, "$lt": 2024},
+        "created_at": {"$gt": datetime(2026, 1, 1, tzinfo=timezone.utc)}
+    }
+
+
+def test_paging_and_unknown_parameters_are_not_filters():
+    assert filters([("limit", "10"), ("sort", "-year"), ("_", "1718000000"), ("t", "x"), ("profile", "1")]) == {}
+
+
+@pytest.mark.parametrize("params", [
+    [("status__gte", "a")],          # no ranges on strings
+    [("is_active__lt", "true")],     # nor on booleans
+    [("year__between", "1")],        # unknown operator
+    [("year", "soon")],              # bad value
+    [("is_active", "yes")],
+    [("created_at__gte", "tomorrow")],
+    [("year", "2020"), ("year__gte", "2020")],  # conflicting conditions
+    [("year", "2020"), ("year", "2021")],
+])
+def test_invalid_filters_are_rejected(params):
+    with pytest.raises(HTTPException) as e:
+        filters(params)
+    assert e.value.status_code == 400
+
+
+def test_fields_projection_keeps_the_cursor_fields():
+    dependency = list_query(Vehicle, {"status": str}, sort_fields=("created_at", "daily_rate"), hidden=("imei",))
+    page = PageRequest("daily_rate", 1, 10, None)
+
+    query = dependency(request([("status", "rented")]), page, fields="brand,model")
+    assert query.filter == {"status": "rented"}
+    assert query.projection == {"_id": 0, "id": 1, "daily_rate": 1, "brand": 1, "model": 1}
+    assert query.partial
+
+    full = dependency(request([]), page, fields=None)
+    assert full.projection == {"_id": 0, "imei": 0} and not full.partial
+
+    with pytest.raises(HTTPException):
+        dependency(request([]), page, fields="brand,password")
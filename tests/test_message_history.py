@@ -0,0 +1,72 @@
+"""
+Unit tests for keyset paging through a conversation's message history
+"""
+from datetime import datetime, timezone, timedelta
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from models import User
+from routers import messages
+from utils import retention
+from utils.read_receipts import ReadReceiptBuffer
+
+A = User(id="a", email="a@example.com", full_name="Agent A", role="employee", tenant_id="t1")
+T0 = datetime(2026, 5, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db(mongo, monkeypatch):
+    monkeypatch.setattr(messages, "read_receipts", ReadReceiptBuffer())
+    db = mongo(messages, retention)
+    asyncio.run(seed(db))
+    return db
+
+
+async def seed(db):
+    await db.conversations.insert_one({"id": "ab", "participants": ["a", "b"], "unread_count": {"a": 7}})
+    # Three pairs of messages share a timestamp: the id breaks the tie
+    await db.messages.insert_many([
+        {"id": f"m{i}", "conversation_id": "ab", "sender_id": "b", "content": str(i),
+         "created_at": T0 + timedelta(minutes=i // 2)}
+        for i in range(7)
+    ])
+
+
+async def history(**params):
+    return await messages.get_conversation_messages("ab", current_user=A, **{"before": None, "after": None, **params})
+
+
+def test_paging_back_serves_every_message_once(db):
+    async def scenario():
+        pages = [await history(limit=3)]
+        while pages[-1]:
+            pages.append(await history(before=pages[-1][0]['id'], limit=3))
+        return [[m['id'] for m in page] for page in pages]
+
+    assert asyncio.run(scenario()) == [["m4", "m5", "m6"], ["m1", "m2", "m3"], ["m0"], []]
+
+
+def test_after_returns_only_newer_messages(db):
+    newer = asyncio.run(history(after="m3", limit=50))
+    assert [m['id'] for m in newer] == ["m4", "m5", "m6"]
+
+
+def test_the_latest_page_moves_the_read_pointer(db):
+    async def scenario():
+        await history(before="m3", limit=2)
+        untouched = messages.read_receipts.pending_read_at("ab", "a")
+        latest = await history(limit=2)
+        return untouched, latest, messages.read_receipts.pending_read_at("ab", "a")
+
+    untouched, latest, pointer = asyncio.run(scenario())
+    assert untouched is None
+    assert pointer == latest[-1]['created_at'] == T0 + timedelta(minutes=3)
+
+
+@pytest.mark.parametrize("params", [{"before": "m1", "after": "m2"}, {"before": "missing"}])
+def test_bad_cursors_are_rejected(db, params):
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(history(limit=10, **params))
+    assert e.value.status_code == 400
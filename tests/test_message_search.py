@@ -0,0 +1,36 @@
+"""
+Unit tests for message search query parsing and snippet highlighting
+"""
+from routers.messages import build_snippet, parse_search_query
+
+
+def test_plate_numbers_keep_their_hyphens():
+    assert parse_search_query("AB-123-CD") == ('"AB-123-CD"', ["AB-123-CD"])
+
+
+def test_leading_hyphen_negates_the_whole_token():
+    assert parse_search_query("vidange -pneus") == ("vidange -pneus", ["vidange"])
+    assert parse_search_query("-AB-123-CD retour") == ('-"AB-123-CD" retour', ["retour"])
+
+
+def test_phrases_and_punctuation():
+    assert parse_search_query('"contrat signé" AB-123-CD,') == (
+        '"contrat signé" "AB-123-CD"', ["contrat signé", "AB-123-CD"]
+    )
+    assert parse_search_query('-"en retard" client') == ('-"en retard" client', ["client"])
+
+
+def test_search_syntax_alone_has_no_terms():
+    assert parse_search_query("- --") == ("", [])
+
+
+def test_snippet_highlights_the_whole_plate():
+    snippet, highlights = build_snippet("La voiture AB-123-CD est prête", ["AB-123-CD"])
+    assert [snippet[a:b] for a, b in highlights] == ["AB-123-CD"]
+
+
+def test_snippet_window_follows_the_first_match():
+    content = "x " * 200 + "vidange faite " + "y " * 200
+    snippet, highlights = build_snippet(content, ["vidange"], width=40)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert [snippet[a:b] for a, b in highlights] == ["vidange"]
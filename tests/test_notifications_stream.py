@@ -0,0 +1,66 @@
+"""
+Unit tests for the Server-Sent Events badge stream
+"""
+import asyncio
+
+import pytest
+
+from routers import messages, notifications
+from utils import alerts, auth
+from utils.auth import create_access_token
+from utils.principal_cache import principal_cache
+from utils.realtime import MemoryBroadcast, tenant_channel, user_channel
+
+
+@pytest.fixture
+def broadcast(mongo, monkeypatch):
+    db = mongo(notifications, messages, alerts, auth)
+    monkeypatch.setattr(principal_cache, "ttl", 0)
+    broadcast = MemoryBroadcast()
+    monkeypatch.setattr(notifications, "broadcast", broadcast)
+    asyncio.run(seed(db))
+    return broadcast
+
+
+async def seed(db):
+    await db.users.insert_one({"id": "e1", "email": "agent@example.com", "full_name": "Agent", "role": "employee", "tenant_id": "t1"})
+    await db.alerts.insert_many([
+        {"tenant_id": "t1", "dedup_key": "ins_v1", "severity": 0},
+        {"tenant_id": "t1", "dedup_key": "tech_v1", "severity": 1},
+    ])
+    await db.unread_totals.insert_one({"user_id": "e1", "unread_count": 4})
+
+
+def test_stream_starts_with_the_badges_then_forwards_changes(broadcast):
+    async def scenario():
+        response = await notifications.notifications_stream(create_access_token({"sub": "agent@example.com"}))
+        stream = response.body_iterator
+        events = [await anext(stream)]
+        await broadcast.publish(tenant_channel("t1"), {"type": "alerts", "count": 1, "danger": 0})
+        await broadcast.publish(user_channel("e1"), {"type": "message", "conversation_id": "c1"})
+        await broadcast.publish(user_channel("e1"), {"type": "unread_count", "unread_count": 5})
+        events += [await anext(stream), await anext(stream)]
+        await stream.aclose()
+        return events, broadcast.has_subscribers(user_channel("e1"))
+
+    events, subscribed = asyncio.run(scenario())
+    assert events == [
+        'event: badges\ndata: {"alerts":{"count":2,"danger":1},"unread_count":4}\n\n',
+        'event: alerts\ndata: {"type":"alerts","count":1,"danger":0}\n\n',
+        'event: unread_count\ndata: {"type":"unread_count","unread_count":5}\n\n',
+    ]
+    assert not subscribed
+
+
+def test_idle_streams_send_heartbeats(broadcast, monkeypatch):
+    monkeypatch.setattr(notifications, "SSE_HEARTBEAT_SECONDS", 0.01)
+
+    async def scenario():
+        response = await notifications.notifications_stream(create_access_token({"sub": "agent@example.com"}))
+        stream = response.body_iterator
+        await anext(stream)
+        heartbeat = await anext(stream)
+        await stream.aclose()
+        return heartbeat
+
+    assert asyncio.run(scenario()) == ": heartbeat\n\n"
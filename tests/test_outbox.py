@@ -0,0 +1,139 @@
+"""
+Unit tests for the outbox dispatcher: claims, digests and status writes
+"""
+from datetime import datetime, timezone, timedelta
+import asyncio
+import uuid
+
+import pytest
+
+from utils import outbox
+
+
+class RecordingTransport(outbox.Transport):
+    """Records the digests it is given and fails the chosen recipients"""
+
+    def __init__(self, failing=()):
+        super().__init__(limiter=None)
+        self.failing = set(failing)
+        self.sent = []
+
+    async def send(self, digests):
+        self.sent.extend(digests)
+        return ["boom" if d['recipient'] in self.failing else None for d in digests]
+
+
+def entry(recipient, title, channel="email", **fields):
+    now = datetime.now(timezone.utc) - timedelta(minutes=1)
+    return {
+        "id": str(uuid.uuid4()),
+        "channel": channel,
+        "recipient": recipient,
+        "dedup_key": f"{now.date()}:{uuid.uuid4()}",
+        "tenant_id": "tenant-1",
+        "recipient_name": "Agence",
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+        "title": title,
+        "message": f"{title} expire bientôt",
+        "severity": 1,
+        **fields
+    }
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    transport = RecordingTransport()
+    monkeypatch.setattr(outbox, "get_transport", lambda channel: transport)
+    return transport
+
+
+def test_digest_marks_every_entry_of_the_recipient_sent(mongo, transport):
+    db = mongo(outbox)
+
+    async def scenario():
+        await db.outbox.insert_many([entry("a@example.com", "Assurance"), entry("a@example.com", "Contrôle technique")])
+        stats = await outbox.dispatch_outbox()
+        statuses = [e['status'] async for e in db.outbox.find({}, {"_id": 0, "status": 1})]
+        # A second run has nothing left to send: no duplicate digest
+        again = await outbox.dispatch_outbox()
+        return stats, statuses, again
+
+    stats, statuses, again = asyncio.run(scenario())
+    assert stats == {"digests": 1, "sent": 2, "failed": 0}
+    assert statuses == ["sent", "sent"]
+    assert len(transport.sent) == 1
+    assert "2 alerte(s)" in transport.sent[0]['subject']
+    assert again['digests'] == 0
+
+
+def test_failed_digest_reschedules_every_entry_of_the_recipient(mongo, transport):
+    db = mongo(outbox)
+    transport.failing.add("b@example.com")
+
+    async def scenario():
+        await db.outbox.insert_many([
+            entry("a@example.com", "Assurance"),
+            entry("b@example.com", "Assurance"),
+            entry("b@example.com", "Vidange")
+        ])
+        await outbox.dispatch_outbox()
+        return await db.outbox.find({}, {"_id": 0}).to_list(None)
+
+    entries = asyncio.run(scenario())
+    failed = [e for e in entries if e['recipient'] == "b@example.com"]
+    assert [e['status'] for e in failed] == ["pending", "pending"]
+    assert all(e['attempts'] == 1 and e['last_error'] == "boom" and "claim" not in e for e in failed)
+    assert all(e['next_attempt_at'] > datetime.now(timezone.utc) for e in failed)
+    assert [e['status'] for e in entries if e['recipient'] == "a@example.com"] == ["sent"]
+
+
+def test_entries_past_max_attempts_are_failed(mongo, transport):
+    db = mongo(outbox)
+    transport.failing.add("a@example.com")
+
+    async def scenario():
+        attempts = outbox.OUTBOX_MAX_ATTEMPTS - 1
+        await db.outbox.insert_many([
+            entry("a@example.com", "Assurance", attempts=attempts),
+            entry("a@example.com", "Vidange", attempts=attempts)
+        ])
+        stats = await outbox.dispatch_outbox()
+        return stats, [e['status'] async for e in db.outbox.find({}, {"_id": 0, "status": 1})]
+
+    stats, statuses = asyncio.run(scenario())
+    assert stats['failed'] == 2
+    assert statuses == ["failed", "failed"]
+
+
+def test_abandoned_claims_are_released(mongo, transport):
+    db = mongo(outbox)
+    stale = datetime.now(timezone.utc) - outbox.CLAIM_TIMEOUT - timedelta(minutes=1)
+
+    async def scenario():
+        await db.outbox.insert_many([
+            entry("a@example.com", "Assurance", status="sending", claim="crashed", claimed_at=stale),
+            entry("b@example.com", "Assurance", status="sending", claim="running", claimed_at=datetime.now(timezone.utc))
+        ])
+        await outbox.dispatch_outbox()
+        return {e['recipient']: e['status'] async for e in db.outbox.find({}, {"_id": 0})}
+
+    assert asyncio.run(scenario()) == {"a@example.com": "sent", "b@example.com": "sending"}
+
+
+def test_retry_delay_backs_off_up_to_the_cap():
+    assert outbox.retry_delay(1) == timedelta(minutes=2)
+    assert outbox.retry_delay(20) == outbox.MAX_BACKOFF
+
+
+def test_build_digest_puts_urgent_alerts_first():
+    digest = outbox.build_digest("email", "a@example.com", [
+        entry("a@example.com", "Vidange"),
+        entry("a@example.com", "Assurance", severity=0)
+    ])
+    lines = digest['body'].splitlines()
+    assert lines[0] == "Bonjour Agence,"
+    assert lines[4].startswith("- [URGENT] Assurance")
+    assert lines[5].startswith("- Vidange")
@@ -0,0 +1,159 @@
+"""
+Unit tests for keyset pagination: cursors, page filters and sort indexes
+"""
+from datetime import datetime, timezone, timedelta
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from utils import date_migration, indexes
+from utils.pagination import PageRequest, decode_cursor, encode_cursor, fetch_page, pagination
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("value", [T0, 4500.0, "AB-123-CD", None])
+def test_cursor_round_trip(value):
+    assert decode_cursor(encode_cursor("field", value, "id-1"), "field") == (value, "id-1")
+
+
+def test_cursor_for_another_sort_is_rejected():
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(encode_cursor("created_at", T0, "id-1"), "daily_rate")
+    assert e.value.status_code == 400
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm90IGpzb24", encode_cursor("a", 1, "x")[:-3]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor, "a")
+    assert e.value.status_code == 400
+
+
+def test_filter_continues_after_the_cursor_row():
+    page = PageRequest("daily_rate", -1, 10, (4500.0, "id-1"))
+    assert page.filter({"tenant_id": "t1"}) == {"tenant_id": "t1", "$or": [
+        {"daily_rate": {"$lt": 4500.0}},
+        {"daily_rate": 4500.0, "id": {"$lt": "id-1"}},
+        {"daily_rate": None}
+    ]}
+    assert page.sort == [("daily_rate", -1), ("id", -1)]
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_pages_cover_every_row_once_despite_ties(mongo, direction):
+    db = mongo()
+    rows = [
+        {"id": f"v{i:02d}", "tenant_id": "t1", "daily_rate": float(i // 3), "created_at": T0 + timedelta(days=i)}
+        for i in range(10)
+    ] + [{"id": "other", "tenant_id": "t2", "daily_rate": 1.0, "created_at": T0}]
+
+    async def scenario():
+        await db.vehicles.insert_many([dict(r) for r in rows])
+        seen, after = [], None
+        while True:
+            page = PageRequest("daily_rate", direction, 4, after)
+            result = await fetch_page(db.vehicles, page.filter({"tenant_id": "t1"}), page)
+            seen.extend(r['id'] for r in result['items'])
+            if not result['next_cursor']:
+                return seen
+            after = decode_cursor(result['next_cursor'], "daily_rate")
+
+    expected = sorted((r for r in rows if r['tenant_id'] == "t1"), key=lambda r: (r['daily_rate'], r['id']))
+    if direction == -1:
+        expected.reverse()
+    assert asyncio.run(scenario()) == [r['id'] for r in expected]
+
+
+async def page_through(collection, field, direction, size=3):
+    seen, after = [], None
+    while True:
+        page = PageRequest(field, direction, size, after)
+        result = await fetch_page(collection, page.filter({"tenant_id": "t1"}), page)
+        seen.extend(r['id'] for r in result['items'])
+        if not result['next_cursor']:
+            return seen
+        after = decode_cursor(result['next_cursor'], field)
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_pages_cross_null_values(mongo, direction):
+    db = mongo()
+    rows = [{"id": f"c{i}", "tenant_id": "t1", "total_amount": float(i)} for i in range(4)] + [
+        {"id": "n1", "tenant_id": "t1", "total_amount": None},
+        {"id": "n2", "tenant_id": "t1"},
+        {"id": "n3", "tenant_id": "t1", "total_amount": None},
+    ]
+
+    async def scenario():
+        await db.contracts.insert_many([dict(r) for r in rows])
+        return await page_through(db.contracts, "total_amount", direction)
+
+    expected = ["n1", "n2", "n3", "c0", "c1", "c2", "c3"]
+    assert asyncio.run(scenario()) == (expected if direction == 1 else expected[::-1])
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_pages_cross_from_legacy_strings_to_dates(mongo, direction):
+    db = mongo()
+    rows = [
+        {"id": "s1", "tenant_id": "t1", "created_at": "2025-01-01T00:00:00"},
+        {"id": "s2", "tenant_id": "t1", "created_at": "2025-06-01T00:00:00"},
+        {"id": "d1", "tenant_id": "t1", "created_at": T0},
+        {"id": "d2", "tenant_id": "t1", "created_at": T0 + timedelta(days=1)},
+        {"id": "nd", "tenant_id": "t1"},
+    ]
+
+    async def scenario():
+        await db.contracts.insert_many([dict(r) for r in rows])
+        return await page_through(db.contracts, "created_at", direction, size=2)
+
+    # Null first, then strings, then dates, as MongoDB sorts them
+    expected = ["nd", "s1", "s2", "d1", "d2"]
+    assert asyncio.run(scenario()) == (expected if direction == 1 else expected[::-1])
+
+
+def test_paging_on_dates_waits_for_the_migration(mongo, monkeypatch):
+    db = mongo(date_migration)
+    monkeypatch.setattr(date_migration, "_migrated", False)
+    page_request = pagination(("created_at", "total_amount"), date_fields=("created_at",))
+
+    async def scenario():
+        with pytest.raises(HTTPException) as e:
+            await page_request(limit=10, cursor=None, sort="created_at")
+        unpaged = await page_request(limit=None, cursor=None, sort="-created_at")
+        by_amount = await page_request(limit=10, cursor=None, sort="total_amount")
+
+        await db.migrations.insert_one({
+            "_id": date_migration.MIGRATION_ID,
+            "collections": {name: {"done": True} for name in date_migration.DATE_FIELDS}
+        })
+        paged = await page_request(limit=10, cursor=None, sort="created_at")
+        return e.value.status_code, unpaged.paged, by_amount.paged, paged.paged
+
+    assert asyncio.run(scenario()) == (503, False, True, True)
+
+
+def test_every_allowed_sort_has_an_index():
+    import routers  # noqa: F401  (declares the list endpoints and their indexes)
+    from routers import clients, contracts, employees, infractions, maintenance, payments, reservations, vehicles
+
+    declared = {(spec.collection, tuple(spec.model.document['key'])) for spec in indexes.declared_indexes()}
+    sorts = [
+        ("clients", ("tenant_id",), clients.CLIENT_SORT_FIELDS),
+        ("contracts", ("tenant_id",), contracts.CONTRACT_SORT_FIELDS),
+        ("users", ("tenant_id", "role"), employees.EMPLOYEE_SORT_FIELDS),
+        ("infractions", ("tenant_id",), infractions.INFRACTION_SORT_FIELDS),
+        ("maintenance", ("tenant_id",), maintenance.MAINTENANCE_SORT_FIELDS),
+        ("payments", ("tenant_id",), payments.PAYMENT_SORT_FIELDS),
+        ("reservations", ("tenant_id",), reservations.RESERVATION_SORT_FIELDS),
+        ("vehicles", ("tenant_id",), vehicles.VEHICLE_SORT_FIELDS),
+    ]
+    missing = [
+        (collection, field)
+        for collection, prefix, fields in sorts
+        for field in fields
+        if (collection, (*prefix, field, "id")) not in declared
+    ]
+    assert missing == []
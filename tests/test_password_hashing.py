@@ -0,0 +1,65 @@
+"""
+Unit tests for password hashing off the event loop
+"""
+import asyncio
+import threading
+import time
+
+from utils import auth
+
+
+class SlowContext:
+    """Stands in for the bcrypt context, recording how many hashes overlap"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.threads = set()
+
+    def hash(self, password):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.threads.add(threading.current_thread().name)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return f"hashed:{password}"
+
+    def verify(self, password, hashed):
+        return hashed == f"hashed:{password}"
+
+
+def test_hashing_runs_in_the_bounded_pool(monkeypatch):
+    context = SlowContext()
+    monkeypatch.setattr(auth, "pwd_context", context)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.create_task(ticker())
+        hashes = await asyncio.gather(*[auth.hash_password(f"pw{i}") for i in range(auth.PASSWORD_HASH_WORKERS * 2)])
+        task.cancel()
+        return hashes, ticks
+
+    hashes, ticks = asyncio.run(scenario())
+    assert hashes[0] == "hashed:pw0"
+    assert context.peak == auth.PASSWORD_HASH_WORKERS
+    assert all(name.startswith("bcrypt") for name in context.threads)
+    # The loop kept running while the pool hashed
+    assert ticks >= 5
+
+
+def test_verify_round_trip():
+    async def scenario():
+        hashed = await auth.hash_password("s3cret")
+        return await auth.verify_password("s3cret", hashed), await auth.verify_password("wrong", hashed)
+
+    assert asyncio.run(scenario()) == (True, False)
@@ -0,0 +1,94 @@
+"""
+Unit tests for the authenticated principal cache and its invalidation
+"""
+import asyncio
+
+import pytest
+
+from models import User
+from utils import auth, principal_cache as principal_cache_module
+from utils.auth import create_access_token, get_user_from_token
+from utils.principal_cache import PrincipalCache
+from utils.realtime import MemoryBroadcast
+
+OWNER = User(id="t1", email="owner@example.com", full_name="Owner", role="locateur")
+AGENT = User(id="e1", email="agent@example.com", full_name="Agent", role="employee", tenant_id="t1")
+OTHER = User(id="e2", email="other@example.com", full_name="Other", role="employee", tenant_id="t2")
+
+
+@pytest.fixture
+def broadcast(monkeypatch):
+    broadcast = MemoryBroadcast()
+    monkeypatch.setattr(principal_cache_module, "broadcast", broadcast)
+    return broadcast
+
+
+def test_users_are_cached_until_invalidated(mongo, monkeypatch, broadcast):
+    db = mongo(auth)
+    cache = PrincipalCache(ttl_seconds=60)
+    monkeypatch.setattr(auth, "principal_cache", cache)
+    token = create_access_token({"sub": AGENT.email})
+
+    async def scenario():
+        await db.users.insert_one(AGENT.model_dump())
+        first = await get_user_from_token(token)
+        await db.users.update_one({"id": "e1"}, {"$set": {"is_suspended": True}})
+        cached = await get_user_from_token(token)
+        await cache.invalidate(user_id="e1")
+        reloaded = await get_user_from_token(token)
+        return first, cached, reloaded
+
+    first, cached, reloaded = asyncio.run(scenario())
+    assert not first.is_suspended and cached is first
+    assert reloaded.is_suspended
+
+
+def test_invalidation_reaches_the_other_workers(broadcast):
+    here, there = PrincipalCache(ttl_seconds=60), PrincipalCache(ttl_seconds=60)
+    for cache in (here, there):
+        for user in (OWNER, AGENT, OTHER):
+            cache.put(user.email, user)
+
+    async def scenario():
+        await there.start()
+        await asyncio.sleep(0)
+        await here.invalidate(tenant_id="t1")
+        await asyncio.sleep(0)
+        await there.stop()
+        return [(cache.get(OWNER.email), cache.get(AGENT.email), cache.get(OTHER.email)) for cache in (here, there)]
+
+    assert asyncio.run(scenario()) == [(None, None, OTHER), (None, None, OTHER)]
+
+
+def test_a_listener_that_fell_behind_starts_over_empty(monkeypatch):
+    broadcast = MemoryBroadcast(max_queue_size=1)
+    monkeypatch.setattr(principal_cache_module, "broadcast", broadcast)
+    cache = PrincipalCache(ttl_seconds=60)
+    cache.put(OTHER.email, OTHER)
+
+    async def scenario():
+        await cache.start()
+        await asyncio.sleep(0)
+        # Two invalidations before the listener runs overflow its queue
+        await broadcast.publish(principal_cache_module.PRINCIPALS_CHANNEL, {"user_id": "e1"})
+        await broadcast.publish(principal_cache_module.PRINCIPALS_CHANNEL, {"user_id": "e3"})
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        await cache.stop()
+        return cache.get(OTHER.email)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_entries_expire_and_the_oldest_are_evicted(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(principal_cache_module.time, "monotonic", lambda: clock[0])
+    cache = PrincipalCache(ttl_seconds=60, max_size=2)
+    cache.put(OWNER.email, OWNER)
+    cache.put(AGENT.email, AGENT)
+    cache.get(OWNER.email)
+    cache.put(OTHER.email, OTHER)
+    assert (cache.get(OWNER.email), cache.get(AGENT.email), cache.get(OTHER.email)) == (OWNER, None, OTHER)
+
+    clock[0] += 61
+    assert cache.get(OWNER.email) is None
@@ -0,0 +1,139 @@
+"""
+Unit tests for the read pointer write-behind buffer
+"""
+from datetime import datetime, timezone, timedelta
+import asyncio
+
+import pytest
+
+from utils import read_receipts
+from utils.read_receipts import ReadReceiptBuffer
+
+T0 = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def message(id, sender, created_at):
+    return {"id": id, "conversation_id": "c1", "sender_id": sender, "content": id, "created_at": created_at}
+
+
+async def send(db, id, sender, recipient, created_at, insert=True):
+    """What send_message does: stamp the conversation and bump, then insert"""
+    await db.conversations.update_one(
+        {"id": "c1"},
+        {"$set": {"last_message_at": created_at}, "$inc": {f"unread_count.{recipient}": 1}}
+    )
+    if insert:
+        await db.messages.insert_one(message(id, sender, created_at))
+
+
+@pytest.fixture
+def db(mongo):
+    db = mongo(read_receipts)
+
+    async def setup():
+        await db.conversations.insert_one({
+            "id": "c1", "participants": ["alice", "bob"], "unread_count": {"alice": 0, "bob": 0}
+        })
+        for i in range(3):
+            await send(db, f"m{i}", "alice", "bob", T0 + timedelta(seconds=i))
+
+    asyncio.run(setup())
+    return db
+
+
+def flushed_buffer():
+    flushed = []
+
+    async def after_flush(unread):
+        flushed.append(unread)
+
+    return ReadReceiptBuffer(flush_interval_ms=10, after_flush=after_flush), flushed
+
+
+def test_mark_read_keeps_the_newest_pointer():
+    buffer = ReadReceiptBuffer()
+    buffer.mark_read("c1", "bob", T0 + timedelta(seconds=2))
+    buffer.mark_read("c1", "bob", T0)
+    assert buffer.pending_read_at("c1", "bob") == T0 + timedelta(seconds=2)
+    assert buffer.pending_read_at("c1", "alice") is None
+
+
+def test_mark_read_accepts_legacy_string_dates():
+    buffer = ReadReceiptBuffer()
+    buffer.mark_read("c1", "bob", T0)
+    buffer.mark_read("c1", "bob", (T0 + timedelta(seconds=1)).isoformat())
+    assert buffer.pending_read_at("c1", "bob") == T0 + timedelta(seconds=1)
+
+
+def test_flush_writes_the_pointer_and_resets_the_counter(db):
+    buffer, flushed = flushed_buffer()
+
+    async def scenario():
+        buffer.mark_read("c1", "bob", T0 + timedelta(seconds=2))
+        await buffer.flush()
+        return await db.conversations.find_one({"id": "c1"}, {"_id": 0})
+
+    conversation = asyncio.run(scenario())
+    assert conversation['read_at']['bob'] == T0 + timedelta(seconds=2)
+    assert conversation['unread_count']['bob'] == 0
+    assert flushed == [{("c1", "bob"): 0}]
+    assert buffer.pending_read_at("c1", "bob") is None
+
+
+def test_flush_never_moves_the_pointer_back(db):
+    buffer, _ = flushed_buffer()
+
+    async def scenario():
+        await db.conversations.update_one({"id": "c1"}, {"$set": {"read_at.bob": T0 + timedelta(seconds=2)}})
+        buffer.mark_read("c1", "bob", T0)
+        await buffer.flush()
+        return await db.conversations.find_one({"id": "c1"}, {"_id": 0})
+
+    assert asyncio.run(scenario())['read_at']['bob'] == T0 + timedelta(seconds=2)
+
+
+def test_message_sent_before_the_flush_stays_unread(db):
+    buffer, flushed = flushed_buffer()
+
+    async def scenario():
+        buffer.mark_read("c1", "bob", T0 + timedelta(seconds=2))
+        # Arrives after bob read the chat, before the pointer is written
+        await send(db, "m3", "alice", "bob", T0 + timedelta(seconds=3))
+        await send(db, "m4", "bob", "alice", T0 + timedelta(seconds=4))
+        await buffer.flush()
+        return await db.conversations.find_one({"id": "c1"}, {"_id": 0})
+
+    conversation = asyncio.run(scenario())
+    assert conversation['read_at']['bob'] == T0 + timedelta(seconds=2)
+    assert conversation['unread_count']['bob'] == 1
+    assert flushed == [{("c1", "bob"): 1}]
+
+
+def test_counter_is_kept_while_the_newest_message_is_not_inserted(db):
+    buffer, flushed = flushed_buffer()
+
+    async def scenario():
+        buffer.mark_read("c1", "bob", T0 + timedelta(seconds=2))
+        await send(db, "m3", "alice", "bob", T0 + timedelta(seconds=3), insert=False)
+        await buffer.flush()
+        return await db.conversations.find_one({"id": "c1"}, {"_id": 0})
+
+    # Too high (4) until the next read, but the new message is not lost
+    assert asyncio.run(scenario())['unread_count']['bob'] == 4
+    assert flushed == [{("c1", "bob"): 4}]
+
+
+def test_failed_flush_keeps_the_pointers(monkeypatch):
+    class FailingCollection:
+        async def bulk_write(self, *args, **kwargs):
+            raise RuntimeError("mongo down")
+
+    class FailingDb:
+        conversations = FailingCollection()
+
+    monkeypatch.setattr(read_receipts, "db", FailingDb())
+    buffer = ReadReceiptBuffer()
+    buffer.mark_read("c1", "bob", T0)
+    with pytest.raises(RuntimeError):
+        asyncio.run(buffer.flush())
+    assert buffer.pending_read_at("c1", "bob") == T0
@@ -0,0 +1,112 @@
+"""
+Unit tests for the realtime fan-out and the messaging WebSocket
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from routers import messages
+from utils import auth
+from utils.auth import create_access_token
+from utils.principal_cache import principal_cache
+from utils.realtime import MemoryBroadcast, forward_events
+
+
+class Socket:
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+
+    async def send_json(self, event):
+        self.sent.append(event)
+
+    async def close(self, code, reason=""):
+        self.closed = code
+
+
+def test_events_reach_every_subscriber_of_the_channel():
+    async def scenario():
+        broadcast = MemoryBroadcast()
+        first = broadcast.subscribe(["conversation:c1", "user:a"])
+        second = broadcast.subscribe(["conversation:c1"])
+        other = broadcast.subscribe(["conversation:c2"])
+        await broadcast.publish("conversation:c1", {"type": "message"})
+        await broadcast.publish("user:a", {"type": "unread_count"})
+        broadcast.unsubscribe(second)
+        await broadcast.publish("conversation:c1", {"type": "read"})
+        return (
+            [first._queue.get_nowait()['type'] for _ in range(first._queue.qsize())],
+            [second._queue.get_nowait()['type'] for _ in range(second._queue.qsize())],
+            other._queue.qsize(),
+            broadcast.has_subscribers("conversation:c1")
+        )
+
+    assert asyncio.run(scenario()) == (["message", "unread_count", "read"], ["message"], 0, True)
+
+
+def test_a_slow_consumer_is_dropped_and_its_socket_closed():
+    async def scenario():
+        broadcast = MemoryBroadcast(max_queue_size=2)
+        slow = broadcast.subscribe(["user:a"])
+        for i in range(3):
+            await broadcast.publish("user:a", {"type": "message", "n": i})
+        socket = Socket()
+        await forward_events(socket, slow)
+        return socket.sent, socket.closed, broadcast.has_subscribers("user:a")
+
+    sent, closed, subscribed = asyncio.run(scenario())
+    assert [e['n'] for e in sent] == [0, 1]
+    assert closed == 1013 and not subscribed
+
+
+@pytest.fixture
+def client(mongo, monkeypatch):
+    db = mongo(messages, auth)
+    monkeypatch.setattr(principal_cache, "ttl", 0)
+    monkeypatch.setattr(messages, "_participants_cache", type(messages._participants_cache)())
+    app = FastAPI()
+    app.include_router(messages.router, prefix="/api")
+    with TestClient(app) as client:
+        client.portal.call(db.users.insert_many, [
+            {"id": "a", "email": "a@example.com", "full_name": "Agent A", "role": "employee", "tenant_id": "t1"},
+            {"id": "b", "email": "b@example.com", "full_name": "Owner B", "role": "locateur"},
+        ])
+        yield client
+
+
+def headers(email):
+    return {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+
+def test_socket_follows_new_conversations_and_receives_their_messages(client):
+    with client.websocket_connect(f"/api/messages/ws?token={create_access_token({'sub': 'a@example.com'})}") as socket:
+        socket.send_json({"type": "ping"})
+        assert socket.receive_json() == {"type": "pong"}
+
+        conversation = client.post(
+            "/api/messages/conversations", json={"participant_id": "a"}, headers=headers("b@example.com")
+        ).json()
+        created = socket.receive_json()
+        assert created['type'] == "conversation" and created['conversation']['id'] == conversation['id']
+
+        client.post(
+            "/api/messages/send",
+            json={"conversation_id": conversation['id'], "content": "Le véhicule est prêt"},
+            headers=headers("b@example.com")
+        )
+        message, unread = socket.receive_json(), socket.receive_json()
+
+    assert message['type'] == "message" and message['message']['content'] == "Le véhicule est prêt"
+    assert unread == {
+        "type": "unread_count", "conversation_id": conversation['id'], "conversation_unread": 1, "unread_count": 1
+    }
+
+
+def test_socket_with_a_bad_token_is_refused(client):
+    with pytest.raises(WebSocketDisconnect) as e:
+        with client.websocket_connect("/api/messages/ws?token=nope") as socket:
+            socket.receive_json()
+    assert e.value.code == 4401
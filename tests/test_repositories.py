@@ -0,0 +1,73 @@
+"""
+Unit tests for the tenant-scoped repositories and their change hooks
+"""
+from datetime import datetime, timezone
+import asyncio
+
+import pytest
+
+from utils import repositories
+from utils.repositories import TenantRepository
+
+
+@pytest.fixture
+def db(mongo):
+    return mongo(repositories)
+
+
+@pytest.fixture
+def recording(monkeypatch):
+    def record(repository: TenantRepository) -> list:
+        events = []
+        monkeypatch.setattr(repository, "_hooks", [])
+        repository.subscribe(lambda operation, tenant_id, doc: events.append((operation, tenant_id, doc['id'])))
+        return events
+    return record
+
+
+def test_writes_are_scoped_and_notified(db, recording):
+    events = recording(repositories.infractions)
+
+    async def scenario():
+        await repositories.infractions.insert("t1", {"id": "i1", "date": "2026-02-01", "status": "pending"})
+        foreign = await repositories.infractions.update("t2", "i1", {"status": "paid"})
+        updated = await repositories.infractions.update("t1", "i1", {"status": "paid", "tenant_id": "t2"})
+        missing = await repositories.infractions.delete("t2", "i1")
+        deleted = await repositories.infractions.delete("t1", "i1")
+        return foreign, updated, missing, deleted
+
+    foreign, updated, missing, deleted = asyncio.run(scenario())
+    assert foreign is None and missing is None
+    assert updated['tenant_id'] == "t1" and updated['status'] == "paid"
+    assert updated['date'] == datetime(2026, 2, 1, tzinfo=timezone.utc)
+    assert deleted['id'] == "i1"
+    assert events == [("insert", "t1", "i1"), ("update", "t1", "i1"), ("delete", "t1", "i1")]
+
+
+def test_reservation_writes_fire_the_hooks(db, recording):
+    events = recording(repositories.reservations)
+
+    async def scenario():
+        await repositories.reservations.insert("t1", {"id": "r1", "status": "pending"})
+        await repositories.reservations.update("t1", "r1", {"status": "confirmed"})
+
+    asyncio.run(scenario())
+    assert events == [("insert", "t1", "r1"), ("update", "t1", "r1")]
+
+
+def test_employees_are_the_tenant_employees_only(db, recording):
+    events = recording(repositories.employees)
+
+    async def scenario():
+        await db.users.insert_one({"id": "owner", "tenant_id": "owner", "role": "locateur", "password": "x"})
+        employee = await repositories.employees.insert("owner", {"id": "e1", "email": "e1@example.com", "password": "x"})
+        owner = await repositories.employees.update("owner", "owner", {"full_name": "Renamed"})
+        promoted = await repositories.employees.update("owner", "e1", {"role": "locateur", "full_name": "E One"})
+        stored = await db.users.find_one({"id": "e1"})
+        return employee, owner, promoted, stored
+
+    employee, owner, promoted, stored = asyncio.run(scenario())
+    assert employee['role'] == "employee" and owner is None
+    assert promoted == {**promoted, "role": "employee", "full_name": "E One"} and "password" not in promoted
+    assert stored['role'] == "employee" and stored['password'] == "x"
+    assert events == [("insert", "owner", "e1"), ("update", "owner", "e1")]
@@ -0,0 +1,75 @@
+"""
+Unit tests for message retention: tenant backfill, horizons and the archival lease
+"""
+from datetime import datetime, timezone, timedelta
+import asyncio
+
+from routers import messages
+from utils import leases, retention
+
+NOW = datetime.now(timezone.utc)
+
+
+async def seed(db):
+    await db.users.insert_many([
+        {"id": "loc", "role": "locateur", "message_retention_days": 30},
+        {"id": "emp1", "role": "employee", "tenant_id": "loc"},
+        {"id": "emp2", "role": "employee", "tenant_id": "loc"},
+        {"id": "admin", "role": "superadmin"},
+    ])
+    await db.conversations.insert_many([
+        {"id": "c-loc", "participants": ["emp1", "loc"], "created_at": NOW - timedelta(days=400)},
+        {"id": "c-emp", "participants": ["emp1", "emp2"], "created_at": NOW - timedelta(days=400)},
+        {"id": "c-admin", "participants": ["admin"], "created_at": NOW - timedelta(days=400)},
+        {"id": "c-new", "participants": ["loc", "emp2"], "tenant_id": "loc", "created_at": NOW},
+    ])
+    await db.messages.insert_many([
+        {"id": f"{c}-m{d}", "conversation_id": c, "sender_id": "emp1", "content": "x", "created_at": NOW - timedelta(days=d)}
+        for c in ("c-loc", "c-emp", "c-admin") for d in (60, 10)
+    ])
+
+
+def test_backfill_sets_the_tenant_from_the_participants(mongo):
+    db = mongo(messages)
+
+    async def scenario():
+        await seed(db)
+        await messages.backfill_conversation_tenants()
+        await messages.backfill_conversation_tenants()  # idempotent
+        return {c['id']: c.get('tenant_id') async for c in db.conversations.find({}, {"_id": 0})}
+
+    assert asyncio.run(scenario()) == {"c-loc": "loc", "c-emp": "loc", "c-admin": None, "c-new": "loc"}
+
+
+def test_backfilled_conversations_follow_the_tenant_horizon(mongo):
+    db = mongo(messages, retention)
+
+    async def scenario():
+        await seed(db)
+        await messages.backfill_conversation_tenants()
+        await retention.archive_messages()
+        return sorted([m['id'] async for m in db.messages.find({}, {"_id": 0, "id": 1})])
+
+    # The tenant keeps 30 days; the tenantless conversation the default 180
+    assert asyncio.run(scenario()) == ["c-admin-m10", "c-admin-m60", "c-emp-m10", "c-loc-m10"]
+
+
+def test_only_the_lease_holder_archives(mongo, monkeypatch):
+    mongo(retention, leases)
+    calls = []
+
+    async def archive_messages():
+        calls.append(leases.WORKER_ID)
+        return 0
+
+    monkeypatch.setattr(retention, "archive_messages", archive_messages)
+
+    async def scenario():
+        results = []
+        for worker in ("worker-a", "worker-b", "worker-a"):
+            monkeypatch.setattr(leases, "WORKER_ID", worker)
+            results.append(await retention.archive_if_leader(3600))
+        return results
+
+    assert asyncio.run(scenario()) == [0, None, 0]
+    assert calls == ["worker-a", "worker-a"]
@@ -0,0 +1,45 @@
+"""
+Unit tests for serializing list responses from unvalidated rows
+"""
+from datetime import datetime, timezone
+import json
+import warnings
+
+import pytest
+
+from models import Page, Payment
+from utils.serialization import construct_rows, datetime_fields, dump_rows
+
+ROW = {
+    "id": "p1", "tenant_id": "t1", "contract_id": "c1", "amount": 120.0, "method": "cash",
+    "status": "completed", "reference": None,
+    "payment_date": datetime(2026, 3, 2, tzinfo=timezone.utc),
+    "created_at": datetime(2026, 3, 1, 10, 30, tzinfo=timezone.utc),
+}
+
+
+def test_date_fields_include_optional_ones():
+    assert datetime_fields(Payment) == ("payment_date", "created_at")
+
+
+def test_rows_serialize_like_the_response_model():
+    expected = Page[Payment](items=[Payment(**ROW)], next_cursor="abc").model_dump_json()
+    assert json.loads(dump_rows(Payment, {"items": [dict(ROW)], "next_cursor": "abc"})) == json.loads(expected)
+
+
+@pytest.mark.parametrize("legacy", [
+    {"created_at": "2026-03-01T10:30:00+00:00", "payment_date": "2026-03-02"},
+    {"created_at": "2026-03-01T10:30:00", "payment_date": "2026-03-02T00:00:00Z"},
+])
+def test_legacy_string_dates_serialize_as_dates(legacy):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        body = dump_rows(Payment, [{**ROW, **legacy}, dict(ROW)])
+    legacy_row, migrated = json.loads(body)
+    assert legacy_row == migrated
+
+
+def test_rows_are_left_untouched():
+    row = {**ROW, "created_at": "2026-03-01T10:30:00"}
+    [payment] = construct_rows(Payment, [row])
+    assert payment.created_at == ROW['created_at'] and row['created_at'] == "2026-03-01T10:30:00"
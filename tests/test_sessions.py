@@ -0,0 +1,92 @@
+"""
+Unit tests for refresh-token sessions: rotation, reuse and account checks
+"""
+from datetime import datetime, timezone, timedelta
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from models import RefreshRequest
+from routers import auth
+from utils import sessions
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def db(mongo):
+    return mongo(auth, sessions)
+
+
+async def sign_in(db, **user):
+    user_doc = {"id": "u1", "email": "owner@example.com", "role": "locateur", **user}
+    await db.users.insert_one(dict(user_doc))
+    return await sessions.create_session(user_doc)
+
+
+async def refresh(token):
+    return await auth.refresh_access_token(RefreshRequest(refresh_token=token))
+
+
+def test_refresh_rotates_the_token(db):
+    async def scenario():
+        token = await sign_in(db, subscription_end=NOW + timedelta(days=10))
+        first = await refresh(token)
+        with pytest.raises(HTTPException) as reused:
+            await refresh(token)
+        second = await refresh(first.refresh_token)
+        return token, first, second, reused.value.status_code
+
+    token, first, second, reused = asyncio.run(scenario())
+    assert len({token, first.refresh_token, second.refresh_token}) == 3
+    assert first.access_token and reused == 401
+
+
+@pytest.mark.parametrize("change", [
+    {"subscription_end": NOW - timedelta(minutes=1)},
+    {"subscription_end": (NOW - timedelta(days=1)).isoformat()},  # not migrated yet
+    {"is_suspended": True},
+])
+def test_refresh_revokes_locked_out_accounts(db, change):
+    async def scenario():
+        token = await sign_in(db, subscription_end=NOW + timedelta(days=10))
+        await db.users.update_one({"id": "u1"}, {"$set": change})
+        with pytest.raises(HTTPException) as e:
+            await refresh(token)
+        return e.value.status_code, await db.sessions.count_documents({})
+
+    assert asyncio.run(scenario()) == (401, 0)
+
+
+def test_refresh_of_a_deleted_user_is_refused(db):
+    async def scenario():
+        token = await sign_in(db)
+        await db.users.delete_one({"id": "u1"})
+        with pytest.raises(HTTPException) as e:
+            await refresh(token)
+        return e.value.status_code, await db.sessions.count_documents({})
+
+    assert asyncio.run(scenario()) == (401, 0)
+
+
+def test_logout_revokes_the_session(db):
+    async def scenario():
+        token = await sign_in(db, subscription_end=NOW + timedelta(days=10))
+        await auth.logout(RefreshRequest(refresh_token=token))
+        with pytest.raises(HTTPException) as e:
+            await refresh(token)
+        return e.value.status_code
+
+    assert asyncio.run(scenario()) == 401
+
+
+def test_sessions_follow_the_subscription_and_the_email(db):
+    async def scenario():
+        await sign_in(db, subscription_end=NOW + timedelta(days=2))
+        await sessions.rename_user_sessions("u1", "renamed@example.com")
+        return await db.sessions.find_one({"user_id": "u1"})
+
+    session = asyncio.run(scenario())
+    assert session['expires_at'] <= NOW + timedelta(days=2)
+    assert session['email'] == "renamed@example.com"
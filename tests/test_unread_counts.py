@@ -0,0 +1,72 @@
+"""
+Unit tests for the atomic unread counters of the send path
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from models import MessageCreate, User
+from routers import messages
+
+A = User(id="a", email="a@example.com", full_name="Agent A", role="employee", tenant_id="t1")
+B = User(id="b", email="b@example.com", full_name="Owner B", role="locateur")
+C = User(id="c", email="c@example.com", full_name="Agent C", role="employee", tenant_id="t1")
+
+
+@pytest.fixture
+def db(mongo, monkeypatch):
+    monkeypatch.setattr(messages, "_participants_cache", type(messages._participants_cache)())
+    return mongo(messages)
+
+
+async def seed(db):
+    await db.conversations.insert_many([
+        {"id": "ab", "participants": ["a", "b"], "unread_count": {"a": 0, "b": 0}},
+        {"id": "bc", "participants": ["b", "c"], "unread_count": {"b": 0, "c": 0}},
+    ])
+    await db.unread_totals.insert_many([{"user_id": u, "unread_count": 0} for u in ("a", "b", "c")])
+
+
+async def send(user, conversation_id, content="Bonjour"):
+    return await messages.send_message(MessageCreate(conversation_id=conversation_id, content=content), user)
+
+
+def test_concurrent_sends_count_every_message(db):
+    async def scenario():
+        await seed(db)
+        await asyncio.gather(*[send(A, "ab") for _ in range(10)], *[send(C, "bc") for _ in range(5)])
+        conversations = {c['id']: c['unread_count'] async for c in db.conversations.find({}, {"_id": 0})}
+        totals = {t['user_id']: t['unread_count'] async for t in db.unread_totals.find({}, {"_id": 0})}
+        return conversations, totals, await db.messages.count_documents({})
+
+    conversations, totals, stored = asyncio.run(scenario())
+    assert conversations == {"ab": {"a": 0, "b": 10}, "bc": {"b": 5, "c": 0}}
+    assert totals == {"a": 0, "b": 15, "c": 0}
+    assert stored == 15
+
+
+def test_outsiders_cannot_send_or_bump_counters(db):
+    async def scenario():
+        await seed(db)
+        with pytest.raises(HTTPException) as e:
+            await send(C, "ab")
+        conversation = await db.conversations.find_one({"id": "ab"}, {"_id": 0})
+        return e.value.status_code, conversation['unread_count'], await db.messages.count_documents({})
+
+    assert asyncio.run(scenario()) == (404, {"a": 0, "b": 0}, 0)
+
+
+def test_the_send_updates_the_conversation_preview(db):
+    async def scenario():
+        await seed(db)
+        message = await send(B, "ab", "x" * 150)
+        conversation = await db.conversations.find_one({"id": "ab"}, {"_id": 0})
+        return message, conversation
+
+    message, conversation = asyncio.run(scenario())
+    assert conversation['last_message'] == "x" * 100
+    # BSON dates keep milliseconds
+    sent_at = message.created_at
+    assert conversation['last_message_at'] == sent_at.replace(microsecond=sent_at.microsecond // 1000 * 1000)
+    assert conversation['unread_count'] == {"a": 1, "b": 0}